@@ -1,27 +1,14 @@
+from functools import cache
 from typing import Literal
 from typing_extensions import TypedDict, Annotated
-from langchain.messages import AnyMessage, SystemMessage, ToolMessage
+from langchain.messages import AnyMessage, SystemMessage
 from langchain.tools import tool
-from langchain.chat_models import init_chat_model
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
-from dotenv import load_dotenv
 import operator
-import os
 
-_ = load_dotenv()
-
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-apikey = os.getenv("AZURE_OPENAI_API_KEY")
-api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-
-model = init_chat_model(
-    model_provider="azure_openai",
-    azure_deployment=deployment,
-    temperature=0,
-    model="gpt-4.1",
-    api_version=api_version,
-)
+from src.llm.provider import get_llm_with_tools
+from src.tools.registry import PURE, ToolRegistry
 
 
 @tool
@@ -57,10 +44,11 @@ def divide(a: int, b: int) -> float:
     return a / b
 
 
-# Add the tools to the LLM
-tools = [multiply, add, divide]
-tools_by_name = {tool.name: tool for tool in tools}
-model_with_tools = model.bind_tools(tools)
+# Tools are bound to the shared LLM on the first call. Arithmetic is pure, so repeated
+# operations are answered from the registry cache
+registry = ToolRegistry([(multiply, PURE), (add, PURE), (divide, PURE)])
+tools = registry.tools
+tools_by_name = registry.tools_by_name
 
 
 # State definition
@@ -75,7 +63,7 @@ def llm_call(state: dict):
 
     return {
         "messages": [
-            model_with_tools.invoke(
+            get_llm_with_tools(tools).invoke(
                 [
                     SystemMessage(
                         content="You are a helpful assistant tasked with performing arithmetic on a set of inputs."
@@ -90,14 +78,13 @@ def llm_call(state: dict):
 
 # Tool node definition
 def tool_node(state: dict):
-    """Perform the tool call"""
-    result = []
-    for tool_call in state["messages"][-1].tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
-        result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
+    """Perform the tool calls in parallel"""
+    return {"messages": registry.run(state["messages"][-1].tool_calls)}
 
-    return {"messages": result}
+
+async def atool_node(state: dict):
+    """Perform the tool calls concurrently when the agent runs async"""
+    return {"messages": await registry.arun(state["messages"][-1].tool_calls)}
 
 
 # End logic definition
@@ -116,32 +103,50 @@ def should_continue(state: MessagesState) -> Literal["tool_node", END]:
 
 
 # Build and compile the agent
-agent_builder = StateGraph(MessagesState)
-
-# Add nodes
-agent_builder.add_node("llm_call", llm_call)
-agent_builder.add_node("tool_node", tool_node)
-
-# Add edges to connect nodes
-agent_builder.add_edge(START, "llm_call")
-agent_builder.add_conditional_edges(
-    "llm_call",
-    should_continue,
-    ["tool_node", END]
-)
-agent_builder.add_edge("tool_node", "llm_call")
-
-# Compile the agent
-agent = agent_builder.compile()
-
-# Show the agent
-from IPython.display import Image, display
-display(Image(agent.get_graph(xray=True).draw_mermaid_png()))
-
-
-# Invoke
-from langchain.messages import HumanMessage
-messages = [HumanMessage(content="What number do I get if I sum 7 times 7")]
-messages = agent.invoke({"messages": messages})
-for m in messages["messages"]:
-    m.pretty_print()
\ No newline at end of file
+def build_agent() -> StateGraph:
+    """Build the arithmetic agent graph"""
+    agent_builder = StateGraph(MessagesState)
+
+    # Add nodes
+    agent_builder.add_node("llm_call", llm_call)
+    agent_builder.add_node("tool_node", RunnableLambda(tool_node, afunc=atool_node))
+
+    # Add edges to connect nodes
+    agent_builder.add_edge(START, "llm_call")
+    agent_builder.add_conditional_edges(
+        "llm_call",
+        should_continue,
+        ["tool_node", END]
+    )
+    agent_builder.add_edge("tool_node", "llm_call")
+
+    return agent_builder
+
+
+@cache
+def get_agent():
+    """Compile the agent once, on first use"""
+    return build_agent().compile()
+
+
+def __getattr__(name: str):
+    # `agent` is compiled lazily, importing this module has no side effects
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    agent = get_agent()
+
+    # Show the agent
+    from IPython.display import Image, display
+    display(Image(agent.get_graph(xray=True).draw_mermaid_png()))
+
+
+    # Invoke
+    from langchain.messages import HumanMessage
+    messages = [HumanMessage(content="What number do I get if I sum 7 times 7")]
+    messages = agent.invoke({"messages": messages})
+    for m in messages["messages"]:
+        m.pretty_print()
\ No newline at end of file
@@ -1,30 +1,46 @@
+from functools import cache
 from pprint import pprint
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
-from langchain.messages import HumanMessage, SystemMessage
+from langchain.messages import HumanMessage
 from langgraph.graph import StateGraph, START, END
 
-from src.llm.openai import llm
+from src.llm.provider import get_llm
 from src.models.classifier_agent import ClassifierAgentState, IntentClassification
+from src.prompts.classifier_agent import CLASSIFY_REQUEST, GENERATE_COMPUTER_MANUAL, GENERATE_RECIPE
+
+if TYPE_CHECKING:
+    from src.classifiers.local import FastPathClassifier
+
+
+@cache
+def intent_fast_path() -> "FastPathClassifier | None":
+    """Local pre-classifier from INTENT_CLASSIFIER_MODEL / INTENT_CLASSIFIER_LOG, if configured"""
+    # Imported on first use, NumPy is only loaded when the fast path is actually needed
+    from src.classifiers.local import fast_path_from_env
+    return fast_path_from_env("INTENT_CLASSIFIER", ["intent"])
 
 
 def classifier_node(state: ClassifierAgentState) -> dict:
     """Classifies the user input into predefined classes"""
 
-    structured_model = llm.with_structured_output(IntentClassification)
-
-    # Prepare the classification prompt
-    classification_prompt = SystemMessage(
-        content=f"""
-            Analyze the user input and classify it:
-                
-            User input: {state.user_input}
-            
-            Provide classification on user input.
-        """
-    )
+    # Skip the LLM when the local classifier is confident
+    fast_path = intent_fast_path()
+    prediction = fast_path.predict(state.user_input) if fast_path else None
+    if prediction and prediction["confident"]:
+        return {
+            "detected_intent": {"intent": prediction["labels"]["intent"]}
+        }
+
+    structured_model = get_llm().with_structured_output(IntentClassification)
 
-    intent = structured_model.invoke([classification_prompt])
+    # Prepare the classification prompt, the user input goes after the static instructions
+    messages = CLASSIFY_REQUEST.messages(user_input=state.user_input)
+
+    intent = structured_model.invoke(messages, CLASSIFY_REQUEST.config())
+
+    if fast_path:
+        fast_path.record(state.user_input, prediction, intent)
 
     return {
         "detected_intent": intent
@@ -34,20 +50,10 @@ def classifier_node(state: ClassifierAgentState) -> dict:
 def generate_recipe(state: ClassifierAgentState) -> dict:
     """Node that generates a recipe to what the user is demanding."""
 
-    prompt = SystemMessage(
-        content=f"""
-            You are an expert in fine cuisine. You will receive a recipe from a customer and you have to generate
-            a plan to prepare that dish. First, enumerate all the ingredients that are needed to prepare the food, 
-            include quantities, use grams (g), mililiters (ml) as measures for mass and volumes.
-            Prepare a plan explained step by step, don't miss any detail. 
-            
-            User's request for food: {state.user_input}
-            
-            Prepare ingredients and plan to cook that dish.
-        """
-    )
+    messages = GENERATE_RECIPE.messages(user_input=state.user_input)
 
-    response = llm.invoke([prompt])
+    # Tokens are streamed when the graph runs with stream_mode="messages" (see stream_runner)
+    response = get_llm().invoke(messages, GENERATE_RECIPE.config())
 
     return {
         "messages": [response.content]
@@ -57,18 +63,10 @@ def generate_recipe(state: ClassifierAgentState) -> dict:
 def generate_computer_manual(state: ClassifierAgentState) -> dict:
     """Node that generates a recipe to what the user is demanding."""
 
-    prompt = SystemMessage(
-        content=f"""
-            You are an expert in customer service to a IT company. You will receive tickets on support requests and
-            you have to explain, step by step and based on what you know, how to solve that problem.
+    messages = GENERATE_COMPUTER_MANUAL.messages(user_input=state.user_input)
 
-            User's request for support: {state.user_input}
-
-            Explain what is the cause of the issue and prepare a step-by-step plan to solve it.
-        """
-    )
-
-    response = llm.invoke([prompt])
+    # Tokens are streamed when the graph runs with stream_mode="messages" (see stream_runner)
+    response = get_llm().invoke(messages, GENERATE_COMPUTER_MANUAL.config())
 
     return {
         "messages": [response.content]
@@ -88,29 +86,46 @@ def route_by_request(state: ClassifierAgentState) -> Literal["end", "recipes", "
         return "end"
 
 
-# Try out agent
-agent = StateGraph(ClassifierAgentState)
-agent.add_node("classifier_node", classifier_node)
-agent.add_node("generate_recipe", generate_recipe)
-agent.add_node("generate_computer_manual", generate_computer_manual)
-
-agent.add_edge(START, "classifier_node")
-agent.add_conditional_edges(
-    "classifier_node",
-    route_by_request,
-    {
-        "recipes": "generate_recipe",
-        "computers": "generate_computer_manual",
-        "end": END
-    }
-)
+def build_agent() -> StateGraph:
+    """Build the classifier agent graph"""
+    agent = StateGraph(ClassifierAgentState)
+    agent.add_node("classifier_node", classifier_node)
+    agent.add_node("generate_recipe", generate_recipe)
+    agent.add_node("generate_computer_manual", generate_computer_manual)
+
+    agent.add_edge(START, "classifier_node")
+    agent.add_conditional_edges(
+        "classifier_node",
+        route_by_request,
+        {
+            "recipes": "generate_recipe",
+            "computers": "generate_computer_manual",
+            "end": END
+        }
+    )
+
+    agent.add_edge("generate_recipe", END)
+    agent.add_edge("generate_computer_manual", END)
+
+    return agent
 
-agent.add_edge("generate_recipe", END)
-agent.add_edge("generate_computer_manual", END)
 
-app = agent.compile()
+@cache
+def get_app():
+    """Compile the agent once, on first use"""
+    return build_agent().compile()
+
+
+def __getattr__(name: str):
+    # `app` is compiled lazily, importing this module has no side effects
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
+    app = get_app()
+
     initial_state = {
         "user_input": "I have a terrible headache"
     }
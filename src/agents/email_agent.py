@@ -1,18 +1,131 @@
-from typing import Literal
+import os
+import threading
+from functools import cache
+from typing import TYPE_CHECKING, Callable, Literal
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import interrupt, Command, RetryPolicy
-from langgraph.checkpoint.memory import MemorySaver
 
 from langchain.messages import HumanMessage
 
-try:
-    from src.llm.openai import llm
-except:
-    # Use local Ollama instance when Azure models are not available
-    from src.llm.ollama import llm
+from src.checkpoint.memory import memory_saver_from_env
+from src.checkpoint.sqlite import sqlite_saver_from_env
+from src.llm.provider import get_llm
+from src.llm.scheduler import llm_priority
+from src.models.email_agent import EmailAgentState, EmailClassification, EmailClassificationBatch
+from src.prompts.email_agent import CLASSIFY_EMAIL, CLASSIFY_EMAILS, DRAFT_RESPONSE
 
-from src.models.email_agent import EmailAgentState, EmailClassification
+if TYPE_CHECKING:
+    from src.classifiers.batcher import MicroBatcher
+    from src.classifiers.local import FastPathClassifier
+    from src.retrieval.duplicates import DuplicateIndex
+    from src.retrieval.index import DocumentIndex
+    from src.retrieval.speculative import Speculator
+
+_shared_lock = threading.Lock()
+_shared: dict[str, object] = {}
+
+# No CRM is integrated: customer records only come from a lookup registered by the application
+_customer_lookup: Callable[[str], dict] | None = None
+
+
+def _shared_instance(name: str, factory):
+    """Build an object once per process.
+
+    Locked rather than @cache: graph nodes run concurrently, and the first callers must all
+    get the same batcher or index instead of each building their own.
+    """
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+@cache
+def email_fast_path() -> "FastPathClassifier | None":
+    """Local pre-classifier from EMAIL_CLASSIFIER_MODEL / EMAIL_CLASSIFIER_LOG, if configured"""
+    # Imported on first use, NumPy is only loaded when the fast path is actually needed
+    from src.classifiers.local import fast_path_from_env
+    return fast_path_from_env("EMAIL_CLASSIFIER", ["intent", "urgency"])
+
+
+@cache
+def knowledge_base() -> "DocumentIndex | None":
+    """Local document index built with `python -m src.retrieval.index build`, if configured"""
+    path = os.getenv("KB_INDEX_PATH")
+    if not path:
+        return None
+
+    from src.retrieval.index import DocumentIndex
+    return DocumentIndex(path)
+
+
+def classify_email(email: dict) -> EmailClassification:
+    """Classify one email with a structured LLM call"""
+    # Create structured LLM that returns EmailClassification dict
+    # This gives information to the LLM to output the same structure that the sent one
+    structured_llm = get_llm().with_structured_output(EmailClassification)
+    return structured_llm.invoke(CLASSIFY_EMAIL.messages(**email), CLASSIFY_EMAIL.config())
+
+
+def classify_emails(emails: list[dict]) -> list[EmailClassification]:
+    """Classify several emails in one structured LLM call, instructions are sent once"""
+    structured_llm = get_llm().with_structured_output(EmailClassificationBatch)
+
+    numbered = "\n\n".join(
+        f"Email {i}:\nFrom: {email['sender_email']}\n{email['email_content']}"
+        for i, email in enumerate(emails, start=1)
+    )
+    messages = CLASSIFY_EMAILS.messages(count=str(len(emails)), emails=numbered)
+
+    return structured_llm.invoke(messages, CLASSIFY_EMAILS.config())["classifications"]
+
+
+def classification_batcher() -> "MicroBatcher[dict, EmailClassification] | None":
+    """Micro-batcher for concurrent classifications, enabled by CLASSIFY_BATCH_WINDOW_MS"""
+    from src.classifiers.batcher import batcher_from_env
+    return _shared_instance("batcher", lambda: batcher_from_env("CLASSIFY_BATCH", classify_email, classify_emails))
+
+
+def duplicate_index() -> "DuplicateIndex | None":
+    """Index of recent emails to reuse results for near-duplicates, enabled by DEDUP_THRESHOLD"""
+    from src.retrieval.duplicates import duplicate_index_from_env
+    return _shared_instance("duplicates", duplicate_index_from_env)
+
+
+def speculator() -> "Speculator | None":
+    """Retrieval and customer lookup started before classification, enabled by EMAIL_SPECULATE"""
+    from src.retrieval.speculative import speculator_from_env
+    return _shared_instance("speculator", lambda: speculator_from_env(search_knowledge_base, _customer_lookup))
+
+
+def set_customer_lookup(lookup: Callable[[str], dict] | None) -> None:
+    """Register the CRM lookup (sender email to customer record) that EMAIL_SPECULATE=customer runs"""
+    global _customer_lookup
+
+    with _shared_lock:
+        _customer_lookup = lookup
+        _shared.pop("speculator", None)
+
+
+def search_knowledge_base(query: str) -> list[str]:
+    """Documents matching `query` in the knowledge base"""
+    index = knowledge_base()
+    if index is not None:
+        return [result["text"] for result in index.search(query, k=4)]
+
+    # Placeholder hardcoded search results when no index is configured
+    return [
+        "Reset password via Settings > Security > Change Password",
+        "Password must be at least 12 characters",
+        "Include uppercase, lowercase, numbers and symbols",
+        "Two‑factor authentication can be enabled in Security settings"
+    ]
+
+
+def needs_review(classification: EmailClassification) -> bool:
+    """Drafts for critical or complex emails go to a human before being sent"""
+    return classification.get('urgency') in ['critical'] or classification.get('intent') == 'complex'
 
 
 def read_email(state: EmailAgentState) -> dict:
@@ -24,26 +137,49 @@ def read_email(state: EmailAgentState) -> dict:
 
 
 def classify_intent(state: EmailAgentState) -> Command[Literal[
-    "search_documentation", "human_review", "draft_response", "bug_tracking"
+    "search_documentation", "human_review", "draft_response", "bug_tracking", "send_reply"
 ]]:
     """Use LLM to classify email intent and urgency, then route accordingly"""
 
-    # Create structured LLM that returns EmailClassification dict
-    # This gives information to the LLM to output the same structure that the sent one
-    structured_llm = llm.with_structured_output(EmailClassification)
-
-    # Format the prompt on demand, not the stored in the state
-    classification_prompt = f"""
-    Analyze this customer email and classifiy it:
-    
-    Email: {state['email_content']}
-    From: {state['sender_email']}
-    
-    Provide classification including intent, urgency, topic, and summary.
-    """
-
-    # Get structured response directly as dict
-    classification = structured_llm.invoke(classification_prompt)
+    # Copies of a recent email (repeated complaints, incidents) reuse its results; copies of
+    # one still being classified wait for it rather than make their own LLM call
+    duplicates = duplicate_index()
+    match = duplicates.claim(state['email_id'], state['email_content']) if duplicates else None
+
+    # Obvious emails are answered by the local classifier without an LLM call
+    fast_path = email_fast_path()
+    prediction = fast_path.predict(state['email_content']) if fast_path and not match else None
+
+    speculation, task = None, None
+    if match:
+        classification = match["classification"]
+    elif prediction and prediction["confident"]:
+        classification: EmailClassification = {
+            "intent": prediction["labels"]["intent"],
+            "urgency": prediction["labels"]["urgency"],
+            "topic": prediction["labels"]["intent"],
+            "summary": state['email_content'][:200]
+        }
+    else:
+        email = {"email_content": state['email_content'], "sender_email": state['sender_email']}
+
+        # Retrieval on the raw email (and the customer lookup) run during the LLM call
+        speculation = speculator()
+        task = speculation.start(state['email_content'], state['sender_email']) if speculation else None
+
+        # With many emails in flight, concurrent classifications share one LLM request
+        batcher = classification_batcher()
+        try:
+            classification = batcher.submit(email) if batcher else classify_email(email)
+        except BaseException:
+            # Copies waiting on this email classify themselves
+            if duplicates:
+                duplicates.release(state['email_id'])
+            raise
+
+        # The LLM label is the training data for the local classifier
+        if fast_path:
+            fast_path.record(state['email_content'], prediction, classification)
 
     # Determine next node based on classification (with the LLM)
     intent = classification['intent']
@@ -59,8 +195,35 @@ def classify_intent(state: EmailAgentState) -> Command[Literal[
         goto = "draft_response"
 
     # Store classification as a single dict in state
+    update = {"classification": classification}
+
+    if match:
+        update["duplicate_of"] = match["email_id"]
+        if duplicates.reuse_draft and match["draft_response"] and goto != "human_review":
+            update["search_results"] = match["search_results"]
+            update["draft_response"] = match["draft_response"]
+            goto = "human_review" if needs_review(classification) else "send_reply"
+        elif match["search_results"] is not None and goto in ["search_documentation", "bug_tracking"]:
+            update["search_results"] = match["search_results"]
+            goto = "draft_response"
+    elif duplicates:
+        duplicates.add(state['email_id'], state['email_content'], classification)
+
+    if task is not None:
+        # Keep what the route needs; found documents replace the search hop
+        search_results, customer_history = speculation.settle(
+            task,
+            keep_search=goto == "search_documentation",
+            keep_customer=goto in ["search_documentation", "bug_tracking", "draft_response"]
+        )
+        if search_results is not None:
+            update["search_results"] = search_results
+            goto = "draft_response"
+        if customer_history is not None:
+            update["customer_history"] = customer_history
+
     return Command(
-        update={"classification": classification},
+        update=update,
         goto=goto
     )
 
@@ -73,16 +236,10 @@ def search_documentation(state: EmailAgentState) -> Command[Literal[
 
     # Build search query from classification
     classification = state.get('classification', {})
-    query = f"{classification.get('intent', '')} {classification.get('topic', '')}"
+    query = f"{classification.get('intent', '')} {classification.get('topic', '')} {classification.get('summary', '')}"
 
     try:
-        # Placeholder hardcoded search results based on intent/topic
-        search_results = [
-            "Reset password via Settings > Security > Change Password",
-            "Password must be at least 12 characters",
-            "Include uppercase, lowercase, numbers and symbols",
-            "Two‑factor authentication can be enabled in Security settings"
-        ]
+        search_results = search_knowledge_base(query)
     except Exception as e:
         search_results = [f"Search temporarily unavailable: {str(e)}"]
 
@@ -125,33 +282,27 @@ def draft_response(state: EmailAgentState) -> Command[Literal["human_review", "s
         # Format customer data for the prompt
         context_sections.append(f"Customer tier: {state['customer_history'].get('tier', 'standard')}")
 
-    # Build the prompt with formatted context
-    draft_prompt = f"""
-    Draft a response to this customer email:
-    {state['email_content']}
-    
-    Email intent: {classification.get('intent', 'unknown')}
-    Urgency level: {classification.get('urgency', 'medium')}
-    
-    {chr(10).join(context_sections)}
-    
-    Guidelines:
-    - Be professional and helpful
-    - Address their specific concern
-    - Use the provided documentation when relevant
-    - Use my name "Miguel Díaz Medina" to close the email, but don't let any template to fill manually.
-    """
+    # Instructions are a static prefix, the email goes last so the provider can cache the rest
+    messages = DRAFT_RESPONSE.messages(
+        intent=classification.get('intent', 'unknown'),
+        urgency=classification.get('urgency', 'medium'),
+        context="\n\n".join(context_sections),
+        email_content=state['email_content']
+    )
 
-    response = llm.invoke(draft_prompt)
+    # Tokens are streamed when the graph runs with stream_mode="messages" (see stream_runner).
+    # Under rate limits, urgent drafts (the ones going to human review) are sent first
+    with llm_priority(classification.get('urgency')):
+        response = get_llm().invoke(messages, DRAFT_RESPONSE.config())
 
-    # Determine if human review needed based on urgency and intent
-    needs_review = (
-        classification.get('urgency') in ['critical'] or
-        classification.get('intent') == 'complex'
-    )
+    # Later near-duplicates of this email can reuse its search results and draft
+    duplicates = duplicate_index()
+    if duplicates and not state.get('duplicate_of'):
+        duplicates.update(state['email_id'], search_results=state.get('search_results'),
+                          draft_response=response.content)
 
-    # Route to appropriate next node
-    goto = "human_review" if needs_review else "send_reply"
+    # Route to appropriate next node, human review is needed based on urgency and intent
+    goto = "human_review" if needs_review(classification) else "send_reply"
 
     return Command(
         update={"draft_response": response.content},  # Store only raw response
@@ -192,53 +343,71 @@ def send_reply(state: EmailAgentState) -> dict:
     return {}
 
 
-# Compile the agent. Since we are using Command, we don't need to define each edge
-workflow = StateGraph(EmailAgentState)
+def build_workflow() -> StateGraph:
+    """Build the agent. Since we are using Command, we don't need to define each edge"""
+    workflow = StateGraph(EmailAgentState)
+
+    # Add nodes with appropriate error handling
+    workflow.add_node("read_email", read_email)
+    workflow.add_node("classify_intent", classify_intent)
 
-# Add nodes with appropriate error handling
-workflow.add_node("read_email", read_email)
-workflow.add_node("classify_intent", classify_intent)
+    # Add retry policy for nodes that might have transient failures
+    workflow.add_node(
+        "search_documentation",
+        search_documentation,
+        retry_policy=RetryPolicy(max_attempts=5)
+    )
+    workflow.add_node("bug_tracking", bug_tracking)
+    workflow.add_node("draft_response", draft_response)
+    workflow.add_node("human_review", human_review)
+    workflow.add_node("send_reply", send_reply)
+
+    # Add only the essential edges (those that cannot be routed with Commands)
+    workflow.add_edge(START, "read_email")
+    workflow.add_edge("read_email", "classify_intent")
+    workflow.add_edge("send_reply", END)
 
-# Add retry policy for nodes that might have transient failures
-workflow.add_node(
-    "search_documentation",
-    search_documentation,
-    retry_policy=RetryPolicy(max_attempts=5)
-)
-workflow.add_node("bug_tracking", bug_tracking)
-workflow.add_node("draft_response", draft_response)
-workflow.add_node("human_review", human_review)
-workflow.add_node("send_reply", send_reply)
+    return workflow
 
-# Add only the essential edges (those that cannot be routed with Commands)
-workflow.add_edge(START, "read_email")
-workflow.add_edge("read_email", "classify_intent")
-workflow.add_edge("send_reply", END)
 
-# Compile with checkpointer for persistence
-memory = MemorySaver()
-app = workflow.compile(checkpointer=memory)
+@cache
+def get_app():
+    """Compile the agent once, on first use"""
+    # Compile with checkpointer for persistence. Set CHECKPOINT_DB to keep interrupted threads
+    # across restarts and resume them from another process
+    memory = sqlite_saver_from_env() or memory_saver_from_env()
+    return build_workflow().compile(checkpointer=memory)
 
 
-# Test the agent
-initial_state = {
-    "email_content": "I was double charged with the same topic, give me my money!!!!",
-    "sender_email": "customer@example.com",
-    "email_id": "email_123",
-    "messages": []
-}
+def __getattr__(name: str):
+    # `app` is compiled lazily, importing this module has no side effects
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-config = {"configurable": {"thread_id": "customer_123"}}
-result = app.invoke(initial_state, config)
 
-print(f"human review interrupt: {result['__interrupt__']}")
+if __name__ == "__main__":
+    app = get_app()
 
-human_response = Command(
-    resume={
-        "approved": True,
-        "edited_response": "We sincerely apologize for the double charge..."
+    # Test the agent
+    initial_state = {
+        "email_content": "I was double charged with the same topic, give me my money!!!!",
+        "sender_email": "customer@example.com",
+        "email_id": "email_123",
+        "messages": []
     }
-)
 
-final_result = app.invoke(human_response, config)
-print(f"Email sent successfully")
\ No newline at end of file
+    config = {"configurable": {"thread_id": "customer_123"}}
+    result = app.invoke(initial_state, config)
+
+    print(f"human review interrupt: {result['__interrupt__']}")
+
+    human_response = Command(
+        resume={
+            "approved": True,
+            "edited_response": "We sincerely apologize for the double charge..."
+        }
+    )
+
+    final_result = app.invoke(human_response, config)
+    print(f"Email sent successfully")
\ No newline at end of file
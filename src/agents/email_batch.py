@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from langgraph.types import Command
+
+from src.agents.email_agent import get_app
+from src.models.email_agent import EmailAgentState, EmailBatchReport, EmailOutcome
+
+
+def thread_id_for(email: dict) -> str:
+    """Each email gets its own thread so checkpoints and interrupts never collide"""
+    email_id = email.get("email_id")
+    return f"email-{email_id}" if email_id else f"email-{uuid.uuid4().hex}"
+
+
+async def _run_thread(graph, graph_input, thread_id: str, email_id: str) -> EmailOutcome:
+    """Invoke the graph on a thread and report how the run ended"""
+    config = {"configurable": {"thread_id": thread_id}}
+
+    start = time.perf_counter()
+    outcome: EmailOutcome = {
+        "email_id": email_id,
+        "thread_id": thread_id,
+        "status": "completed",
+        "interrupt": None,
+        "error": None,
+        "elapsed": 0.0
+    }
+
+    try:
+        result = await graph.ainvoke(graph_input, config)
+        outcome["email_id"] = result.get("email_id", email_id)
+
+        # human_review pauses the thread; the rest of the batch keeps going
+        if result.get("__interrupt__"):
+            outcome["status"] = "interrupted"
+            outcome["interrupt"] = result["__interrupt__"][0].value
+    except Exception as e:
+        outcome["status"] = "failed"
+        outcome["error"] = f"{type(e).__name__}: {e}"
+
+    outcome["elapsed"] = time.perf_counter() - start
+    return outcome
+
+
+async def process_email(email: dict, graph=None) -> EmailOutcome:
+    """Run a single email through the workflow and report how it ended"""
+    graph = graph or get_app()
+
+    thread_id = thread_id_for(email)
+    initial_state: EmailAgentState = {
+        "email_content": email["email_content"],
+        "sender_email": email.get("sender_email", ""),
+        "email_id": email.get("email_id", thread_id),
+        "messages": []
+    }
+
+    return await _run_thread(graph, initial_state, thread_id, initial_state["email_id"])
+
+
+async def resume_email(thread_id: str, resume: dict, graph=None, email_id: str | None = None) -> EmailOutcome:
+    """Continue a thread paused by human_review with the reviewer's decision"""
+    graph = graph or get_app()
+    return await _run_thread(graph, Command(resume=resume), thread_id, email_id or thread_id)
+
+
+async def recover_email(email: dict, graph=None) -> EmailOutcome:
+    """Bring an email to its outcome after the process running it died.
+
+    Work already checkpointed is not repeated: a finished thread is reported as is, a paused
+    one stays paused and a thread stopped halfway continues from its last checkpoint.
+    """
+    graph = graph or get_app()
+
+    thread_id = thread_id_for(email)
+    snapshot = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+    if not snapshot.values:
+        return await process_email(email, graph)
+
+    if snapshot.next and not snapshot.interrupts:
+        return await _run_thread(graph, None, thread_id, email.get("email_id", thread_id))
+
+    return {
+        "email_id": email.get("email_id", thread_id),
+        "thread_id": thread_id,
+        "status": "interrupted" if snapshot.interrupts else "completed",
+        "interrupt": snapshot.interrupts[0].value if snapshot.interrupts else None,
+        "error": None,
+        "elapsed": 0.0
+    }
+
+
+async def aprocess_emails(emails: Iterable[dict], max_concurrency: int = 8, graph=None,
+                          on_outcome: Callable[[dict, EmailOutcome], None] | None = None) -> EmailBatchReport:
+    """Process many emails concurrently, keeping at most `max_concurrency` graphs in flight.
+
+    Emails are pulled lazily from the iterable, so generators are consumed only as fast
+    as the workers can process them. `on_outcome(email, outcome)` is called as each email
+    finishes, e.g. to commit the position of a mailbox reader.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    source: Iterator[dict] = iter(emails)
+    report: EmailBatchReport = {
+        "completed": [],
+        "interrupted": [],
+        "failed": [],
+        "elapsed": 0.0,
+        "throughput": 0.0
+    }
+
+    async def worker():
+        # Pulling from the shared iterator never awaits, so two workers can't get the same email
+        for email in source:
+            outcome = await process_email(email, graph)
+            report[outcome["status"]].append(outcome)
+            if on_outcome:
+                on_outcome(email, outcome)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max_concurrency)))
+    report["elapsed"] = time.perf_counter() - start
+
+    total = len(report["completed"]) + len(report["interrupted"]) + len(report["failed"])
+    report["throughput"] = total / report["elapsed"] if report["elapsed"] else 0.0
+
+    return report
+
+
+def process_emails(emails: Iterable[dict], max_concurrency: int = 8, graph=None,
+                   on_outcome: Callable[[dict, EmailOutcome], None] | None = None) -> EmailBatchReport:
+    """Synchronous entry point for bulk processing"""
+
+    async def run() -> EmailBatchReport:
+        # Sync nodes run on the loop's default executor, so size it to the concurrency
+        # limit; otherwise the thread pool and not the provider caps throughput
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="email") as executor:
+            loop.set_default_executor(executor)
+            return await aprocess_emails(emails, max_concurrency, graph, on_outcome)
+
+    return asyncio.run(run())
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    """Yield one email per line from a JSON lines file"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a batch of emails through the email agent")
+    parser.add_argument("emails", help="JSON lines file with email_content, sender_email and email_id")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--review-db", default=os.getenv("REVIEW_QUEUE_DB"),
+                        help="Queue the emails waiting for review in this SQLite file")
+    args = parser.parse_args()
+
+    review_queue = None
+    if args.review_db:
+        from src.review.queue import ReviewQueue
+        review_queue = ReviewQueue(args.review_db)
+
+    report = process_emails(read_jsonl(args.emails), max_concurrency=args.concurrency,
+                            on_outcome=review_queue.track if review_queue else None)
+
+    print(f"Processed {len(report['completed'])} emails, "
+          f"{len(report['interrupted'])} waiting for review, "
+          f"{len(report['failed'])} failed in {report['elapsed']:.2f}s "
+          f"({report['throughput']:.2f} emails/s)")
+
+    for outcome in report["interrupted"]:
+        print(f"- {outcome['thread_id']} needs review: {outcome['interrupt'].get('action')}")
+
+    for outcome in report["failed"]:
+        print(f"- {outcome['thread_id']} failed: {outcome['error']}")
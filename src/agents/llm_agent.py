@@ -1,17 +1,14 @@
 import json
+from functools import cache
 from typing import Literal
 import pprint
 
 from langchain.messages import SystemMessage, ToolMessage, HumanMessage, AIMessage
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import InMemorySaver
-
-try:
-    from src.llm.openai import llm
-except:
-    # Use local Ollama instance when Azure models are not available
-    from src.llm.ollama import llm
 
+from src.checkpoint.memory import memory_saver_from_env
+from src.checkpoint.sqlite import sqlite_saver_from_env
+from src.llm.provider import get_llm
 from src.models.tool_agent import ToolAgentState
 
 
@@ -20,7 +17,7 @@ def llm_call(state: ToolAgentState) -> dict:
     llm_calls: int = state.llm_calls + 1
 
     system: SystemMessage = SystemMessage(content="You are a helpful assistant. Use the tone as if you were a pirate.")
-    response = llm.invoke([system] + state.messages)
+    response = get_llm().invoke([system] + state.messages)
 
     return {
         "messages": [response],
@@ -40,20 +37,36 @@ def second_node(state: ToolAgentState) -> dict:
 
 
 # Define the agent workflow
-agent = StateGraph(ToolAgentState)
-agent.add_node("first_node", llm_call)
-agent.add_node("second_node", second_node)
+def build_agent() -> StateGraph:
+    """Build the two node agent graph"""
+    agent = StateGraph(ToolAgentState)
+    agent.add_node("first_node", llm_call)
+    agent.add_node("second_node", second_node)
 
-agent.add_edge(START, "first_node")
-agent.add_edge("first_node", "second_node")
-agent.add_edge("second_node", END)
+    agent.add_edge(START, "first_node")
+    agent.add_edge("first_node", "second_node")
+    agent.add_edge("second_node", END)
 
+    return agent
+
+
+@cache
+def get_app():
+    """Compile the agent once, on first use"""
+    memory = sqlite_saver_from_env() or memory_saver_from_env()
+    return build_agent().compile(checkpointer=memory)
 
-memory = InMemorySaver()
-app = agent.compile(checkpointer=memory)
-# Run the agent
 
+def __getattr__(name: str):
+    # `app` is compiled lazily, importing this module has no side effects
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Run the agent
 if __name__ == '__main__':
+    app = get_app()
 
     config = {"configurable": {"thread_id": "1"}}
     result = app.invoke({"messages": [HumanMessage("What time is it today?")]}, config)
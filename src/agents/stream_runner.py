@@ -0,0 +1,97 @@
+import argparse
+import sys
+import time
+import uuid
+from typing import Any, Callable, Iterable
+
+from langchain_core.messages import AIMessageChunk
+
+# Nodes producing long free-text answers; other LLM calls (classification, tool calls) are not printed
+STREAMED_NODES = ("draft_response", "generate_recipe", "generate_computer_manual")
+
+
+def _token(chunk: tuple[Any, dict], nodes: Iterable[str]) -> str | None:
+    message, metadata = chunk
+    if metadata.get("langgraph_node") not in nodes or not isinstance(message, AIMessageChunk):
+        return None
+    return message.text or None
+
+
+def stream_run(graph, graph_input: Any, config: dict | None = None, on_token: Callable[[str, str], None] | None = None,
+               nodes: Iterable[str] = STREAMED_NODES) -> dict:
+    """Run the graph calling `on_token(node, text)` as tokens arrive and return the final state.
+
+    Nodes keep calling `llm.invoke`: with stream_mode="messages" LangChain switches the call to
+    streaming, so the response cache still applies and the complete message is stored in the
+    state and checkpoint as usual. If the run stops at an interrupt the returned state has an
+    `__interrupt__` entry, like `graph.invoke`.
+    """
+    nodes = tuple(nodes)
+    state: dict = {}
+
+    for mode, chunk in graph.stream(graph_input, config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            if on_token and (text := _token(chunk, nodes)):
+                on_token(chunk[1]["langgraph_node"], text)
+        elif "__interrupt__" in chunk:
+            state = {**state, "__interrupt__": chunk["__interrupt__"]}
+        else:
+            state = chunk
+
+    return state
+
+
+async def astream_run(graph, graph_input: Any, config: dict | None = None,
+                      on_token: Callable[[str, str], None] | None = None,
+                      nodes: Iterable[str] = STREAMED_NODES) -> dict:
+    """Async version of `stream_run`"""
+    nodes = tuple(nodes)
+    state: dict = {}
+
+    async for mode, chunk in graph.astream(graph_input, config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            if on_token and (text := _token(chunk, nodes)):
+                on_token(chunk[1]["langgraph_node"], text)
+        elif "__interrupt__" in chunk:
+            state = {**state, "__interrupt__": chunk["__interrupt__"]}
+        else:
+            state = chunk
+
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an agent printing the generated answer as it streams")
+    parser.add_argument("agent", choices=["email", "classifier"])
+    parser.add_argument("text", help="Email content or user request")
+    parser.add_argument("--sender", default="customer@example.com")
+    parser.add_argument("--thread-id", default=None)
+    args = parser.parse_args()
+
+    if args.agent == "email":
+        from src.agents.email_agent import get_app
+        thread_id = args.thread_id or f"stream-{uuid.uuid4().hex[:8]}"
+        graph_input = {"email_content": args.text, "sender_email": args.sender, "email_id": thread_id, "messages": []}
+        config = {"configurable": {"thread_id": thread_id}}
+    else:
+        from src.agents.classifier_agent import get_app
+        graph_input = {"user_input": args.text}
+        config = None
+
+    start = time.perf_counter()
+    first_token: list[float] = []
+
+    def print_token(node: str, text: str) -> None:
+        if not first_token:
+            first_token.append(time.perf_counter() - start)
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    state = stream_run(get_app(), graph_input, config, print_token)
+    total = time.perf_counter() - start
+
+    print()
+    if state.get("__interrupt__"):
+        print(f"Waiting for human review on thread {config['configurable']['thread_id']}")
+    ttft = f"first token after {first_token[0]:.2f}s" if first_token else "no tokens streamed"
+    print(f"Done in {total:.2f}s, {ttft}")
@@ -1,43 +1,48 @@
+from functools import cache
 from pprint import pprint
 from typing import Literal
 
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 
-try:
-    from src.llm.openai import llm
-except:
-    from src.llm.ollama import llm
-
+from src.llm.provider import get_llm_with_tools
 from src.models.tool_agent import ToolAgentState
 from src.tools.date import get_current_date, get_current_hour
+from src.tools.registry import UNTIL_MIDNIGHT, UNTIL_NEXT_SECOND, ToolRegistry
 
-# Bind tools to the model
-model_with_tools = llm.bind_tools(tools=[get_current_date, get_current_hour])
-tools_by_name = {"get_current_date": get_current_date, "get_current_hour": get_current_hour}
+# Tools are bound to the model on the first call. Their results are reused while still
+# valid, so a model asking the date again in the loop doesn't run the tool again
+registry = ToolRegistry([
+    (get_current_date, UNTIL_MIDNIGHT),
+    (get_current_hour, UNTIL_NEXT_SECOND),
+])
+tools = registry.tools
+tools_by_name = registry.tools_by_name
 
 # Node definition
 
 def llm_call(state: ToolAgentState) -> dict:
     """Perform a call to LLM to decide whether a tool is needed."""
     system: SystemMessage = SystemMessage(content="You are a helpful assistant. Talk like if you were a pirate")
-    response = model_with_tools.invoke([system]+ state.messages)
+    response = get_llm_with_tools(tools).invoke([system]+ state.messages)
 
     return {
         "messages": [response]
     }
 
 def tool_node(state: ToolAgentState) -> dict:
-    """This node evals if any tool needs to be called and, in that case, it executes the tool"""
+    """This node evals if any tool needs to be called and, in that case, it executes the tools in parallel"""
 
-    result = []
-    for tool_call in state.messages[-1].tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
-        result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
+    return {
+        "messages": registry.run(state.messages[-1].tool_calls)
+    }
+
+async def atool_node(state: ToolAgentState) -> dict:
+    """Async version of tool_node, used when the graph runs with ainvoke/astream"""
 
     return {
-        "messages": result
+        "messages": await registry.arun(state.messages[-1].tool_calls)
     }
 
 def should_continue(state: ToolAgentState) -> Literal["tool_node", END]:
@@ -54,22 +59,38 @@ def should_continue(state: ToolAgentState) -> Literal["tool_node", END]:
 
 
 # Agent structure
-agent = StateGraph(ToolAgentState)
+def build_agent() -> StateGraph:
+    """Build the tool agent graph"""
+    agent = StateGraph(ToolAgentState)
+
+    agent.add_node("llm_call", llm_call)
+    agent.add_node("tool_node", RunnableLambda(tool_node, afunc=atool_node))
+
+    agent.add_edge(START, "llm_call")
+    agent.add_conditional_edges(
+        "llm_call",
+        should_continue,
+        ["tool_node", END]
+    )
+    agent.add_edge("tool_node", "llm_call")
+
+    return agent
+
+
+@cache
+def get_app():
+    """Compile the agent once, on first use"""
+    return build_agent().compile()
 
-agent.add_node("llm_call", llm_call)
-agent.add_node("tool_node", tool_node)
 
-agent.add_edge(START, "llm_call")
-agent.add_conditional_edges(
-    "llm_call",
-    should_continue,
-    ["tool_node", END]
-)
-agent.add_edge("tool_node", "llm_call")
+def __getattr__(name: str):
+    # `app` is compiled lazily, importing this module has no side effects
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-app = agent.compile()
 
 if __name__ == "__main__":
-    result = app.invoke({"messages": [HumanMessage(content="What time is it? Which month are we on?")]})
+    result = get_app().invoke({"messages": [HumanMessage(content="What time is it? Which month are we on?")]})
 
     pprint(result)
\ No newline at end of file
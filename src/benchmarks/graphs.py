@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypedDict
+
+import numpy as np
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import Runnable
+
+from src.llm.fake import FakeChatModel, LatencyLedger
+from src.llm.provider import set_llm
+
+AGENTS = ["email", "tool", "classifier", "llm", "basic"]
+
+
+class Scenario(TypedDict):
+    graph: object
+    make_input: Callable[[int], dict]
+    make_config: Callable[[int], dict | None]
+
+
+def install_llm(llm: Runnable) -> dict[str, Scenario]:
+    """Make `llm` the shared model of every agent and return their benchmark scenarios"""
+    set_llm(llm)
+
+    from src.agents import basic_agent, classifier_agent, email_agent, llm_agent, tool_agent
+
+    # Every run uses its own thread, so checkpointed graphs never resume old state
+    def thread_config(prefix: str) -> Callable[[int], dict]:
+        run = uuid.uuid4().hex[:8]
+        return lambda i: {"configurable": {"thread_id": f"{prefix}-{run}-{i}"}}
+
+    return {
+        "email": {
+            "graph": email_agent.get_app(),
+            "make_input": lambda i: {
+                "email_content": f"Email number {i}: I can't reset my password and the export crashes.",
+                "sender_email": f"customer{i}@example.com",
+                "email_id": f"email_{i}",
+                "messages": []
+            },
+            "make_config": thread_config("email")
+        },
+        "tool": {
+            "graph": tool_agent.get_app(),
+            "make_input": lambda i: {"messages": [HumanMessage(content="What time is it? Which month are we on?")]},
+            "make_config": lambda i: None
+        },
+        "classifier": {
+            "graph": classifier_agent.get_app(),
+            "make_input": lambda i: {"user_input": f"Request {i}: how do I cook a risotto or fix my laptop?"},
+            "make_config": lambda i: None
+        },
+        "llm": {
+            "graph": llm_agent.get_app(),
+            "make_input": lambda i: {"messages": [HumanMessage(content="What time is it today?")]},
+            "make_config": thread_config("llm")
+        },
+        "basic": {
+            "graph": basic_agent.get_agent(),
+            "make_input": lambda i: {"messages": [HumanMessage(content="What number do I get if I sum 7 times 7")]},
+            "make_config": lambda i: None
+        },
+    }
+
+
+def _run_once(scenario: Scenario, i: int) -> tuple[float, int]:
+    """Run one invocation; returns its latency and the number of node executions"""
+    start = time.perf_counter()
+    steps = 0
+    for update in scenario["graph"].stream(scenario["make_input"](i), scenario["make_config"](i), stream_mode="updates"):
+        steps += sum(1 for node in update if node != "__interrupt__")
+    return time.perf_counter() - start, steps
+
+
+def benchmark(name: str, scenario: Scenario, ledger: LatencyLedger, runs: int, concurrency: int,
+              memory_runs: int = 20) -> dict:
+    """Throughput, latency percentiles, framework overhead per step and peak memory of a graph"""
+    # Warm up imports, compiled channels and lazy clients outside the measurement
+    _run_once(scenario, -1)
+
+    ledger_before = ledger.seconds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: _run_once(scenario, i), range(runs)))
+    elapsed = time.perf_counter() - start
+    model_seconds = ledger.seconds - ledger_before
+
+    latencies = np.array([latency for latency, _ in results])
+    steps = sum(step for _, step in results)
+
+    # Measured separately: tracemalloc slows allocations down and would inflate the overhead
+    tracemalloc.start()
+    for i in range(min(runs, memory_runs)):
+        _run_once(scenario, runs + i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "agent": name,
+        "runs": runs,
+        "concurrency": concurrency,
+        "throughput": runs / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "steps_per_run": steps / runs,
+        "overhead_per_step_ms": (latencies.sum() - model_seconds) / steps * 1000 if steps else 0.0,
+        "peak_memory_kb": peak / 1024
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agents with a deterministic fake model")
+    parser.add_argument("--agents", nargs="+", choices=AGENTS, default=AGENTS)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Lognormal sigma, 0 for fixed latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--standin", choices=["azure", "ollama"],
+                        help="Use the real client of this provider against a local stand-in server")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    if args.standin:
+        # HTTP client, serialization and streaming run for real, answers come from the stand-in
+        from src.llm.standin import StandIn, StandInServer
+        server = StandInServer(StandIn(latency=args.latency, latency_sigma=args.latency_sigma, seed=args.seed)).start()
+        if args.standin == "azure":
+            os.environ["AZURE_OPENAI_ENDPOINT"] = server.url
+            os.environ.setdefault("AZURE_OPENAI_API_KEY", "stand-in")
+            os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "stand-in")
+            os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-10-21")
+            from src.llm.openai import create_llm
+        else:
+            os.environ["OLLAMA_BASE_URL"] = server.url
+            from src.llm.ollama import create_llm
+        llm, ledger = create_llm(), server.standin.ledger
+    else:
+        llm = FakeChatModel(latency=args.latency, latency_sigma=args.latency_sigma, seed=args.seed)
+        ledger = llm.ledger
+
+    scenarios = install_llm(llm)
+
+    results = []
+    for name in args.agents:
+        # Nodes like send_reply print, keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = benchmark(name, scenarios[name], ledger, args.runs, args.concurrency)
+        results.append(result)
+
+        print(f"{name:<11} {result['throughput']:9.1f} runs/s  p50 {result['p50_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms  {result['steps_per_run']:4.1f} steps/run  "
+              f"overhead {result['overhead_per_step_ms']:6.3f} ms/step  peak {result['peak_memory_kb']:8.0f} KB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
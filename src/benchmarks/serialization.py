@@ -0,0 +1,144 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from typing import Any
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.checkpoint.serde import CompactSerializer, SqliteContentStore
+from src.checkpoint.sqlite import SqliteSaver
+from src.llm.fake import FakeChatModel
+from src.llm.provider import set_llm
+
+PARAGRAPHS = [
+    "I have been trying to reset my password since this morning and the link in the email never arrives.",
+    "When I export the monthly report to CSV the application freezes and then crashes without any message.",
+    "Our invoice for last month lists twelve seats but we only have eight active users on the account.",
+    "Could you add an option to schedule exports so they are sent to the whole team every Monday?",
+    "The mobile app logs me out every few minutes, which makes it impossible to finish a long form.",
+    "We rely on this tool for our daily operations and this issue is now blocking several people.",
+]
+
+DRAFT = (
+    "Hello,\n\nThank you for reaching out and for the detailed description of the problem. "
+    "We have looked into your account and identified the cause. Please follow the steps below, "
+    "and let us know if anything does not work as described: open Settings, go to Security, "
+    "choose Change Password and follow the instructions sent to your inbox. If the email does not "
+    "arrive within ten minutes, check your spam folder or reply to this message and we will send "
+    "a manual reset link.\n\nBest regards,\nSupport team"
+)
+
+
+class LongVersionSaver(SqliteSaver):
+    """SqliteSaver with the 51-character channel versions of InMemorySaver, as used before"""
+
+    get_next_version = InMemorySaver.get_next_version
+
+
+class TimedSerializer(SerializerProtocol):
+    """Delegates to a serializer and adds up the CPU time spent in it, by the calling threads only"""
+
+    def __init__(self, serde: SerializerProtocol):
+        self.serde = serde
+        self.seconds = 0.0
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        start = time.thread_time()
+        try:
+            return self.serde.dumps_typed(obj)
+        finally:
+            self.seconds += time.thread_time() - start
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        start = time.thread_time()
+        try:
+            return self.serde.loads_typed(data)
+        finally:
+            self.seconds += time.thread_time() - start
+
+
+def make_emails(count: int, duplicates: float, seed: int = 0) -> list[dict]:
+    """Emails of a few paragraphs; a share of them repeats an earlier email, as in an incident wave"""
+    rng = random.Random(seed)
+    emails = []
+    for i in range(count):
+        if emails and rng.random() < duplicates:
+            content = rng.choice(emails)["email_content"]
+        else:
+            # Replies usually quote the previous message
+            quoted = "\n".join(f"> {line}" for line in rng.sample(PARAGRAPHS, 3))
+            content = "\n\n".join(rng.sample(PARAGRAPHS, 3)) + f"\n\nTicket reference {i}\n\n{quoted}"
+        emails.append({"email_id": f"bench-{i}", "sender_email": f"customer{i}@example.com", "email_content": content})
+    return emails
+
+
+CONFIGURATIONS = {
+    "baseline": (LongVersionSaver, JsonPlusSerializer),
+    "msgpack": (SqliteSaver, JsonPlusSerializer),
+    "compact": (SqliteSaver, None),
+}
+
+
+def measure(name: str, emails: list[dict], directory: str) -> dict:
+    """Run the email workflow over `emails` with one of the CONFIGURATIONS of the checkpointer"""
+    from src.agents.email_agent import build_workflow
+    from src.agents.email_batch import process_emails
+
+    path = os.path.join(directory, f"{name}.db")
+    saver_class, serde_class = CONFIGURATIONS[name]
+    contents = None if serde_class else SqliteContentStore(path)
+    serde = TimedSerializer(serde_class() if serde_class else CompactSerializer(contents))
+    saver = saver_class(path, serde=serde, contents=contents)
+    graph = build_workflow().compile(checkpointer=saver)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_emails(emails, max_concurrency=1, graph=graph)
+
+    # Fold the WAL into the database so the file size is the stored size
+    saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    stats = saver.io_stats
+    steps = stats["put_count"]
+    return {
+        "serializer": name,
+        "supersteps": steps,
+        "bytes_per_step": stats["bytes_written"] / steps,
+        "serde_us_per_step": serde.seconds / steps * 1e6,
+        "put_us_per_step": (stats["put_seconds"] + stats["put_writes_seconds"]) / steps * 1e6,
+        "file_kb": os.path.getsize(path) / 1024
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpoint size and serialization cost of the email workflow")
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Share of emails repeating an earlier one")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds over every configuration, the fastest is kept")
+    args = parser.parse_args()
+
+    set_llm(FakeChatModel(content=DRAFT))
+    emails = make_emails(args.emails, args.duplicates)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm up imports and lazy clients outside the measurement
+        measure("baseline", emails[:5], tempfile.mkdtemp(dir=directory))
+        # Rounds interleave the configurations so they see the same machine noise
+        rounds = [[measure(name, emails, tempfile.mkdtemp(dir=directory)) for name in CONFIGURATIONS]
+                  for _ in range(args.repeat)]
+        results = [min(runs, key=lambda result: result["serde_us_per_step"]) for runs in zip(*rounds)]
+
+    for result in results:
+        print(f"{result['serializer']:<8} {result['supersteps']:6d} steps  {result['bytes_per_step']:6.0f} B/step  "
+              f"serde {result['serde_us_per_step']:5.1f} us/step  put {result['put_us_per_step']:5.0f} us/step  "
+              f"file {result['file_kb']:6.0f} KB")
+
+    before, after = results[0], results[-1]
+    print(f"compact vs baseline: checkpoint bytes {after['bytes_per_step'] / before['bytes_per_step'] - 1:+.0%}, "
+          f"file size {after['file_kb'] / before['file_kb'] - 1:+.0%}, "
+          f"serialization CPU {after['serde_us_per_step'] / before['serde_us_per_step'] - 1:+.0%}, "
+          f"time in put {after['put_us_per_step'] / before['put_us_per_step'] - 1:+.0%}")
@@ -0,0 +1,49 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "src.agents.email_agent",
+    "src.agents.tool_agent",
+    "src.agents.classifier_agent",
+    "src.agents.llm_agent",
+    "src.agents.basic_agent",
+]
+
+# Compiles the graph without calling the model, i.e. what a worker does before its first request
+COMPILE = {
+    "src.agents.email_agent": "get_app()",
+    "src.agents.tool_agent": "get_app()",
+    "src.agents.classifier_agent": "get_app()",
+    "src.agents.llm_agent": "get_app()",
+    "src.agents.basic_agent": "get_agent()",
+}
+
+
+def measure(code: str, repeat: int) -> list[float]:
+    """Wall time of fresh interpreters running `code`, in seconds"""
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold start time of the agent modules")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    args = parser.parse_args()
+
+    baseline = statistics.median(measure("pass", args.repeat))
+    print(f"{'interpreter':<32} {1000 * baseline:8.1f} ms")
+
+    for module in args.modules:
+        imported = statistics.median(measure(f"import {module}", args.repeat))
+        compiled = statistics.median(measure(f"from {module} import *; {COMPILE[module]}", args.repeat))
+        print(f"{module:<32} import {1000 * imported:8.1f} ms   import + compile {1000 * compiled:8.1f} ms")
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+from src.checkpoint.serde import serializer_from_env
+
+INTERRUPT = "__interrupt__"
+
+DEFAULT_KEEP_LAST = 10
+DEFAULT_IDLE_TTL = 3600.0
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _size(typed: tuple[str, bytes]) -> int:
+    return len(typed[1] or b"")
+
+
+def _has_next(checkpoint: Checkpoint) -> bool:
+    """Whether a node is still due: a trigger channel holding a value the node hasn't seen.
+
+    Consumed triggers are emptied (and get a new version), so only those in channel_values count.
+    """
+    seen = checkpoint["versions_seen"]
+    versions = checkpoint["channel_versions"]
+    for channel in checkpoint["channel_values"]:
+        version = versions.get(channel)
+        if channel == "__start__":
+            node = channel
+        elif channel.startswith("branch:to:"):
+            node = channel[len("branch:to:"):]
+        else:
+            continue
+        if seen.get(node, {}).get(channel) != version:
+            return True
+    return False
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver whose memory stays bounded in a long-running process.
+
+    - Only the last `keep_last` checkpoints of each thread (and namespace) are kept, with
+      their writes and the channel blobs no kept checkpoint references. History before
+      them is gone, resuming and reading the current state are not affected.
+    - Threads not used for `idle_ttl` seconds are deleted.
+    - When the serialized size passes `max_bytes`, least recently used threads are deleted
+      until it fits again.
+
+    Threads stopped at an interrupt (waiting for `human_review`) are never deleted by the
+    last two rules, whatever their age or size; they become evictable once resumed. Runs
+    still in progress are not deleted to make room either, only after `idle_ttl` without
+    a step. Zero or None disables a limit. `stats` counts evictions and the resident size.
+    """
+
+    def __init__(self, *, serde: SerializerProtocol | None = None, keep_last: int | None = DEFAULT_KEEP_LAST,
+                 idle_ttl: float | None = DEFAULT_IDLE_TTL, max_bytes: int | None = DEFAULT_MAX_BYTES):
+        super().__init__(serde=serde)
+        self.keep_last = keep_last
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.RLock()
+        # Threads that can be evicted, least recently used first; interrupted ones are left out
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        # Per thread: namespace -> checkpoint the interrupt was written against
+        self._interrupted: dict[str, dict[str, str]] = {}
+        self._running: set[str] = set()
+        self._thread_bytes: dict[str, int] = {}
+        # Per thread: channel versions of each checkpoint, writes keys and blob keys
+        self._versions: dict[str, dict[tuple[str, str], dict]] = {}
+        self._write_keys: dict[str, set[tuple[str, str, str]]] = {}
+        self._blob_keys: dict[str, set[tuple]] = {}
+        self.stats = {"resident_bytes": 0, "pruned_checkpoints": 0, "expired_threads": 0, "evicted_threads": 0}
+
+    def _add_bytes(self, thread_id: str, nbytes: int) -> None:
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + nbytes
+        self.stats["resident_bytes"] += nbytes
+
+    def _touch(self, thread_id: str) -> None:
+        if thread_id in self._interrupted:
+            return
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        with self._lock:
+            blob_keys = self._blob_keys.setdefault(thread_id, set())
+            replaced = 0
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                if key in self.blobs:
+                    replaced += _size(self.blobs[key])
+                blob_keys.add(key)
+
+            result = super().put(config, checkpoint, metadata, new_versions)
+
+            saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            added = sum(_size(self.blobs[(thread_id, checkpoint_ns, channel, version)])
+                        for channel, version in new_versions.items())
+            self._add_bytes(thread_id, added - replaced + _size(saved[0]) + _size(saved[1]))
+            self._versions.setdefault(thread_id, {})[(checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+
+            if checkpoint_ns == "":
+                if _has_next(checkpoint):
+                    self._running.add(thread_id)
+                else:
+                    self._running.discard(thread_id)
+
+            # The interrupt was answered once a checkpoint follows the interrupted one. Checkpoints
+            # are saved in the background, so earlier ones can still arrive after the interrupt
+            pending = self._interrupted.get(thread_id)
+            parent_id = config["configurable"].get("checkpoint_id")
+            if pending is not None and parent_id is not None and pending.get(checkpoint_ns) == parent_id:
+                del pending[checkpoint_ns]
+                if not pending:
+                    del self._interrupted[thread_id]
+
+            self._touch(thread_id)
+            self._prune(thread_id, checkpoint_ns)
+            self._enforce(thread_id)
+            return result
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        outer_key = (thread_id, checkpoint_ns, config["configurable"]["checkpoint_id"])
+
+        with self._lock:
+            before = sum(_size(write[2]) for write in self.writes.get(outer_key, {}).values())
+            super().put_writes(config, writes, task_id, task_path)
+            after = sum(_size(write[2]) for write in self.writes[outer_key].values())
+            self._add_bytes(thread_id, after - before)
+            self._write_keys.setdefault(thread_id, set()).add(outer_key)
+
+            if any(channel == INTERRUPT for channel, _ in writes):
+                self._interrupted.setdefault(thread_id, {})[checkpoint_ns] = config["configurable"]["checkpoint_id"]
+                self._last_used.pop(thread_id, None)
+            else:
+                self._touch(thread_id)
+            self._enforce(thread_id)
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id in self._last_used:
+                self._touch(thread_id)
+            self._enforce(thread_id)
+            return super().get_tuple(config)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Drop the checkpoints of a namespace older than the last `keep_last`"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if not self.keep_last or len(checkpoints) <= self.keep_last:
+            return
+
+        # Checkpoint ids are time-ordered and dicts keep insertion order
+        for checkpoint_id in list(checkpoints)[:len(checkpoints) - self.keep_last]:
+            saved = checkpoints.pop(checkpoint_id)
+            freed = _size(saved[0]) + _size(saved[1])
+            self._versions[thread_id].pop((checkpoint_ns, checkpoint_id), None)
+
+            outer_key = (thread_id, checkpoint_ns, checkpoint_id)
+            writes = self.writes.pop(outer_key, None)
+            if writes:
+                freed += sum(_size(write[2]) for write in writes.values())
+            self._write_keys.get(thread_id, set()).discard(outer_key)
+
+            self._add_bytes(thread_id, -freed)
+            self.stats["pruned_checkpoints"] += 1
+
+        # Blobs of channel versions that no kept checkpoint points to anymore
+        versions = self._versions[thread_id]
+        live = {(channel, version) for checkpoint_id in checkpoints
+                for channel, version in versions.get((checkpoint_ns, checkpoint_id), {}).items()}
+        blob_keys = self._blob_keys.get(thread_id, set())
+        for key in [key for key in blob_keys if key[1] == checkpoint_ns and (key[2], key[3]) not in live]:
+            blob_keys.discard(key)
+            blob = self.blobs.pop(key, None)
+            if blob is not None:
+                self._add_bytes(thread_id, -_size(blob))
+
+    def _evict(self, thread_id: str) -> None:
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self._versions.pop(thread_id, None)
+
+        self._interrupted.pop(thread_id, None)
+        self._running.discard(thread_id)
+        self._last_used.pop(thread_id, None)
+        self.stats["resident_bytes"] -= self._thread_bytes.pop(thread_id, 0)
+
+    def _enforce(self, current: str | None = None) -> None:
+        """Delete idle threads, then LRU threads while over `max_bytes`; never `current`"""
+        if self.idle_ttl:
+            cutoff = time.monotonic() - self.idle_ttl
+            while self._last_used:
+                thread_id, last_used = next(iter(self._last_used.items()))
+                if last_used > cutoff or thread_id == current:
+                    break
+                self._evict(thread_id)
+                self.stats["expired_threads"] += 1
+
+        # Checked before copying the LRU order: under the cap this stays O(1) per operation
+        if self.max_bytes and self.stats["resident_bytes"] > self.max_bytes:
+            candidates = iter(list(self._last_used))
+            while self.stats["resident_bytes"] > self.max_bytes:
+                thread_id = next(candidates, None)
+                if thread_id is None:
+                    break
+                if thread_id != current and thread_id not in self._running:
+                    self._evict(thread_id)
+                    self.stats["evicted_threads"] += 1
+
+    def evict_expired(self) -> None:
+        """Apply the TTL and the size cap now, for processes that go idle between batches"""
+        with self._lock:
+            self._enforce()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._evict(thread_id)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "threads": len(self.storage),
+                "interrupted_threads": len(self._interrupted),
+                "running_threads": len(self._running),
+                "checkpoints": sum(len(checkpoints) for namespaces in self.storage.values()
+                                   for checkpoints in namespaces.values())
+            }
+
+
+def memory_saver_from_env() -> BoundedMemorySaver:
+    """In-memory saver with the CHECKPOINT_KEEP_LAST, CHECKPOINT_IDLE_TTL and CHECKPOINT_MAX_MB limits (0 disables one)"""
+    return BoundedMemorySaver(
+        serde=serializer_from_env(),
+        keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", DEFAULT_KEEP_LAST)),
+        idle_ttl=float(os.getenv("CHECKPOINT_IDLE_TTL", DEFAULT_IDLE_TTL)),
+        max_bytes=int(float(os.getenv("CHECKPOINT_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024)
+    )
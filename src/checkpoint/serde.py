@@ -0,0 +1,196 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Protocol
+
+import ormsgpack
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer, _msgpack_default, _msgpack_ext_hook
+
+# Strings of at least this many characters are stored once by content and referenced
+DEFAULT_MIN_BLOB_CHARS = 256
+
+# Extension code well above the ones used by JsonPlusSerializer (0-6)
+EXT_CONTENT = 65
+
+_OPTIONS = (
+    ormsgpack.OPT_NON_STR_KEYS
+    | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+    | ormsgpack.OPT_PASSTHROUGH_DATETIME
+    | ormsgpack.OPT_PASSTHROUGH_ENUM
+    | ormsgpack.OPT_PASSTHROUGH_UUID
+    | ormsgpack.OPT_REPLACE_SURROGATES
+)
+
+
+class ContentStore(Protocol):
+    """Where the large strings referenced by compact checkpoints are kept, by digest"""
+
+    def get(self, digest: bytes) -> bytes | None: ...
+
+    def put(self, digest: bytes, data: bytes) -> None: ...
+
+
+class SqliteContentStore:
+    """Content table next to the checkpoints, shared by every thread and process using the file.
+
+    New entries are buffered: SqliteSaver writes them in the transaction of the checkpoint
+    that references them (`take_pending`), and hands them back with `restore` if that
+    transaction rolls back; other users call `flush`. Entries are never deleted with a
+    thread since other threads may reference them.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS contents (digest BLOB PRIMARY KEY, data BLOB NOT NULL)")
+        self.lock = threading.Lock()
+        self._pending: dict[bytes, bytes] = {}
+
+    def get(self, digest: bytes) -> bytes | None:
+        with self.lock:
+            data = self._pending.get(digest)
+            if data is None:
+                row = self.conn.execute("SELECT data FROM contents WHERE digest = ?", (digest,)).fetchone()
+                data = row[0] if row else None
+        return data
+
+    def put(self, digest: bytes, data: bytes) -> None:
+        with self.lock:
+            self._pending[digest] = data
+
+    def take_pending(self) -> list[tuple[bytes, bytes]]:
+        """Entries not written yet; the caller must write them before anything referencing them"""
+        with self.lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.items())
+
+    def restore(self, rows: list[tuple[bytes, bytes]]) -> None:
+        """Buffer again entries taken by a write that didn't commit, their digests are cached already"""
+        with self.lock:
+            for digest, data in rows:
+                self._pending.setdefault(digest, data)
+
+    def flush(self) -> None:
+        rows = self.take_pending()
+        if rows:
+            try:
+                with self.lock:
+                    self.conn.executemany("INSERT OR IGNORE INTO contents VALUES (?, ?)", rows)
+            except BaseException:
+                self.restore(rows)
+                raise
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """msgpack serializer that stores large strings once, by content.
+
+    The email, its draft and the search results are copied into the writes of every node
+    that touches them and into the channel blobs of each superstep. Here each string of at
+    least `min_blob_chars` is replaced by a 16-byte digest and written to `store` once, so
+    repeated copies (across steps, threads or near-identical emails) cost a reference.
+    Recently seen strings and digests are cached, so a string is hashed and fetched once.
+
+    Values are written with type "compact"; checkpoints written by JsonPlusSerializer
+    ("msgpack") still load.
+    """
+
+    def __init__(self, store: ContentStore, min_blob_chars: int = DEFAULT_MIN_BLOB_CHARS, cache_size: int = 4096):
+        super().__init__(__unpack_ext_hook__=self._ext_hook)
+        self.store = store
+        self.min_blob_chars = min_blob_chars
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._digests: OrderedDict[str, bytes] = OrderedDict()
+        self._contents: OrderedDict[bytes, str] = OrderedDict()
+        self.stats = {"blobs_stored": 0, "blob_refs": 0}
+
+    def _remember(self, text: str, digest: bytes) -> None:
+        with self._lock:
+            self._digests[text] = digest
+            self._contents[digest] = text
+            if len(self._digests) > self.cache_size:
+                self._digests.popitem(last=False)
+            if len(self._contents) > self.cache_size:
+                self._contents.popitem(last=False)
+
+    def _reference(self, text: str) -> ormsgpack.Ext:
+        # str caches its hash, so looking up the same string object again is O(1)
+        digest = self._digests.get(text)
+        if digest is None:
+            data = text.encode("utf-8", "surrogatepass")
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            self.store.put(digest, data)
+            self.stats["blobs_stored"] += 1
+            self._remember(text, digest)
+        self.stats["blob_refs"] += 1
+        return ormsgpack.Ext(EXT_CONTENT, digest)
+
+    def _compact(self, value: Any) -> Any:
+        """Copy of plain dicts, lists and tuples with long strings replaced by references"""
+        kind = type(value)
+        if kind is str:
+            return self._reference(value) if len(value) >= self.min_blob_chars else value
+        if kind is dict:
+            return {key: self._compact(item) for key, item in value.items()}
+        if kind is list or kind is tuple:
+            return [self._compact(item) for item in value]
+        # Messages, pydantic models, etc. go through the JsonPlusSerializer encoding
+        return value
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code == EXT_CONTENT:
+            digest = bytes(data)
+            text = self._contents.get(digest)
+            if text is None:
+                content = self.store.get(digest)
+                if content is None:
+                    raise KeyError(f"Content {digest.hex()} is missing from the content store")
+                text = content.decode("utf-8", "surrogatepass")
+                self._remember(text, digest)
+            return text
+        return _msgpack_ext_hook(code, data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        # Each value is encoded once: no trial encoding to decide whether to walk it
+        if obj is None:
+            return super().dumps_typed(obj)
+        kind = type(obj)
+        if kind is str:
+            if len(obj) >= self.min_blob_chars:
+                obj = self._reference(obj)
+        elif kind is dict:
+            # The checkpoint and its metadata only hold ids, versions and step numbers
+            if "channel_versions" not in obj and "step" not in obj:
+                obj = self._compact(obj)
+        elif kind is list or kind is tuple:
+            obj = self._compact(obj)
+        elif kind is bytes or kind is bytearray:
+            return super().dumps_typed(obj)
+        return "compact", ormsgpack.packb(obj, default=_msgpack_default, option=_OPTIONS)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, data_ = data
+        if type_ == "compact":
+            return ormsgpack.unpackb(data_, ext_hook=self._ext_hook, option=ormsgpack.OPT_NON_STR_KEYS)
+        return super().loads_typed(data)
+
+
+def serializer_from_env(path: str | None = None) -> CompactSerializer | None:
+    """CompactSerializer when CHECKPOINT_SERDE=compact, keeping contents in the `path` database"""
+    if os.getenv("CHECKPOINT_SERDE", "msgpack") != "compact":
+        return None
+
+    # Contents are shared by threads, so deleting or evicting one can't free them: in memory
+    # they would grow for the life of the process
+    if not path:
+        raise ValueError("CHECKPOINT_SERDE=compact needs CHECKPOINT_DB, its contents are kept in the database")
+    return CompactSerializer(SqliteContentStore(path), int(os.getenv("CHECKPOINT_MIN_BLOB_CHARS", DEFAULT_MIN_BLOB_CHARS)))
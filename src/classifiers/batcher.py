@@ -0,0 +1,116 @@
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_BATCH = 16
+
+# Set by the batch leader when the batched call failed; each caller then runs its own single call
+_RETRY_SINGLE = object()
+
+
+class MicroBatcher(Generic[T, R]):
+    """Groups calls arriving within `window` seconds (at most `max_batch`) into one batched call.
+
+    There is no background thread: the first caller of a batch waits for the window to close,
+    makes the batched call and hands every waiting caller its result. When the batched call
+    fails or returns the wrong number of results, every caller falls back to `call_one` in its
+    own thread, so a bad batch costs one extra round trip and not a serial retry.
+    """
+
+    def __init__(self, call_one: Callable[[T], R], call_many: Callable[[list[T]], list[R]],
+                 window: float, max_batch: int = DEFAULT_MAX_BATCH):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+
+        self.call_one = call_one
+        self.call_many = call_many
+        self.window = window
+        self.max_batch = max_batch
+
+        self._cond = threading.Condition()
+        self._open: list[tuple[T, Future]] | None = None
+        self.stats = {"items": 0, "calls": 0, "batches": 0, "batched_items": 0, "fallbacks": 0}
+
+    def submit(self, item: T) -> R:
+        """Blocking call for one item; returns its result once its batch has run"""
+        future: Future = Future()
+
+        with self._cond:
+            self.stats["items"] += 1
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = []
+            batch.append((item, future))
+
+            # A full batch closes right away, the next caller starts a new one
+            if len(batch) >= self.max_batch:
+                self._open = None
+                self._cond.notify_all()
+
+        if leader:
+            with self._cond:
+                self._cond.wait_for(lambda: self._open is not batch, timeout=self.window)
+                if self._open is batch:
+                    self._open = None
+            self._run(batch)
+
+        result = future.result()
+        if result is _RETRY_SINGLE:
+            with self._cond:
+                self.stats["calls"] += 1
+            return self.call_one(item)
+        return result
+
+    def _run(self, batch: list[tuple[T, Future]]) -> None:
+        items = [item for item, _ in batch]
+
+        with self._cond:
+            self.stats["calls"] += 1
+            if len(batch) > 1:
+                self.stats["batches"] += 1
+                self.stats["batched_items"] += len(batch)
+
+        # A lone item keeps the single-item prompt, so its response cache entry is shared
+        if len(batch) == 1:
+            try:
+                batch[0][1].set_result(self.call_one(items[0]))
+            except Exception as e:
+                batch[0][1].set_exception(e)
+            return
+
+        try:
+            results = self.call_many(items)
+            if len(results) != len(items):
+                raise ValueError(f"Expected {len(items)} results, got {len(results)}")
+        except Exception:
+            with self._cond:
+                self.stats["fallbacks"] += 1
+            for _, future in batch:
+                future.set_result(_RETRY_SINGLE)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "calls_per_item": self.stats["calls"] / self.stats["items"] if self.stats["items"] else 0.0,
+            "mean_batch_size": self.stats["batched_items"] / self.stats["batches"] if self.stats["batches"] else 0.0
+        }
+
+
+def batcher_from_env(prefix: str, call_one: Callable[[T], R],
+                     call_many: Callable[[list[T]], list[R]]) -> MicroBatcher[T, R] | None:
+    """Build a batcher from `<prefix>_WINDOW_MS` and `<prefix>_MAX`, None unless the window is set"""
+    window_ms = float(os.getenv(f"{prefix}_WINDOW_MS", "0"))
+    if window_ms <= 0:
+        return None
+
+    max_batch = int(os.getenv(f"{prefix}_MAX", DEFAULT_MAX_BATCH))
+    return MicroBatcher(call_one, call_many, window_ms / 1000, max_batch)
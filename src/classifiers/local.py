@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import random
+import threading
+from typing import Iterable, TypedDict
+
+import numpy as np
+
+from src.retrieval.index import hash_embed
+
+DEFAULT_DIM = 2048
+DEFAULT_THRESHOLD = 0.9
+# Share of confident predictions still sent to the LLM, to measure the agreement of the hits
+DEFAULT_AUDIT_RATE = 0.05
+
+
+class Prediction(TypedDict):
+    labels: dict[str, str] # Most likely class per field, e.g. {"intent": "billing"}
+    confidence: dict[str, float]
+    confident: bool # Every field is above the threshold, the LLM can be skipped
+    audited: bool # Confident, but sampled to be checked against the LLM instead
+
+
+class LocalClassifier:
+    """Softmax regression over hashed n-gram features, one weight matrix per label field.
+
+    It is trained from labels previously produced by the LLM and evaluated with a single
+    matrix product, so a prediction costs microseconds instead of an LLM round trip.
+    """
+
+    def __init__(self, dim: int, weights: dict[str, np.ndarray], biases: dict[str, np.ndarray],
+                 classes: dict[str, list[str]]):
+        self.dim = dim
+        self.weights = weights
+        self.biases = biases
+        self.classes = classes
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.classes)
+
+    def probabilities(self, texts: Iterable[str]) -> dict[str, np.ndarray]:
+        features = hash_embed(texts, self.dim)
+        return {field: _softmax(features @ self.weights[field] + self.biases[field]) for field in self.classes}
+
+    def predict(self, text: str, threshold: float = DEFAULT_THRESHOLD) -> Prediction:
+        labels, confidence = {}, {}
+        for field, probabilities in self.probabilities([text]).items():
+            best = int(np.argmax(probabilities[0]))
+            labels[field] = self.classes[field][best]
+            confidence[field] = float(probabilities[0, best])
+
+        return {
+            "labels": labels,
+            "confidence": confidence,
+            "confident": all(value >= threshold for value in confidence.values()),
+            "audited": False
+        }
+
+    @classmethod
+    def train(cls, texts: list[str], labels: list[dict[str, str]], fields: list[str], dim: int = DEFAULT_DIM,
+              epochs: int = 300, learning_rate: float = 2.0, l2: float = 1e-4) -> "LocalClassifier":
+        """Fit one softmax regression per field with full-batch gradient descent"""
+        features = hash_embed(texts, dim)
+        weights, biases, classes = {}, {}, {}
+
+        for field in fields:
+            rows = [i for i, label in enumerate(labels) if label.get(field) is not None]
+            if not rows:
+                continue
+
+            field_classes = sorted({labels[i][field] for i in rows})
+            targets = np.zeros((len(rows), len(field_classes)), dtype=np.float32)
+            targets[np.arange(len(rows)), [field_classes.index(labels[i][field]) for i in rows]] = 1.0
+
+            x = features[rows]
+            w = np.zeros((dim, len(field_classes)), dtype=np.float32)
+            b = np.zeros(len(field_classes), dtype=np.float32)
+
+            for _ in range(epochs):
+                error = (_softmax(x @ w + b) - targets) / len(rows)
+                w -= learning_rate * (x.T @ error + l2 * w)
+                b -= learning_rate * error.sum(axis=0)
+
+            weights[field], biases[field], classes[field] = w, b, field_classes
+
+        return cls(dim, weights, biases, classes)
+
+    def save(self, path: str) -> None:
+        arrays = {"dim": np.array(self.dim), "fields": np.array(self.fields)}
+        for field in self.classes:
+            arrays[f"weights_{field}"] = self.weights[field]
+            arrays[f"bias_{field}"] = self.biases[field]
+            arrays[f"classes_{field}"] = np.array(self.classes[field])
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        with np.load(path) as data:
+            fields = [str(field) for field in data["fields"]]
+            return cls(
+                int(data["dim"]),
+                {field: data[f"weights_{field}"] for field in fields},
+                {field: data[f"bias_{field}"] for field in fields},
+                {field: [str(c) for c in data[f"classes_{field}"]] for field in fields}
+            )
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class FastPathClassifier:
+    """Answers classifications locally when confident, otherwise lets the caller use the LLM.
+
+    Every LLM answer is appended to the label log, which is the training set for the next
+    model. A share `audit_rate` of the confident predictions is sent to the LLM anyway and
+    compared with its answer, so `agreement` measures the predictions that skip the LLM.
+    The model must predict every one of `fields`, the labels the caller reads.
+    """
+
+    def __init__(self, model: LocalClassifier | None, fields: list[str], threshold: float = DEFAULT_THRESHOLD,
+                 label_log: str | None = None, audit_rate: float = DEFAULT_AUDIT_RATE, seed: int | None = None):
+        if model is not None and (missing := [field for field in fields if field not in model.fields]):
+            raise ValueError(f"The local classifier has no {', '.join(missing)} field, "
+                             f"train it with --fields {' '.join(fields)}")
+
+        self.model = model
+        self.fields = fields
+        self.threshold = threshold
+        self.label_log = label_log
+        self.audit_rate = audit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "fallbacks": 0, "audited": 0, "agreements": 0}
+
+    def predict(self, text: str) -> Prediction | None:
+        """Local prediction for `text`; counts a hit when it's confident enough to skip the LLM"""
+        if self.model is None:
+            return None
+
+        prediction = self.model.predict(text, self.threshold)
+        if prediction["confident"]:
+            with self._lock:
+                audited = self._random.random() < self.audit_rate
+                if not audited:
+                    self.stats["hits"] += 1
+            if audited:
+                prediction = {**prediction, "confident": False, "audited": True}
+
+        return prediction
+
+    def record(self, text: str, prediction: Prediction | None, llm_labels: dict) -> None:
+        """Store the LLM answer of a fallback, and compare it with an audited prediction"""
+        labels = {field: llm_labels[field] for field in self.fields if field in llm_labels}
+
+        with self._lock:
+            self.stats["fallbacks"] += 1
+            if prediction is not None and prediction["audited"]:
+                self.stats["audited"] += 1
+                self.stats["agreements"] += all(prediction["labels"][field] == labels.get(field)
+                                                for field in self.fields)
+
+            if self.label_log:
+                with open(self.label_log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"text": text, "labels": labels}) + "\n")
+
+    def report(self) -> dict:
+        total = self.stats["hits"] + self.stats["fallbacks"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / total if total else 0.0,
+            "agreement": self.stats["agreements"] / self.stats["audited"] if self.stats["audited"] else None
+        }
+
+
+def fast_path_from_env(prefix: str, fields: list[str]) -> FastPathClassifier | None:
+    """Build a fast path for `fields` from `<prefix>_MODEL` and `<prefix>_LOG`, None if neither is set"""
+    model_path = os.getenv(f"{prefix}_MODEL")
+    label_log = os.getenv(f"{prefix}_LOG")
+    if not model_path and not label_log:
+        return None
+
+    model = LocalClassifier.load(model_path) if model_path and os.path.exists(model_path) else None
+    threshold = float(os.getenv("CLASSIFIER_THRESHOLD", DEFAULT_THRESHOLD))
+    audit_rate = float(os.getenv("CLASSIFIER_AUDIT_RATE", DEFAULT_AUDIT_RATE))
+
+    return FastPathClassifier(model, fields, threshold, label_log, audit_rate)
+
+
+def read_label_log(path: str) -> tuple[list[str], list[dict[str, str]]]:
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                texts.append(record["text"])
+                labels.append(record["labels"])
+    return texts, labels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and evaluate the local fast-path classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train = commands.add_parser("train", help="Train a model from a label log written by FastPathClassifier")
+    train.add_argument("log")
+    train.add_argument("model")
+    train.add_argument("--fields", nargs="+", default=["intent", "urgency"])
+    train.add_argument("--dim", type=int, default=DEFAULT_DIM)
+
+    evaluate = commands.add_parser("evaluate", help="Hit rate and agreement with the LLM labels of a log")
+    evaluate.add_argument("log")
+    evaluate.add_argument("model")
+    evaluate.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args()
+    texts, labels = read_label_log(args.log)
+
+    if args.command == "train":
+        model = LocalClassifier.train(texts, labels, args.fields, dim=args.dim)
+        model.save(args.model)
+        print(f"Trained on {len(texts)} examples: " +
+              ", ".join(f"{field} {model.classes[field]}" for field in model.fields))
+    else:
+        model = LocalClassifier.load(args.model)
+        hits = agreements = 0
+        for text, label in zip(texts, labels):
+            prediction = model.predict(text, args.threshold)
+            if prediction["confident"]:
+                hits += 1
+                agreements += all(prediction["labels"][field] == label.get(field) for field in model.fields)
+
+        print(f"Hit rate: {hits / len(texts):.1%}, agreement on hits: "
+              f"{agreements / hits if hits else 0:.1%} ({len(texts)} examples, threshold {args.threshold})")
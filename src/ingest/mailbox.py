@@ -0,0 +1,265 @@
+import argparse
+import html
+import json
+import mmap
+import os
+import re
+import threading
+from collections import deque
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from email.utils import parseaddr
+from typing import Iterator
+
+# Long threads with quoted history add cost to every prompt, not information
+MAX_CONTENT_CHARS = int(os.getenv("INGEST_MAX_CONTENT_CHARS", "20000"))
+
+# Parsed part of a memory-mapped mbox is released in steps of this size
+_RELEASE_BYTES = 64 * 1024 * 1024
+
+_parser = BytesParser(policy=policy.default)
+_TAGS = re.compile(r"<[^>]+>")
+
+
+def parse_message(raw: bytes, fallback_id: str) -> dict:
+    """Email dict for the agent (email_id, sender_email, email_content) from a raw RFC 5322 message"""
+    message: EmailMessage = _parser.parsebytes(raw)
+
+    body = message.get_body(preferencelist=("plain", "html"))
+    content = ""
+    if body is not None:
+        try:
+            content = body.get_content()
+        except (LookupError, UnicodeError):
+            # Unknown or wrong charset declared by the sender
+            content = body.get_payload(decode=True).decode("utf-8", errors="replace")
+        if body.get_content_subtype() == "html":
+            content = html.unescape(_TAGS.sub(" ", content))
+
+    subject = str(message.get("Subject", "")).strip()
+    if subject:
+        content = f"Subject: {subject}\n\n{content}"
+
+    return {
+        "email_id": str(message.get("Message-ID", "")).strip("<> ") or fallback_id,
+        "sender_email": parseaddr(str(message.get("From", "")))[1],
+        "email_content": content.strip()[:MAX_CONTENT_CHARS]
+    }
+
+
+def read_mbox(path: str, start: int = 0) -> Iterator[dict]:
+    """Yield the messages of an mbox file from byte offset `start`.
+
+    The file is memory-mapped and scanned for the "From " separator lines, so only the
+    message being parsed is copied into memory whatever the size of the mailbox. Each
+    email carries `source_offset`, the byte offset where the next message starts.
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    name = os.path.basename(path)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = start
+        if mm[position:position + 5] != b"From ":
+            # Not on a message boundary (stray leading text), move to the next one
+            separator = mm.find(b"\nFrom ", position)
+            if separator < 0:
+                return
+            position = separator + 1
+
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        released = 0
+
+        while position < len(mm):
+            # Drop pages already parsed, otherwise they count towards RSS until the map is closed
+            if hasattr(mmap, "MADV_DONTNEED") and position - released >= _RELEASE_BYTES:
+                boundary = position - position % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, released, boundary - released)
+                released = boundary
+
+            separator = mm.find(b"\nFrom ", position)
+            end = len(mm) if separator < 0 else separator + 1
+
+            # Skip the "From sender date" envelope line
+            header_end = mm.find(b"\n", position, end)
+            raw = mm[header_end + 1:end] if header_end >= 0 else b""
+            # mboxrd escapes body lines starting with "From " as ">From "
+            raw = raw.replace(b"\n>From ", b"\nFrom ")
+
+            email = parse_message(raw, f"{name}-{position}")
+            email["source_offset"] = end
+            yield email
+
+            position = end
+
+
+def _message_files(path: str, after: str | None) -> Iterator[str]:
+    """Relative paths of the messages of a Maildir or .eml directory, in a stable order"""
+    if os.path.isdir(os.path.join(path, "cur")) or os.path.isdir(os.path.join(path, "new")):
+        # Maildir: only delivered messages, tmp/ is still being written
+        directories = [d for d in ("cur", "new") if os.path.isdir(os.path.join(path, d))]
+        names = (os.path.join(d, entry.name) for d in directories
+                 for entry in os.scandir(os.path.join(path, d)) if entry.is_file())
+    else:
+        names = (os.path.relpath(os.path.join(root, file), path)
+                 for root, _, files in os.walk(path) for file in files if file.endswith(".eml"))
+
+    for name in sorted(names):
+        if after is None or name > after:
+            yield name
+
+
+def read_directory(path: str, after: str | None = None) -> Iterator[dict]:
+    """Yield the messages of a Maildir or a directory of .eml files, skipping names up to `after`"""
+    for name in _message_files(path, after):
+        with open(os.path.join(path, name), "rb") as f:
+            email = parse_message(f.read(), name)
+        email["source_offset"] = name
+        yield email
+
+
+class MailboxReader:
+    """Resumable reader over an mbox file, a Maildir or a directory of .eml files.
+
+    Emails finish out of order when processed concurrently, so the saved position only
+    moves past an email once every email before it is done (`done`). After a crash, at most
+    the emails that were in flight are processed again. Emails whose run failed (an LLM or
+    network error) are recorded in `failed` as they're passed, and read again first on the
+    next iteration until they succeed. The state file maps each mailbox path to its position
+    and failed emails, and is replaced atomically.
+    """
+
+    def __init__(self, path: str, state_path: str | None = None, save_every: int = 50):
+        self.path = os.path.abspath(path)
+        self.state_path = state_path
+        self.save_every = save_every
+
+        self._lock = threading.Lock()
+        self._in_flight: deque[int | str] = deque()
+        self._finished: set[int | str] = set()
+        self._since_save = 0
+        # Where to read from to get each email in flight, and failures not passed yet
+        self._starts: dict[int | str, int | str | None] = {}
+        self._failures: dict[int | str, list] = {}
+        self._retrying: dict[int | str, list] = {}
+
+        state = self._load().get(self.path)
+        if not isinstance(state, dict):
+            # State files written before failures were recorded only hold the position
+            state = {"position": state}
+        self.position: int | str | None = state["position"]
+        # [read from, source_offset] of each failed email
+        self.failed: list[list] = state.get("failed", [])
+
+    def _load(self) -> dict:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read(self, start: int | str | None) -> Iterator[dict]:
+        if os.path.isdir(self.path):
+            return read_directory(self.path, start)
+        return read_mbox(self.path, start or 0)
+
+    def _retries(self) -> Iterator[dict]:
+        with self._lock:
+            failed = list(self.failed)
+
+        for start, offset in failed:
+            emails = self._read(start)
+            email = next(emails, None)
+            emails.close()
+
+            with self._lock:
+                if email is None or email["source_offset"] != offset:
+                    # No longer in the mailbox
+                    self.failed.remove([start, offset])
+                    continue
+                self._retrying[offset] = [start, offset]
+            yield email
+
+    def __iter__(self) -> Iterator[dict]:
+        yield from self._retries()
+
+        previous = self.position
+        for email in self._read(self.position):
+            with self._lock:
+                self._in_flight.append(email["source_offset"])
+                self._starts[email["source_offset"]] = previous
+            previous = email["source_offset"]
+            yield email
+
+    def done(self, email: dict, outcome: dict | None = None) -> None:
+        """Mark an email as processed; usable as `on_outcome` of process_emails"""
+        offset = email["source_offset"]
+        failed = outcome is not None and outcome["status"] == "failed"
+
+        with self._lock:
+            retried = self._retrying.pop(offset, None)
+            if retried is not None:
+                if not failed:
+                    self.failed.remove(retried)
+                self._since_save += 1
+            else:
+                start = self._starts.pop(offset)
+                if failed:
+                    self._failures[offset] = [start, offset]
+                self._finished.add(offset)
+
+            while self._in_flight and self._in_flight[0] in self._finished:
+                self.position = self._in_flight.popleft()
+                self._finished.discard(self.position)
+                # Recorded only once passed, so a saved failure is never also ahead of the position
+                if (failure := self._failures.pop(self.position, None)) is not None:
+                    self.failed.append(failure)
+                self._since_save += 1
+
+            if self._since_save >= self.save_every:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        self._since_save = 0
+        if not self.state_path:
+            return
+
+        state = self._load()
+        state[self.path] = {"position": self.position, "failed": self.failed}
+
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.state_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temporary, self.state_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the emails of a mailbox through the email agent")
+    parser.add_argument("mailbox", help="mbox file, Maildir or directory of .eml files")
+    parser.add_argument("--state", default="data/ingest_state.json", help="Where the read position is saved")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    from src.agents.email_batch import process_emails
+
+    reader = MailboxReader(args.mailbox, args.state)
+    try:
+        # Emails are read only as fast as the workers take them, the reader never runs ahead
+        report = process_emails(reader, max_concurrency=args.concurrency, on_outcome=reader.done)
+    finally:
+        reader.save()
+
+    print(f"Processed {len(report['completed'])} emails, "
+          f"{len(report['interrupted'])} waiting for review, "
+          f"{len(report['failed'])} failed in {report['elapsed']:.2f}s "
+          f"({report['throughput']:.2f} emails/s)")
+    if reader.failed:
+        print(f"{len(reader.failed)} failed emails will be read again on the next run")
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Hash the normalized message list together with the model parameters.
+
+    LangChain already drops message ids before serializing the prompt; here the JSON is
+    re-encoded with sorted keys so equivalent payloads always produce the same key.
+    `llm_string` carries temperature, bound tools and structured output schemas, so
+    `bind_tools`/`with_structured_output` calls never share entries with plain calls.
+    """
+    try:
+        prompt = json.dumps(json.loads(prompt), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        pass
+
+    return hashlib.sha256(f"{prompt}\x00{llm_string}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache(BaseCache):
+    """LLM response cache with a bounded in-memory LRU in front of a SQLite file.
+
+    Entries older than `ttl` seconds are treated as misses and removed. Every operation is
+    guarded by a lock, so the same cache can be shared by concurrent graphs and threads.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl: float | None = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._memory: OrderedDict[str, tuple[float, RETURN_VAL_TYPE]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL NOT NULL, value TEXT NOT NULL)"
+        )
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key: str, created: float, value: RETURN_VAL_TYPE) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_lookup(self, key: str) -> RETURN_VAL_TYPE | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+
+            created, value = entry
+            if self._expired(created):
+                del self._memory[key]
+                return None
+
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+
+        # Callers may set ids or metadata on the returned messages, never hand out the cached objects
+        return [generation.model_copy(deep=True) for generation in value]
+
+    def _disk_lookup(self, key: str) -> RETURN_VAL_TYPE | None:
+        with self._lock:
+            row = self._conn.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            created, serialized = row
+            if self._expired(created):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                return None
+
+            value = loads(serialized)
+            self._remember(key, created, value)
+            self.stats["disk_hits"] += 1
+
+        return [generation.model_copy(deep=True) for generation in value]
+
+    def _store(self, key: str, return_val: RETURN_VAL_TYPE) -> None:
+        created = time.time()
+        serialized = dumps(return_val)
+        with self._lock:
+            self._remember(key, created, [generation.model_copy(deep=True) for generation in return_val])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, created, value) VALUES (?, ?, ?)",
+                (key, created, serialized)
+            )
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = cache_key(prompt, llm_string)
+        value = self._memory_lookup(key)
+        return value if value is not None else self._disk_lookup(key)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self._store(cache_key(prompt, llm_string), return_val)
+
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        # Memory hits are answered on the loop; only disk reads go to a thread
+        key = cache_key(prompt, llm_string)
+        value = self._memory_lookup(key)
+        return value if value is not None else await asyncio.to_thread(self._disk_lookup, key)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        await asyncio.to_thread(self._store, cache_key(prompt, llm_string), return_val)
+
+    def evict_expired(self) -> int:
+        """Remove expired entries from disk and return how many were dropped"""
+        if self.ttl is None:
+            return 0
+
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            for key in [key for key, (created, _) in self._memory.items() if self._expired(created)]:
+                del self._memory[key]
+            return cursor.rowcount
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM responses")
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.clear)
+
+
+def response_cache_from_env() -> ResponseCache | None:
+    """Build the cache configured through LLM_CACHE_* variables, if any"""
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+
+    ttl = os.getenv("LLM_CACHE_TTL_SECONDS")
+
+    return ResponseCache(
+        path,
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+        ttl=float(ttl) if ttl else None
+    )
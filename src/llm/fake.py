@@ -0,0 +1,255 @@
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Iterator, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+from src.prompts.registry import PREFIX_CACHE_MIN_TOKENS, PREFIX_CACHE_STEP
+
+# Canned answers per structured output schema, cycled in order
+DEFAULT_STRUCTURED_OUTPUTS: dict[str, list[dict]] = {
+    "EmailClassification": [
+        {"intent": "question", "urgency": "low", "topic": "password reset", "summary": "Customer can't reset the password"},
+        {"intent": "bug", "urgency": "medium", "topic": "export", "summary": "Export to PDF crashes"},
+        {"intent": "feature", "urgency": "low", "topic": "dark mode", "summary": "Customer asks for dark mode"},
+        {"intent": "billing", "urgency": "high", "topic": "double charge", "summary": "Customer was charged twice"},
+    ],
+    "IntentClassification": [
+        {"intent": "recipes"},
+        {"intent": "computers"},
+        {"intent": "others"},
+    ],
+}
+
+# Batched schemas: their list field and the schema of its items. The batch size is the number
+# the prompt's last message starts with ("{count} emails:"), items cycle like single calls
+DEFAULT_BATCH_OUTPUTS: dict[str, tuple[str, str]] = {
+    "EmailClassificationBatch": ("classifications", "EmailClassification"),
+}
+
+_BATCH_SIZE_RE = re.compile(r"\s*(\d+)")
+
+
+class LatencyLedger:
+    """Total latency injected by a fake model and its copies (bind_tools, structured output)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.seconds += seconds
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model for benchmarks and offline runs.
+
+    Latency is either fixed (`latency`) or sampled from a lognormal distribution around it
+    (`latency_sigma` > 0) with a seeded generator. When tools are bound, the first turn of
+    a conversation answers with one call per bound tool and arguments built from the tool
+    schema; after the ToolMessages come back it answers with `content`.
+    """
+
+    content: str = "This is a canned answer from the fake model. It has a few sentences so that streaming emits several chunks."
+    latency: float = 0.0
+    latency_sigma: float = 0.0
+    seed: int = 0
+    structured_outputs: dict[str, list[dict]] = Field(default_factory=lambda: dict(DEFAULT_STRUCTURED_OUTPUTS))
+    batch_outputs: dict[str, tuple[str, str]] = Field(default_factory=lambda: dict(DEFAULT_BATCH_OUTPUTS))
+    bound_tools: list[dict] = Field(default_factory=list)
+
+    _ledger: LatencyLedger = PrivateAttr(default_factory=LatencyLedger)
+    _random: random.Random = PrivateAttr()
+    _counters: dict[str, Iterator[int]] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _prefixes: set[str] = PrivateAttr(default_factory=set)
+
+    def model_post_init(self, context: Any) -> None:
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def ledger(self) -> LatencyLedger:
+        return self._ledger
+
+    def _sample_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency
+        with self._lock:
+            return self._random.lognormvariate(0.0, self.latency_sigma) * self.latency
+
+    def _sleep(self) -> None:
+        delay = self._sample_latency()
+        if delay:
+            time.sleep(delay)
+        self._ledger.add(delay)
+
+    async def _asleep(self) -> None:
+        delay = self._sample_latency()
+        if delay:
+            await asyncio.sleep(delay)
+        self._ledger.add(delay)
+
+    def _reply(self, messages: list[BaseMessage]) -> AIMessage:
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        usage = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(self.content) // 4,
+            "total_tokens": prompt_tokens + len(self.content) // 4,
+            "input_token_details": {"cache_read": self._cached_prefix_tokens(messages)}
+        }
+
+        if self.bound_tools and not isinstance(messages[-1], ToolMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": tool["name"], "args": tool["args"], "id": f"call_{uuid.uuid4().hex[:12]}"}
+                    for tool in self.bound_tools
+                ],
+                usage_metadata={**usage, "output_tokens": 10, "total_tokens": prompt_tokens + 10}
+            )
+
+        return AIMessage(content=self.content, usage_metadata=usage)
+
+    def _cached_prefix_tokens(self, messages: list[BaseMessage]) -> int:
+        """Simulated provider prefix cache: a leading system message already seen is a cache read.
+
+        Like OpenAI, prefixes under 1024 tokens are never cached and longer ones in 128 token steps.
+        """
+        if not messages or not isinstance(messages[0], SystemMessage):
+            return 0
+        prefix = str(messages[0].content)
+        with self._lock:
+            seen = prefix in self._prefixes
+            self._prefixes.add(prefix)
+
+        tokens = len(prefix) // 4
+        if not seen or tokens < PREFIX_CACHE_MIN_TOKENS:
+            return 0
+        return tokens - (tokens - PREFIX_CACHE_MIN_TOKENS) % PREFIX_CACHE_STEP
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._sleep()
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await self._asleep()
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # The latency is paid before the first token, the rest arrives at once
+        self._sleep()
+        reply = self._reply(messages)
+        if reply.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(reply.tool_calls)
+            ]))
+            return
+
+        for token in reply.content.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"{token} "))
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        """Return a copy that emits calls to `tools`; the latency ledger is shared with the copy"""
+        bound = []
+        for tool in tools:
+            function = convert_to_openai_tool(tool)["function"]
+            properties = function.get("parameters", {}).get("properties", {})
+            bound.append({"name": function["name"], "args": {name: _example_value(spec) for name, spec in properties.items()}})
+
+        copy = self.model_copy(update={"bound_tools": bound})
+        copy._ledger = self._ledger
+        return copy
+
+    def _picker(self, name: str) -> Callable[[], dict]:
+        outputs = self.structured_outputs[name]
+        with self._lock:
+            counter = self._counters.setdefault(name, itertools.count())
+
+        def pick() -> dict:
+            with self._lock:
+                return dict(outputs[next(counter) % len(outputs)])
+
+        return pick
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> RunnableLambda:
+        """Cycle through the canned outputs registered for the schema name.
+
+        Batch schemas get one item per request in the batch, in a single call.
+        """
+        name = schema["title"] if isinstance(schema, dict) else schema.__name__
+
+        if name in self.batch_outputs:
+            field, item = self.batch_outputs[name]
+            pick_item = self._picker(item)
+
+            def pick(messages: Any) -> dict:
+                return {field: [pick_item() for _ in range(_batch_size(messages))]}
+        else:
+            pick_one = self._picker(name)
+
+            def pick(messages: Any) -> dict:
+                return pick_one()
+
+        def invoke(messages: Any) -> dict:
+            self._sleep()
+            return pick(messages)
+
+        async def ainvoke(messages: Any) -> dict:
+            await self._asleep()
+            return pick(messages)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"fake_structured_{name}")
+
+
+def _batch_size(messages: Any) -> int:
+    """Number of requests in a batch prompt, read from the start of its last message"""
+    if isinstance(messages, list) and messages:
+        messages = messages[-1]
+    text = messages.content if isinstance(messages, BaseMessage) else str(messages)
+    match = _BATCH_SIZE_RE.match(str(text))
+    return int(match.group(1)) if match else 1
+
+
+def _example_value(spec: dict) -> Any:
+    """Smallest valid value for a JSON schema property, used as fake tool arguments"""
+    return {"integer": 2, "number": 2.0, "boolean": True, "array": [], "object": {}}.get(spec.get("type"), "x")
@@ -0,0 +1,165 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+from functools import cache
+
+import httpx
+from dotenv import load_dotenv
+
+_ = load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]"); it's negotiated through
+# TLS, so plain http:// endpoints like a local Ollama keep using HTTP/1.1
+HTTP2 = os.getenv("HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+
+
+def limits() -> httpx.Limits:
+    """Pool sizes from the HTTP_* settings"""
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def timeout() -> httpx.Timeout:
+    """Short connect timeout so a dead endpoint fails fast; reads wait for slow generations"""
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+class _PoolStats:
+    """Request counters of a transport, the pool itself is read from httpcore"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # Requests that started while every allowed connection was busy
+        self.saturated = 0
+
+    def start(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight > HTTP_MAX_CONNECTIONS:
+                self.saturated += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """Keep-alive transport shared by every sync client"""
+
+    def __init__(self):
+        super().__init__(limits=limits(), http2=HTTP2)
+        self.stats = _PoolStats()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.start()
+        try:
+            return super().handle_request(request)
+        finally:
+            self.stats.end()
+
+    @property
+    def connections(self) -> list:
+        return self._pool.connections
+
+
+class AsyncPooledTransport(httpx.AsyncBaseTransport):
+    """Keep-alive transport shared by every async client.
+
+    Connections belong to the event loop that opened them, so each loop gets its own pool;
+    `asyncio.run` per batch then never reuses a socket from a closed loop.
+    """
+
+    def __init__(self):
+        self.stats = _PoolStats()
+        self._lock = threading.Lock()
+        self._pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = \
+            weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._pools.get(loop)
+            if transport is None:
+                transport = self._pools[loop] = httpx.AsyncHTTPTransport(limits=limits(), http2=HTTP2)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.start()
+        try:
+            return await self._transport().handle_async_request(request)
+        finally:
+            self.stats.end()
+
+    async def aclose(self) -> None:
+        transport = self._pools.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+    @property
+    def connections(self) -> list:
+        with self._lock:
+            pools = list(self._pools.values())
+        return [connection for transport in pools for connection in transport._pool.connections]
+
+
+@cache
+def sync_transport() -> PooledTransport:
+    return PooledTransport()
+
+
+@cache
+def async_transport() -> AsyncPooledTransport:
+    return AsyncPooledTransport()
+
+
+@cache
+def sync_client() -> httpx.Client:
+    """Shared sync client, connections are reused across graphs and threads"""
+    return httpx.Client(transport=sync_transport(), timeout=timeout())
+
+
+@cache
+def async_client() -> httpx.AsyncClient:
+    """Shared async client, connections are reused by every task of an event loop"""
+    return httpx.AsyncClient(transport=async_transport(), timeout=timeout())
+
+
+def _stats(transport: PooledTransport | AsyncPooledTransport) -> dict:
+    connections = transport.connections
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        "requests": transport.stats.requests,
+        "in_flight": transport.stats.in_flight,
+        "peak_in_flight": transport.stats.peak_in_flight,
+        "saturated": transport.stats.saturated,
+        "connections": len(connections),
+        "idle_connections": idle,
+        "active_connections": len(connections) - idle,
+        "max_connections": HTTP_MAX_CONNECTIONS
+    }
+
+
+def pool_stats() -> dict:
+    """Usage of the shared pools; requests well above connections means keep-alive is working"""
+    stats = {}
+    if sync_transport.cache_info().currsize:
+        stats["sync"] = _stats(sync_transport())
+    if async_transport.cache_info().currsize:
+        stats["async"] = _stats(async_transport())
+    return stats
@@ -3,16 +3,24 @@ import os
 from dotenv import load_dotenv
 from langchain_ollama.chat_models import ChatOllama
 
+from src.llm.cache import response_cache_from_env
+from src.llm.http import async_transport, sync_transport, timeout
+
 _ = load_dotenv()
 
-# Get Ollama configuration from environment variables
-ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-ollama_model = os.getenv("OLLAMA_MODEL", "llama3.1")
 
-# Create Ollama client
-llm = ChatOllama(
-    model=ollama_model,
-    temperature=0.0
-)
+def create_llm() -> ChatOllama:
+    """Create the Ollama chat model from the OLLAMA_* settings"""
+    return ChatOllama(
+        model=os.getenv("OLLAMA_MODEL", "llama3.1"),
+        base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+        temperature=0.0,
+        cache=response_cache_from_env(),  # Disabled unless LLM_CACHE_PATH is set
+        # The ollama package builds its own httpx clients, share the pooled transports with them
+        client_kwargs={"timeout": timeout()},
+        sync_client_kwargs={"transport": sync_transport()},
+        async_client_kwargs={"transport": async_transport()}
+    )
+
 
-__all__ = [llm]
\ No newline at end of file
+__all__ = ["create_llm"]
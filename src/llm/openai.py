@@ -3,18 +3,26 @@ import os
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI
 
+from src.llm.cache import response_cache_from_env
+from src.llm.http import async_client, sync_client
+from src.llm.scheduler import scheduler_configured
+
 _ = load_dotenv()
 
-deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-model = os.getenv("AZURE_OPENAI_MODEL")
 
-# Create OpenAI client
-llm = AzureChatOpenAI(
-    api_version=api_version,
-    azure_deployment=deployment,
-    model=model,
-    temperature=0
-)
+def create_llm() -> AzureChatOpenAI:
+    """Create the Azure OpenAI chat model from the AZURE_OPENAI_* settings"""
+    return AzureChatOpenAI(
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+        model=os.getenv("AZURE_OPENAI_MODEL"),
+        temperature=0,
+        stream_usage=True,  # Keep token usage when nodes are streamed with stream_mode="messages"
+        cache=response_cache_from_env(),  # Disabled unless LLM_CACHE_PATH is set
+        max_retries=0 if scheduler_configured() else 2,  # The scheduler retries 429s, 5xx and timeouts then
+        http_client=sync_client(),
+        http_async_client=async_client()
+    )
+
 
-__all__ = [llm]
\ No newline at end of file
+__all__ = ["create_llm"]
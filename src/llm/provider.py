@@ -0,0 +1,76 @@
+import os
+import threading
+from typing import Sequence
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+_ = load_dotenv()
+
+_lock = threading.Lock()
+_llm: BaseChatModel | Runnable | None = None
+_bound: dict[tuple[str, ...], Runnable] = {}
+
+
+def provider_name() -> str:
+    """Provider from LLM_PROVIDER, or Azure when it's configured and Ollama otherwise"""
+    provider = os.getenv("LLM_PROVIDER")
+    if provider:
+        return provider.lower()
+    return "azure" if os.getenv("AZURE_OPENAI_ENDPOINT") else "ollama"
+
+
+def get_llm() -> BaseChatModel | Runnable:
+    """Shared chat model (or ModelRouter over several), created on first use.
+
+    The provider client is only imported and built here, so importing an agent has no
+    network or client setup cost. Errors while building it are raised instead of
+    silently switching to another provider.
+    """
+    global _llm
+
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                provider = provider_name()
+                if provider == "azure":
+                    from src.llm.openai import create_llm
+                elif provider == "ollama":
+                    from src.llm.ollama import create_llm
+                elif provider == "router":
+                    from src.llm.router import create_router as create_llm
+                else:
+                    raise ValueError(f"Unknown LLM_PROVIDER '{provider}', use 'azure', 'ollama' or 'router'")
+
+                _llm = create_llm()
+
+                # Calls share the RPM/TPM quota through one scheduler when limits are configured
+                from src.llm.scheduler import ScheduledModel, scheduler_from_env
+                scheduler = scheduler_from_env()
+                if scheduler:
+                    _llm = ScheduledModel(_llm, scheduler)
+
+    return _llm
+
+
+def get_llm_with_tools(tools: Sequence[BaseTool]) -> Runnable:
+    """Shared model with `tools` bound, built once per set of tools"""
+    key = tuple(tool.name for tool in tools)
+
+    if key not in _bound:
+        llm = get_llm()
+        with _lock:
+            _bound.setdefault(key, llm.bind_tools(list(tools)))
+
+    return _bound[key]
+
+
+def set_llm(llm: BaseChatModel | Runnable | None) -> None:
+    """Replace the shared model (benchmarks, offline runs); None goes back to the configured provider"""
+    global _llm
+
+    with _lock:
+        _llm = llm
+        _bound.clear()
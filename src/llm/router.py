@@ -0,0 +1,373 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Iterator
+
+import numpy as np
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ensure_config
+
+# Cheap steps go to the local model first, everything else follows LLM_BACKENDS.
+# Keys are prompt template names (src.prompts) or graph node names
+DEFAULT_ROUTES = {
+    "classify_email": ["ollama", "azure"],
+    "classify_emails": ["ollama", "azure"],
+    "classify_request": ["ollama", "azure"],
+    "classify_intent": ["ollama", "azure"],
+    "classifier_node": ["ollama", "azure"],
+}
+
+# Hedged requests run here so the caller can wait on whichever finishes first. Model calls
+# only wait on the network, the pool is sized for concurrency rather than CPUs
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-hedge")
+
+
+class BackendStats:
+    """Rolling latency and error rate of one backend over its last `window` calls"""
+
+    def __init__(self, window: int = 100):
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self.last_failure = 0.0
+        self.counts = {"calls": 0, "errors": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0}
+
+    def record(self, latency: float | None, ok: bool) -> None:
+        with self._lock:
+            self.counts["calls"] += 1
+            self._outcomes.append(ok)
+            if ok and latency is not None:
+                self._latencies.append(latency)
+            if not ok:
+                self.counts["errors"] += 1
+                self.last_failure = time.monotonic()
+
+    def percentile(self, q: float, min_samples: int = 1) -> float | None:
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            return float(np.percentile(self._latencies, q))
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def healthy(self, max_error_rate: float, cooldown: float) -> bool:
+        # A failing backend gets traffic again once it has been quiet for `cooldown` seconds
+        return self.error_rate <= max_error_rate or time.monotonic() - self.last_failure > cooldown
+
+
+class ModelRouter(Runnable):
+    """Chat model proxy that picks a backend per task and fails over between backends.
+
+    The task is the prompt template name or the graph node the call runs in, read from the
+    run metadata,, and `routes` gives the backend order for it (`default` otherwise).
+    Backends that fail more than `max_error_rate` of their recent calls go to the end of
+    the order until they've been quiet for `cooldown` seconds. When a call fails, the next
+    backend is tried.
+
+    With `hedge`, an invoke still running after the p95 latency of its backend starts a
+    second request on the next backend, and the first answer wins. `bind_tools` and
+    `with_structured_output` return routers over the same backends and statistics, each
+    backend applying them its own way; `stream` is routed and fails over until the first
+    chunk, but isn't hedged.
+    """
+
+    def __init__(self, backends: dict[str, Runnable], routes: dict[str, list[str]] | None = None,
+                 default: list[str] | None = None, hedge: bool = False, hedge_min_samples: int = 20,
+                 max_error_rate: float = 0.5, cooldown: float = 30.0, window: int = 100,
+                 stats: dict[str, BackendStats] | None = None):
+        self.backends = backends
+        self.default = [name for name in (default or list(backends)) if name in backends]
+        # Routes may name backends that aren't configured, they are skipped
+        self.routes = {task: [name for name in order if name in backends] for task, order in (routes or {}).items()}
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.stats = stats or {name: BackendStats(window) for name in backends}
+
+    def _derive(self, apply: Callable[[Runnable], Runnable]) -> "ModelRouter":
+        return ModelRouter(
+            {name: apply(backend) for name, backend in self.backends.items()}, self.routes, self.default,
+            self.hedge, self.hedge_min_samples, self.max_error_rate, self.cooldown, stats=self.stats
+        )
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ModelRouter":
+        return self._derive(lambda backend: backend.bind_tools(tools, **kwargs))
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> "ModelRouter":
+        return self._derive(lambda backend: backend.with_structured_output(schema, **kwargs))
+
+    def _order(self, config: RunnableConfig) -> list[str]:
+        metadata = config.get("metadata", {})
+        # Template ids are "name@hash"
+        prompt = (metadata.get("prompt") or "").partition("@")[0]
+        order = self.routes.get(prompt) or self.routes.get(metadata.get("langgraph_node")) or self.default
+        # Remaining configured backends come after the route, as a last resort
+        order = order + [name for name in self.default if name not in order]
+
+        healthy = [name for name in order if self.stats[name].healthy(self.max_error_rate, self.cooldown)]
+        return healthy + [name for name in order if name not in healthy]
+
+    def _hedge_delay(self, name: str) -> float | None:
+        return self.stats[name].percentile(95, self.hedge_min_samples) if self.hedge else None
+
+    def _call(self, name: str, input: Any, config: RunnableConfig, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            result = self.backends[name].invoke(input, config, **kwargs)
+        except Exception:
+            self.stats[name].record(None, False)
+            raise
+        self.stats[name].record(time.perf_counter() - start, True)
+        return result
+
+    async def _acall(self, name: str, input: Any, config: RunnableConfig, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await self.backends[name].ainvoke(input, config, **kwargs)
+        except Exception:
+            self.stats[name].record(None, False)
+            raise
+        self.stats[name].record(time.perf_counter() - start, True)
+        return result
+
+    def _submit(self, name: str, input: Any, config: RunnableConfig, **kwargs: Any):
+        # Each thread gets its own copy of the context, so callbacks still reach the graph run
+        context = contextvars.copy_context()
+        return _executor.submit(context.run, self._call, name, input, config, **kwargs)
+
+    def invoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        config = ensure_config(config)
+        order = self._order(config)
+        error: Exception | None = None
+
+        while order:
+            name = order.pop(0)
+            delay = self._hedge_delay(name)
+            try:
+                if delay is None:
+                    return self._call(name, input, config, **kwargs)
+                return self._invoke_hedged(name, order, delay, input, config, **kwargs)
+            except Exception as e:
+                error = e
+                if order:
+                    self.stats[name].counts["failovers"] += 1
+
+        raise error
+
+    def _invoke_hedged(self, name: str, order: list[str], delay: float, input: Any, config: RunnableConfig,
+                       **kwargs: Any) -> Any:
+        primary = self._submit(name, input, config, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        # Slower than usual: ask the next backend too (or the same one when it's alone)
+        backup_name = order.pop(0) if order else name
+        self.stats[name].counts["hedges"] += 1
+        backup = self._submit(backup_name, input, config, **kwargs)
+
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.stats[name].counts["hedge_wins"] += 1
+                    return future.result()
+
+        # Both failed: the caller moves on to the backends left in `order`
+        raise primary.exception()
+
+    async def ainvoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        config = ensure_config(config)
+        order = self._order(config)
+        error: Exception | None = None
+
+        while order:
+            name = order.pop(0)
+            delay = self._hedge_delay(name)
+            try:
+                if delay is None:
+                    return await self._acall(name, input, config, **kwargs)
+                return await self._ainvoke_hedged(name, order, delay, input, config, **kwargs)
+            except Exception as e:
+                error = e
+                if order:
+                    self.stats[name].counts["failovers"] += 1
+
+        raise error
+
+    async def _ainvoke_hedged(self, name: str, order: list[str], delay: float, input: Any,
+                              config: RunnableConfig, **kwargs: Any) -> Any:
+        primary = asyncio.ensure_future(self._acall(name, input, config, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        backup_name = order.pop(0) if order else name
+        self.stats[name].counts["hedges"] += 1
+        backup = asyncio.ensure_future(self._acall(backup_name, input, config, **kwargs))
+
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats[name].counts["hedge_wins"] += 1
+                        return task.result()
+        finally:
+            # The slower request is not needed anymore
+            for task in pending:
+                task.cancel()
+
+        raise primary.exception()
+
+    def stream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Iterator[Any]:
+        config = ensure_config(config)
+        order = self._order(config)
+
+        for position, name in enumerate(order):
+            start = time.perf_counter()
+            chunks = self.backends[name].stream(input, config, **kwargs)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self.stats[name].record(time.perf_counter() - start, True)
+                return
+            except Exception:
+                # Nothing was sent to the caller yet, another backend can still answer
+                self.stats[name].record(None, False)
+                if position == len(order) - 1:
+                    raise
+                self.stats[name].counts["failovers"] += 1
+                continue
+
+            yield first
+            try:
+                yield from chunks
+            except Exception:
+                self.stats[name].record(None, False)
+                raise
+            self.stats[name].record(time.perf_counter() - start, True)
+            return
+
+    async def astream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> AsyncIterator[Any]:
+        config = ensure_config(config)
+        order = self._order(config)
+
+        for position, name in enumerate(order):
+            start = time.perf_counter()
+            chunks = self.backends[name].astream(input, config, **kwargs).__aiter__()
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self.stats[name].record(time.perf_counter() - start, True)
+                return
+            except Exception:
+                self.stats[name].record(None, False)
+                if position == len(order) - 1:
+                    raise
+                self.stats[name].counts["failovers"] += 1
+                continue
+
+            yield first
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except Exception:
+                self.stats[name].record(None, False)
+                raise
+            self.stats[name].record(time.perf_counter() - start, True)
+            return
+
+    def report(self) -> dict[str, dict]:
+        """Per backend: counters, recent error rate and latency percentiles in seconds"""
+        return {
+            name: {
+                **stats.counts,
+                "error_rate": stats.error_rate,
+                "p50": stats.percentile(50),
+                "p95": stats.percentile(95),
+            }
+            for name, stats in self.stats.items()
+        }
+
+
+def _parse_routes(value: str) -> dict[str, list[str]]:
+    """"classify_intent=ollama,azure;draft_response=azure" -> {task: [backends]}"""
+    routes = {}
+    for entry in filter(None, (part.strip() for part in value.split(";"))):
+        task, _, order = entry.partition("=")
+        routes[task.strip()] = [name.strip() for name in order.split(",") if name.strip()]
+    return routes
+
+
+def create_router() -> ModelRouter:
+    """Router over the providers in LLM_BACKENDS, with the LLM_ROUTES and LLM_HEDGE settings"""
+    names = [name.strip() for name in os.getenv("LLM_BACKENDS", "azure,ollama").split(",") if name.strip()]
+
+    backends = {}
+    for name in names:
+        if name == "azure":
+            from src.llm.openai import create_llm
+        elif name == "ollama":
+            from src.llm.ollama import create_llm
+        else:
+            raise ValueError(f"Unknown backend '{name}' in LLM_BACKENDS, use 'azure' or 'ollama'")
+        backends[name] = create_llm()
+
+    routes = _parse_routes(os.environ["LLM_ROUTES"]) if "LLM_ROUTES" in os.environ else DEFAULT_ROUTES
+    return ModelRouter(
+        backends,
+        routes=routes,
+        default=names,
+        hedge=os.getenv("LLM_HEDGE", "0") == "1",
+        hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor as Pool
+
+    from langchain_core.messages import HumanMessage
+
+    from src.llm.fake import FakeChatModel
+
+    parser = argparse.ArgumentParser(description="Tail latency of two fake backends with and without hedging")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Median latency of both backends in seconds")
+    parser.add_argument("--sigma", type=float, default=1.0, help="Lognormal sigma, higher means a longer tail")
+    args = parser.parse_args()
+
+    messages = [HumanMessage(content="Hello")]
+    for hedge in (False, True):
+        router = ModelRouter(
+            {name: FakeChatModel(latency=args.latency, latency_sigma=args.sigma, seed=seed)
+             for seed, name in enumerate(("primary", "secondary"))},
+            hedge=hedge
+        )
+
+        def timed(_):
+            start = time.perf_counter()
+            router.invoke(messages)
+            return time.perf_counter() - start
+
+        with Pool(args.concurrency) as pool:
+            latencies = np.array(list(pool.map(timed, range(args.requests)))) * 1000
+
+        counts = router.stats["primary"].counts
+        print(f"hedge={'on ' if hedge else 'off'} p50 {np.percentile(latencies, 50):7.1f} ms  "
+              f"p95 {np.percentile(latencies, 95):7.1f} ms  p99 {np.percentile(latencies, 99):7.1f} ms  "
+              f"hedges {counts['hedges']} (won {counts['hedge_wins']})")
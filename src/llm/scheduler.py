@@ -0,0 +1,562 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Iterator
+
+import httpx
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+_ = load_dotenv()
+
+# Lower lanes are served first; lanes follow the email urgency levels
+LANES = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+DEFAULT_LANE = "medium"
+
+# Completion tokens reserved per call before the real usage is known
+DEFAULT_OUTPUT_TOKENS = 512
+
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=DEFAULT_LANE)
+
+
+@contextmanager
+def llm_priority(lane: str | None):
+    """Run the LLM calls made inside the block in `lane` (an urgency level)"""
+    token = _lane.set(lane if lane in LANES else DEFAULT_LANE)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds to wait if `error` is a 429 from the provider (0 when it doesn't say), None otherwise.
+
+    Works with openai.RateLimitError, httpx.HTTPStatusError and ollama.ResponseError, which
+    all carry the status code on the error or on its response.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return 0.0
+
+
+def transient(error: Exception) -> bool:
+    """Whether `error` is worth another try besides a 429: 408, 409, 5xx, timeouts and dropped
+    connections, the errors the OpenAI SDK retries by itself"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status is not None:
+        return status in (408, 409) or status >= 500
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    # openai.APIConnectionError (and APITimeoutError) wrap the httpx error without a status
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+def estimate_tokens(input: Any) -> int:
+    """Rough prompt size (4 characters per token), enough to pace calls against a TPM quota"""
+    if isinstance(input, list):
+        chars = sum(len(str(item.content if isinstance(item, BaseMessage) else item)) for item in input)
+    else:
+        chars = len(str(input))
+    return chars // 4 + 1
+
+
+class TokenBucket:
+    """`rate` units per second, bursts up to `capacity`; the level may go negative on corrections"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # A request larger than the bucket waits for a full bucket instead of forever
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class _Waiter:
+    def __init__(self, tokens: int, loop: asyncio.AbstractEventLoop | None = None):
+        self.tokens = tokens
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        # Threads wait on an event, coroutines on a future of their own loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+class LLMScheduler:
+    """Process-wide admission control for LLM calls.
+
+    A call waits in its priority lane until a concurrency slot is free and the request and
+    token buckets (RPM/TPM quotas) can pay for it; lanes are strictly ordered and calls of
+    a lane are served first come, first served. The token bucket is charged an estimate
+    up front and corrected with the usage reported by the response.
+
+    Concurrency adapts AIMD-style: each success raises the limit by 1/limit (one slot per
+    round of calls), each 429 halves it and pauses admissions for the Retry-After delay.
+    Calls already in flight when the limit was cut don't cut it again, so one burst of
+    429s halves it once. Transient errors (5xx, timeouts, dropped connections) are retried
+    up to `transient_retries` times after an exponential backoff of the call alone, without
+    touching the limit: with a scheduler, the provider clients don't retry by themselves.
+    """
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None, max_concurrency: int = 32,
+                 initial_concurrency: int | None = None, output_tokens: int = DEFAULT_OUTPUT_TOKENS,
+                 max_retries: int = 6, transient_retries: int = 2, backoff: float = 1.0):
+        self.requests = TokenBucket(rpm / 60, rpm) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency or max_concurrency)
+        self.output_tokens = output_tokens
+        self.max_retries = max_retries
+        self.transient_retries = transient_retries
+        self.backoff = backoff
+
+        self._lock = threading.Lock()
+        self._queue: list[tuple[int, int, _Waiter]] = []
+        self._counter = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._timer: threading.Timer | None = None
+        self._timer_at = math.inf
+        self.stats = {"calls": 0, "completed": 0, "rate_limited": 0, "retries": 0, "failed": 0,
+                      "queued_seconds": 0.0, "tokens": 0}
+        self.lane_waits = {lane: 0.0 for lane in LANES}
+
+    def _schedule(self, delay: float) -> None:
+        at = time.monotonic() + delay
+        if at >= self._timer_at:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer_at = at
+        self._timer = threading.Timer(delay, self._wake)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _wake(self) -> None:
+        with self._lock:
+            self._timer, self._timer_at = None, math.inf
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiters from the head of the queue while slots and quota allow; lock held"""
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.refill(now)
+
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self._in_flight >= int(self.limit):
+                return  # A release dispatches again
+
+            delay = self._paused_until - now
+            if self.requests:
+                delay = max(delay, self.requests.wait_time(1))
+            if self.tokens:
+                delay = max(delay, self.tokens.wait_time(waiter.tokens))
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            heapq.heappop(self._queue)
+            if self.requests:
+                self.requests.level -= 1
+            if self.tokens:
+                self.tokens.level -= waiter.tokens
+            self._in_flight += 1
+            waiter.grant()
+
+    def _enqueue(self, waiter: _Waiter, lane: str, seq: int | None) -> int:
+        with self._lock:
+            if seq is None:
+                self.stats["calls"] += 1
+                seq = next(self._counter)
+            heapq.heappush(self._queue, (LANES[lane], seq, waiter))
+            self._dispatch()
+        return seq
+
+    def acquire(self, tokens: int, lane: str, seq: int | None = None) -> int:
+        """Block until the call may start; returns its place in the lane, kept across retries"""
+        waiter = _Waiter(tokens)
+        start = time.monotonic()
+        seq = self._enqueue(waiter, lane, seq)
+        waiter.event.wait()
+        self._waited(lane, time.monotonic() - start)
+        return seq
+
+    async def aacquire(self, tokens: int, lane: str, seq: int | None = None) -> int:
+        waiter = _Waiter(tokens, asyncio.get_running_loop())
+        start = time.monotonic()
+        seq = self._enqueue(waiter, lane, seq)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.cancelled = True
+                granted = waiter.granted
+            if granted:
+                self.release(tokens, None, time.monotonic(), asyncio.CancelledError())
+            raise
+        self._waited(lane, time.monotonic() - start)
+        return seq
+
+    def _waited(self, lane: str, seconds: float) -> None:
+        with self._lock:
+            self.stats["queued_seconds"] += seconds
+            self.lane_waits[lane] += seconds
+
+    def release(self, estimated: int, used: int | None, started: float, error: BaseException | None = None,
+                delay: float | None = None, retry: bool = False) -> None:
+        """Free the slot of a call that started at `started`.
+
+        `delay` is the pause before the next admission when the call got a 429, and `retry`
+        tells whether the caller tries it again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            if used is not None:
+                self.stats["tokens"] += used
+                if self.tokens:
+                    self.tokens.level -= used - estimated
+
+            self.stats["retries"] += retry
+            if delay is not None:
+                self.stats["rate_limited"] += 1
+                if started >= self._last_decrease:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+                self._paused_until = max(self._paused_until, now + delay)
+            elif error is None:
+                self.stats["completed"] += 1
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            elif not retry:
+                self.stats["failed"] += 1
+
+            self._dispatch()
+
+    def _pause(self, delay: float, attempt: int) -> float:
+        # No Retry-After: exponential backoff
+        return delay if delay > 0 else self.backoff * 2 ** attempt
+
+    def _retry(self, error: Exception, attempt: int, failures: int) -> tuple[float | None, float | None]:
+        """(admission pause if `error` is a 429, wait of this call before retrying or None if it isn't)
+
+        `attempt` counts the tries so far and `failures` the transient errors among them.
+        """
+        delay = retry_after(error)
+        if delay is not None:
+            return self._pause(delay, attempt), 0.0 if attempt < self.max_retries else None
+        if transient(error) and failures < self.transient_retries:
+            return None, self.backoff * 2 ** failures / 2
+        return None, None
+
+    def run(self, call: Callable[[], Any], tokens: int) -> Any:
+        """Run `call` under admission control, retrying it after 429s and transient errors"""
+        lane, seq, failures = _lane.get(), None, 0
+        for attempt in itertools.count():
+            seq = self.acquire(tokens, lane, seq)
+            started = time.monotonic()
+            try:
+                result = call()
+            except Exception as e:
+                delay, wait = self._retry(e, attempt, failures)
+                self.release(tokens, None, started, e, delay, wait is not None)
+                if wait is None:
+                    raise
+                if delay is None:
+                    failures += 1
+                    time.sleep(wait)
+                continue
+            self.release(tokens, _usage(result), started)
+            return result
+
+    async def arun(self, call: Callable[[], Any], tokens: int) -> Any:
+        """Async version of `run`, `call` returns an awaitable"""
+        lane, seq, failures = _lane.get(), None, 0
+        for attempt in itertools.count():
+            seq = await self.aacquire(tokens, lane, seq)
+            started = time.monotonic()
+            try:
+                result = await call()
+            except Exception as e:
+                delay, wait = self._retry(e, attempt, failures)
+                self.release(tokens, None, started, e, delay, wait is not None)
+                if wait is None:
+                    raise
+                if delay is None:
+                    failures += 1
+                    await asyncio.sleep(wait)
+                continue
+            except asyncio.CancelledError:
+                self.release(tokens, None, started, asyncio.CancelledError())
+                raise
+            self.release(tokens, _usage(result), started)
+            return result
+
+    def report(self) -> dict:
+        with self._lock:
+            return {**self.stats, "concurrency_limit": self.limit, "in_flight": self._in_flight,
+                    "queued": len(self._queue), "lane_waits": dict(self.lane_waits)}
+
+
+def _usage(result: Any) -> int | None:
+    usage = getattr(result, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class ScheduledModel(Runnable):
+    """Chat model (or router) whose calls go through an LLMScheduler.
+
+    `bind_tools` and `with_structured_output` wrap the derived runnables with the same
+    scheduler. Streams hold their slot until the last chunk and are only retried on a 429
+    or transient error raised before the first one.
+    """
+
+    def __init__(self, model: Runnable, scheduler: LLMScheduler):
+        self.model = model
+        self.scheduler = scheduler
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScheduledModel":
+        return ScheduledModel(self.model.bind_tools(tools, **kwargs), self.scheduler)
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> "ScheduledModel":
+        return ScheduledModel(self.model.with_structured_output(schema, **kwargs), self.scheduler)
+
+    def _tokens(self, input: Any) -> int:
+        return estimate_tokens(input) + self.scheduler.output_tokens
+
+    def invoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        return self.scheduler.run(lambda: self.model.invoke(input, config, **kwargs), self._tokens(input))
+
+    async def ainvoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        return await self.scheduler.arun(lambda: self.model.ainvoke(input, config, **kwargs), self._tokens(input))
+
+    def stream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Iterator[Any]:
+        scheduler, tokens = self.scheduler, self._tokens(input)
+        lane, seq, failures, wait = _lane.get(), None, 0, None
+
+        for attempt in itertools.count():
+            if wait:
+                time.sleep(wait)
+            seq = scheduler.acquire(tokens, lane, seq)
+            started = time.monotonic()
+            used, error, delay, retry = None, None, None, False
+            try:
+                chunks = iter(self.model.stream(input, config, **kwargs))
+                try:
+                    first = next(chunks)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    delay, wait = scheduler._retry(e, attempt, failures)
+                    retry = wait is not None
+                    if not retry:
+                        raise
+                    failures += delay is None
+                    error = e
+                    continue
+
+                for chunk in itertools.chain([first], chunks):
+                    used = _usage(chunk) or used
+                    yield chunk
+                return
+            except GeneratorExit:
+                raise  # The caller stopped reading, not a failure
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                scheduler.release(tokens, used, started, error, delay, retry)
+
+    async def astream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> AsyncIterator[Any]:
+        scheduler, tokens = self.scheduler, self._tokens(input)
+        lane, seq, failures, wait = _lane.get(), None, 0, None
+
+        for attempt in itertools.count():
+            if wait:
+                await asyncio.sleep(wait)
+            seq = await scheduler.aacquire(tokens, lane, seq)
+            started = time.monotonic()
+            used, error, delay, retry = None, None, None, False
+            try:
+                chunks = self.model.astream(input, config, **kwargs).__aiter__()
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    delay, wait = scheduler._retry(e, attempt, failures)
+                    retry = wait is not None
+                    if not retry:
+                        raise
+                    failures += delay is None
+                    error = e
+                    continue
+
+                used = _usage(first)
+                yield first
+                async for chunk in chunks:
+                    used = _usage(chunk) or used
+                    yield chunk
+                return
+            except GeneratorExit:
+                raise  # The caller stopped reading, not a failure
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                scheduler.release(tokens, used, started, error, delay, retry)
+
+
+def scheduler_configured() -> bool:
+    """True when LLM_RPM, LLM_TPM or LLM_MAX_CONCURRENCY is set; clients then leave retries (429s and
+    transient errors) to the scheduler"""
+    return bool(os.getenv("LLM_RPM") or os.getenv("LLM_TPM") or os.getenv("LLM_MAX_CONCURRENCY"))
+
+
+def scheduler_from_env() -> LLMScheduler | None:
+    """Scheduler from LLM_RPM, LLM_TPM and LLM_MAX_CONCURRENCY, None when none of them is set"""
+    if not scheduler_configured():
+        return None
+
+    rpm, tpm = os.getenv("LLM_RPM"), os.getenv("LLM_TPM")
+    return LLMScheduler(
+        rpm=float(rpm) if rpm else None,
+        tpm=float(tpm) if tpm else None,
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+        output_tokens=int(os.getenv("LLM_OUTPUT_TOKENS", DEFAULT_OUTPUT_TOKENS)),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "6"))
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+    from langchain_core.messages import HumanMessage
+
+    from src.llm.fake import FakeChatModel
+
+    parser = argparse.ArgumentParser(description="Goodput and 429s against a simulated RPM quota")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="Callers running at once")
+    parser.add_argument("--rpm", type=float, default=1200, help="Quota of the simulated provider")
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    class RateLimited(Exception):
+        def __init__(self, wait: float):
+            super().__init__("429 Too Many Requests")
+            self.status_code = 429
+            self.response = httpx.Response(429, headers={"retry-after-ms": str(int(wait * 1000))})
+
+    class QuotaModel(FakeChatModel):
+        """Fake provider that answers 429 once its per-second share of the quota is spent"""
+
+        def _generate(self, *a: Any, **k: Any):
+            with quota_lock:
+                now = time.monotonic()
+                quota.refill(now)
+                if quota.level < 1:
+                    raise RateLimited(quota.wait_time(1))
+                quota.level -= 1
+            return super()._generate(*a, **k)
+
+    def client_retries(call: Callable[[], Any]) -> Any:
+        # What each caller does on its own without the scheduler: wait Retry-After and try again
+        for _ in range(20):
+            try:
+                return call()
+            except RateLimited as e:
+                time.sleep(retry_after(e) + random.random() * 0.05)
+        raise RuntimeError("Gave up after 20 attempts")
+
+    lanes = ["critical" if i % 10 == 0 else "low" for i in range(args.requests)]
+    for name in ("client retries", "scheduler"):
+        quota, quota_lock = TokenBucket(args.rpm / 60, args.rpm / 60), threading.Lock()
+        errors = [0]
+        model = QuotaModel(latency=args.latency)
+        scheduler = LLMScheduler(rpm=args.rpm * 0.95, max_concurrency=args.concurrency, backoff=0.1)
+        scheduler.requests.level = 0  # The provider's bucket starts with one second of burst only
+        llm = ScheduledModel(model, scheduler)
+
+        def call(i: int) -> tuple[str, float, bool]:
+            start = time.perf_counter()
+            with llm_priority(lanes[i]):
+                if name == "scheduler":
+                    llm.invoke([HumanMessage(content="Hello")])
+                else:
+                    def attempt():
+                        try:
+                            return model.invoke([HumanMessage(content="Hello")])
+                        except RateLimited:
+                            errors[0] += 1
+                            raise
+                    try:
+                        client_retries(attempt)
+                    except RuntimeError:
+                        return lanes[i], time.perf_counter() - start, False
+            return lanes[i], time.perf_counter() - start, True
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        rate_limited = errors[0] if name == "client retries" else scheduler.stats["rate_limited"]
+        succeeded = sum(ok for _, _, ok in results)
+        critical = [seconds for lane, seconds, _ in results if lane == "critical"]
+        low = [seconds for lane, seconds, _ in results if lane == "low"]
+        print(f"{name:<15} goodput {succeeded / elapsed * 60:6.0f} RPM (quota {args.rpm:.0f})  "
+              f"failed {args.requests - succeeded:4d}  429s {rate_limited:5d}  p95 critical {np.percentile(critical, 95):5.2f} s  "
+              f"p95 low {np.percentile(low, 95):5.2f} s")
@@ -0,0 +1,444 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+from src.llm.fake import DEFAULT_STRUCTURED_OUTPUTS, LatencyLedger
+
+DEFAULT_CONTENT = "This is a canned answer from the stand-in server. It has a few sentences so that streaming emits several chunks."
+
+# Request fields that don't change the answer: a streamed call replays the same cassette entry
+VOLATILE_FIELDS = ("stream", "stream_options", "keep_alive")
+
+# POST routes: Azure deployments, OpenAI and Ollama chat endpoints
+OPENAI_PATH = re.compile(r"^(/openai/deployments/[^/]+|/v1|)/chat/completions$")
+OLLAMA_PATH = "/api/chat"
+
+
+def request_key(kind: str, body: dict) -> str:
+    """Hash of the parts of a chat request that decide its answer.
+
+    Tool call ids are generated per run, so they're renumbered in order of appearance and
+    the second turn of a tool conversation hashes the same in every run.
+    """
+    ids: dict[str, str] = {}
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if key in ("id", "tool_call_id") and isinstance(item, str):
+                    item = ids.setdefault(item, f"call_{len(ids)}")
+                result[key] = normalize(item)
+            return result
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    stable = {key: value for key, value in body.items() if key not in VOLATILE_FIELDS and key != "model"}
+    payload = json.dumps({"kind": kind, **normalize(stable)}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded responses in a JSON lines file, one {key, kind, request, response} per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.responses: dict[str, dict] = {}
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry["key"]] = entry["response"]
+
+    def get(self, key: str) -> dict | None:
+        return self.responses.get(key)
+
+    def put(self, key: str, kind: str, request: dict, response: dict) -> None:
+        with self._lock:
+            if key in self.responses:
+                return
+            self.responses[key] = response
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "kind": kind, "request": request, "response": response}) + "\n")
+
+
+def example_value(schema: dict, defs: dict | None = None) -> Any:
+    """Smallest valid value for a JSON schema, following $ref, enums and unions"""
+    defs = schema.get("$defs", {}) if defs is None else defs
+    if "$ref" in schema:
+        return example_value(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "const" in schema:
+        return schema["const"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if schema.get(key):
+            return example_value(schema[key][0], defs)
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((item for item in kind if item != "null"), "null")
+    if kind == "object":
+        return {name: example_value(spec, defs) for name, spec in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_value(schema["items"], defs)] if "items" in schema else []
+    return {"integer": 2, "number": 2.0, "boolean": True, "null": None}.get(kind, "x")
+
+
+class StandIn:
+    """Answers chat requests from a cassette, an upstream server (recording) or synthetically.
+
+    A request found in the cassette replays its recorded response. Otherwise, with
+    `upstream`, the request is forwarded without streaming and the answer recorded; else
+    the answer is synthetic: calls to the offered tools on the first turn, JSON matching the
+    requested schema (canned outputs for the known ones), or `content`. Streaming is done
+    here in both cases, so recorded answers replay streamed or not.
+
+    Every answer waits a latency sampled like FakeChatModel's, and `error_rate` of the
+    requests get a 429 with a Retry-After header.
+    """
+
+    def __init__(self, cassette: Cassette | None = None, upstream: str | None = None, strict: bool = False,
+                 content: str = DEFAULT_CONTENT, latency: float = 0.0, latency_sigma: float = 0.0,
+                 chunk_delay: float = 0.0, error_rate: float = 0.0, retry_after: float = 1.0, seed: int = 0):
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.strict = strict
+        self.content = content
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+        self.ledger = LatencyLedger()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._counters: dict[str, Iterator[int]] = {}
+        self.stats = {"requests": 0, "replayed": 0, "recorded": 0, "synthetic": 0, "rate_limited": 0, "missing": 0}
+
+        self._client = None
+        if self.upstream:
+            import httpx
+            self._client = httpx.Client(timeout=httpx.Timeout(120, connect=5))
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def sample_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency
+        with self._lock:
+            return self._random.lognormvariate(0.0, self.latency_sigma) * self.latency
+
+    def rate_limited(self) -> bool:
+        with self._lock:
+            limited = self.error_rate > 0 and self._random.random() < self.error_rate
+        if limited:
+            self._count("rate_limited")
+        return limited
+
+    def _structured(self, name: str | None, schema: dict) -> dict:
+        outputs = DEFAULT_STRUCTURED_OUTPUTS.get(name or schema.get("title", ""))
+        if not outputs:
+            return example_value(schema)
+        with self._lock:
+            counter = self._counters.setdefault(name, itertools.count())
+            return dict(outputs[next(counter) % len(outputs)])
+
+    def answer(self, kind: str, path: str, body: dict, headers: dict) -> tuple[str, dict | None]:
+        """Where the answer came from and its complete (non-streamed) body in the endpoint's format"""
+        self._count("requests")
+        key = request_key(kind, body)
+
+        if self.cassette and (response := self.cassette.get(key)) is not None:
+            source = "replayed"
+        elif self.upstream:
+            response = self._forward(path, body, headers)
+            if self.cassette:
+                self.cassette.put(key, kind, body, response)
+            source = "recorded"
+        elif self.strict:
+            source, response = "missing", None
+        else:
+            source = "synthetic"
+            response = self._synthetic_openai(body) if kind == "openai" else self._synthetic_ollama(body)
+
+        self._count(source)
+        return source, response
+
+    def _forward(self, path: str, body: dict, headers: dict) -> dict:
+        request = {key: value for key, value in body.items() if key not in ("stream", "stream_options")}
+        if "stream" in body:
+            request["stream"] = False
+        forwarded = {name: value for name, value in headers.items() if name.lower() in ("api-key", "authorization")}
+        response = self._client.post(self.upstream + path, json=request, headers=forwarded)
+        response.raise_for_status()
+        return response.json()
+
+    def _reply(self, body: dict, tools_key: str = "tools") -> tuple[str, list[tuple[str, dict]]]:
+        """Text of the answer and the (name, arguments) of its tool calls"""
+        messages = body.get("messages", [])
+        tools = [tool.get("function", tool) for tool in body.get(tools_key) or []]
+
+        # A forced function is how structured output works with method="function_calling"
+        choice = body.get("tool_choice")
+        if isinstance(choice, dict) and choice.get("function"):
+            tools = [tool for tool in tools if tool["name"] == choice["function"]["name"]]
+            return "", [(tool["name"], self._structured(tool["name"], tool.get("parameters", {}))) for tool in tools]
+
+        if tools and (not messages or messages[-1].get("role") != "tool"):
+            return "", [(tool["name"], example_value(tool.get("parameters", {}))) for tool in tools]
+        return self.content, []
+
+    def _synthetic_openai(self, body: dict) -> dict:
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            spec = response_format["json_schema"]
+            content, calls = json.dumps(self._structured(spec.get("name"), spec.get("schema", {}))), []
+        else:
+            content, calls = self._reply(body)
+
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        completion_tokens = len(content) // 4 + 10 * len(calls)
+        message: dict[str, Any] = {"role": "assistant", "content": content or None}
+        if calls:
+            message["tool_calls"] = [
+                {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(args)}}
+                for name, args in calls
+            ]
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "stand-in",
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if calls else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    def _synthetic_ollama(self, body: dict) -> dict:
+        schema = body.get("format")
+        if isinstance(schema, dict):
+            content, calls = json.dumps(self._structured(schema.get("title"), schema)), []
+        else:
+            content, calls = self._reply(body)
+
+        message: dict[str, Any] = {"role": "assistant", "content": content}
+        if calls:
+            message["tool_calls"] = [{"function": {"name": name, "arguments": args}} for name, args in calls]
+
+        return {
+            "model": body.get("model") or "stand-in",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": message,
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(json.dumps(body.get("messages", []))) // 4,
+            "eval_count": len(content) // 4 + 10 * len(calls)
+        }
+
+
+def openai_chunks(response: dict, include_usage: bool) -> Iterator[dict]:
+    """chat.completion.chunk events of a complete response: role, content words, tool calls, finish"""
+    choice = response["choices"][0]
+    message = choice["message"]
+    base = {"id": response["id"], "object": "chat.completion.chunk", "created": response["created"],
+            "model": response["model"]}
+
+    def chunk(delta: dict, finish_reason: str | None = None) -> dict:
+        return {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+    yield chunk({"role": "assistant", "content": ""})
+    for word in re.findall(r"\S+\s*", message.get("content") or ""):
+        yield chunk({"content": word})
+    for index, call in enumerate(message.get("tool_calls") or []):
+        yield chunk({"tool_calls": [{"index": index, **call}]})
+    yield chunk({}, choice.get("finish_reason") or "stop")
+    if include_usage and response.get("usage"):
+        yield {**base, "choices": [], "usage": response["usage"]}
+
+
+def ollama_chunks(response: dict) -> Iterator[dict]:
+    """NDJSON lines of a complete /api/chat response: content words, then the final stats line"""
+    message = response["message"]
+    base = {"model": response["model"], "created_at": response["created_at"]}
+    for word in re.findall(r"\S+\s*", message.get("content") or ""):
+        yield {**base, "message": {"role": "assistant", "content": word}, "done": False}
+    if message.get("tool_calls"):
+        yield {**base, "message": {"role": "assistant", "content": "", "tool_calls": message["tool_calls"]},
+               "done": False}
+    yield {**response, "message": {"role": "assistant", "content": ""}}
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server for a StandIn; `start` serves it from a daemon thread"""
+
+    daemon_threads = True
+
+    def __init__(self, standin: StandIn, host: str = "127.0.0.1", port: int = 0):
+        self.standin = standin
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        threading.Thread(target=self.serve_forever, name="stand-in", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so pooled clients reuse connections as they would with the real service
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, Nagle would hold the body for a delayed ACK
+    disable_nagle_algorithm = True
+    server: StandInServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Any, headers: dict | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content_type: str, lines: Iterator[bytes], delay: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, line in enumerate(lines):
+            if i and delay:
+                time.sleep(delay)
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "stand-in", "model": "stand-in"}]})
+        elif path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-stand-in"})
+        elif path == "/health":
+            self._send_json(200, self.server.standin.stats)
+        else:
+            self._send_json(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self) -> None:
+        standin = self.server.standin
+        path = self.path.split("?", 1)[0]
+        kind = "ollama" if path == OLLAMA_PATH else "openai" if OPENAI_PATH.match(path) else None
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if kind is None:
+            self._send_json(404, {"error": f"Unknown path {path}"})
+            return
+
+        if standin.rate_limited():
+            wait = standin.retry_after
+            message = "Rate limit exceeded, retry later"
+            self._send_json(429, {"error": {"code": "429", "message": message}} if kind == "openai" else {"error": message},
+                            {"Retry-After": f"{wait:g}", "retry-after-ms": str(int(wait * 1000))})
+            return
+
+        try:
+            source, response = standin.answer(kind, self.path, body, dict(self.headers))
+        except Exception as e:
+            self._send_json(502, {"error": {"message": f"Upstream failed: {e}"}})
+            return
+        if response is None:
+            self._send_json(404, {"error": {"message": "No recorded response for this request"}})
+            return
+
+        # Replayed and synthetic answers wait like a real model would; recorded ones already did
+        delay = standin.sample_latency() if source != "recorded" else 0.0
+        if delay:
+            time.sleep(delay)
+        standin.ledger.add(delay)
+
+        # Ollama streams unless told otherwise, OpenAI only when asked
+        stream = body.get("stream", kind == "ollama")
+        if not stream:
+            self._send_json(200, response)
+        elif kind == "openai":
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            events = (f"data: {json.dumps(event)}\n\n".encode() for event in openai_chunks(response, include_usage))
+            self._send_stream("text/event-stream", itertools.chain(events, [b"data: [DONE]\n\n"]), standin.chunk_delay)
+        else:
+            lines = (json.dumps(line).encode() + b"\n" for line in ollama_chunks(response))
+            self._send_stream("application/x-ndjson", lines, standin.chunk_delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI/Azure and Ollama compatible stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--cassette", help="JSON lines file to replay from and record to")
+    parser.add_argument("--record", metavar="UPSTREAM", help="Forward requests missing from the cassette here and record them")
+    parser.add_argument("--strict", action="store_true", help="Answer 404 to requests missing from the cassette")
+    parser.add_argument("--content", default=DEFAULT_CONTENT, help="Text of synthetic answers")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each answer")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Lognormal sigma, 0 for fixed latency")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the injected 429s, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInServer(
+        StandIn(
+            cassette=Cassette(args.cassette) if args.cassette else None,
+            upstream=args.record,
+            strict=args.strict,
+            content=args.content,
+            latency=args.latency,
+            latency_sigma=args.latency_sigma,
+            chunk_delay=args.chunk_delay,
+            error_rate=args.error_rate,
+            retry_after=args.retry_after,
+            seed=args.seed
+        ),
+        args.host,
+        args.port
+    )
+    print(f"Serving on {server.url}: AZURE_OPENAI_ENDPOINT={server.url} or OLLAMA_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
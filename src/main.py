@@ -3,6 +3,8 @@ import os
 from dotenv import load_dotenv
 from openai import AzureOpenAI
 
+from src.llm.http import sync_client
+
 _ = load_dotenv()
 
 endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -14,7 +16,8 @@ api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 client = AzureOpenAI(
     api_version=api_version,
     azure_endpoint=endpoint,
-    api_key=apikey
+    api_key=apikey,
+    http_client=sync_client()  # Same connection pool as the agents
 )
 
 # Test completions
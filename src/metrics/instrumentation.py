@@ -0,0 +1,387 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.errors import GraphBubbleUp
+
+# Seconds; spans checkpoint writes (sub-millisecond) up to slow LLM generations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, the layout Prometheus expects"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by metric name and labels"""
+
+    def __init__(self, prefix: str = "graph", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{metric}{_labels(labels)} {value:g}")
+
+            for name, series in sorted(self.histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{metric}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self) -> str:
+        """One JSON object per series, histograms summarised with bucket-estimated quantiles"""
+        timestamp = time.time()
+        records = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                for labels, value in sorted(series.items()):
+                    records.append({"ts": timestamp, "metric": name, "type": "counter", "labels": dict(labels),
+                                    "value": value})
+
+            for name, series in sorted(self.histograms.items()):
+                for labels, histogram in sorted(series.items()):
+                    records.append({
+                        "ts": timestamp,
+                        "metric": name,
+                        "type": "histogram",
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99)
+                    })
+
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def write(self, path: str) -> None:
+        """Write JSON lines for *.jsonl paths and Prometheus text otherwise"""
+        content = self.to_jsonl() if path.endswith(".jsonl") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class GraphMetricsHandler(BaseCallbackHandler):
+    """Callback handler recording node wall time, LLM latency and tokens, retries and interrupts.
+
+    Node runs are recognised by the `langgraph_node` metadata LangGraph attaches to every run:
+    the node itself is the chain whose name equals it. A RetryPolicy retry starts the same task
+    again, i.e. a second start with the same `langgraph_checkpoint_ns`.
+    """
+
+    # Called in the graph's thread even for async runs, there's no I/O here
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._nodes: dict[UUID, tuple[str, str, float]] = {}
+        self._llm_calls: dict[UUID, tuple[str, str | None, float]] = {}
+        self._failed_tasks: set[str] = set()
+
+    def on_chain_start(self, serialized: dict[str, Any] | None, inputs: Any, *, run_id: UUID,
+                       metadata: dict[str, Any] | None = None, **kwargs: Any) -> None:
+        node = metadata.get("langgraph_node") if metadata else None
+        if node is None or kwargs.get("name") != node:
+            return
+
+        task = metadata.get("langgraph_checkpoint_ns", "")
+        with self._lock:
+            self._nodes[run_id] = (node, task, time.perf_counter())
+            retried = task in self._failed_tasks
+            self._failed_tasks.discard(task)
+
+        if retried:
+            self.registry.inc("node_retries", node=node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started = self._nodes.pop(run_id, None)
+        if started:
+            node, _, start = started
+            self.registry.observe("node_seconds", time.perf_counter() - start, node=node)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started = self._nodes.pop(run_id, None)
+        if not started:
+            return
+
+        node, task, start = started
+        self.registry.observe("node_seconds", time.perf_counter() - start, node=node)
+
+        # interrupt() and Command(graph=PARENT) bubble up as exceptions but aren't failures
+        if isinstance(error, GraphBubbleUp):
+            self.registry.inc("interrupts", node=node)
+            return
+
+        self.registry.inc("node_errors", node=node, error=type(error).__name__)
+        if task:
+            with self._lock:
+                self._failed_tasks.add(task)
+
+    def _llm_start(self, run_id: UUID, metadata: dict[str, Any] | None) -> None:
+        metadata = metadata or {}
+        with self._lock:
+            self._llm_calls[run_id] = (metadata.get("langgraph_node", ""), metadata.get("prompt"), time.perf_counter())
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: Any, *, run_id: UUID,
+                            metadata: dict[str, Any] | None = None, **kwargs: Any) -> None:
+        self._llm_start(run_id, metadata)
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID,
+                     metadata: dict[str, Any] | None = None, **kwargs: Any) -> None:
+        self._llm_start(run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started = self._llm_calls.pop(run_id, None)
+        if not started:
+            return
+
+        node, prompt, start = started
+        self.registry.observe("llm_seconds", time.perf_counter() - start, node=node)
+        self.registry.inc("llm_calls", node=node)
+
+        # Templates from src.prompts tag their calls, so prefix caching can be checked per prompt
+        prompt_labels = {"node": node, "prompt": prompt} if prompt else {"node": node}
+        prompt_tokens, cached_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            self.registry.inc("llm_prompt_tokens", prompt_tokens, **prompt_labels)
+            self.registry.inc("llm_cached_prompt_tokens", cached_tokens, **prompt_labels)
+        if completion_tokens:
+            self.registry.inc("llm_completion_tokens", completion_tokens, node=node)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started = self._llm_calls.pop(run_id, None)
+        if started:
+            node, _, start = started
+            self.registry.observe("llm_seconds", time.perf_counter() - start, node=node)
+            self.registry.inc("llm_errors", node=node, error=type(error).__name__)
+
+
+def _token_usage(response: LLMResult) -> tuple[int, int, int]:
+    """Prompt, cached prompt and completion tokens from usage_metadata, or the provider's llm_output"""
+    prompt_tokens = cached_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+
+    if not prompt_tokens and not completion_tokens and response.llm_output:
+        usage = response.llm_output.get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+
+    return prompt_tokens, cached_tokens, completion_tokens
+
+
+class InstrumentedSaver(BaseCheckpointSaver):
+    """Wraps a checkpointer and records the time spent reading and writing checkpoints"""
+
+    def __init__(self, saver: BaseCheckpointSaver, registry: MetricsRegistry):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.registry = registry
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def _timed(self, operation: str, start: float) -> None:
+        self.registry.observe("checkpoint_seconds", time.perf_counter() - start, operation=operation)
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        start = time.perf_counter()
+        try:
+            return self.saver.get_tuple(config)
+        finally:
+            self._timed("get", start)
+
+    def list(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+             before: RunnableConfig | None = None, limit: int | None = None) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        start = time.perf_counter()
+        try:
+            return self.saver.put(config, checkpoint, metadata, new_versions)
+        finally:
+            self._timed("put", start)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        start = time.perf_counter()
+        try:
+            self.saver.put_writes(config, writes, task_id, task_path)
+        finally:
+            self._timed("put_writes", start)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.saver.delete_thread(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        start = time.perf_counter()
+        try:
+            return await self.saver.aget_tuple(config)
+        finally:
+            self._timed("get", start)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+                    before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        start = time.perf_counter()
+        try:
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+        finally:
+            self._timed("put", start)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        start = time.perf_counter()
+        try:
+            await self.saver.aput_writes(config, writes, task_id, task_path)
+        finally:
+            self._timed("put_writes", start)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.saver.adelete_thread(thread_id)
+
+    def get_next_version(self, current: Any, channel: None) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+
+def instrument(graph, registry: MetricsRegistry):
+    """Copy of a compiled graph reporting to `registry`; the original graph is left untouched.
+
+    Nothing is recorded, and nothing is paid, by graphs that were not instrumented.
+    """
+    update = {}
+    if isinstance(graph.checkpointer, BaseCheckpointSaver):
+        update["checkpointer"] = InstrumentedSaver(graph.checkpointer, registry)
+
+    instrumented = graph.copy(update=update) if update else graph
+    return instrumented.with_config(callbacks=[GraphMetricsHandler(registry)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run emails through an instrumented email agent and print metrics")
+    parser.add_argument("emails", help="JSON lines file with email_content, sender_email and email_id")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="Write the metrics here (.jsonl for JSON lines, Prometheus text otherwise)")
+    args = parser.parse_args()
+
+    from src.agents.email_agent import get_app
+    from src.agents.email_batch import process_emails, read_jsonl
+    from src.prompts.registry import PREFIX_CACHE_MIN_TOKENS, prompt_cache_report
+
+    registry = MetricsRegistry()
+    process_emails(read_jsonl(args.emails), max_concurrency=args.concurrency, graph=instrument(get_app(), registry))
+
+    if args.output:
+        registry.write(args.output)
+    else:
+        print(registry.to_prometheus())
+
+    for row in prompt_cache_report(registry):
+        short = row["prefix_tokens"] is not None and row["prefix_tokens"] < PREFIX_CACHE_MIN_TOKENS
+        print(f"{row['node']:<24} {row['prompt'] or '-':<36} prompt {row['prompt_tokens']:>8.0f}  "
+              f"cached {row['cached_tokens']:>8.0f} ({row['cached_ratio']:.0%})"
+              + (f"  prefix ~{row['prefix_tokens']} tokens, under the {PREFIX_CACHE_MIN_TOKENS} providers cache"
+                 if short else ""))
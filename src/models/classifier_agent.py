@@ -10,7 +10,9 @@ class IntentClassification(TypedDict):
 
 
 class ClassifierAgentState(BaseModel):
-    messages: Annotated[List[AnyMessage], operator.add] = Field("The list of messages sent to the LLM")
-    detected_intent: IntentClassification | None = Field("Detected intent in the user input")
-    user_input: str = Field("What the user is requesting to the assistant. This is not related to memory/LLM")
+    messages: Annotated[List[AnyMessage], operator.add] = Field(
+        default_factory=list, description="The list of messages sent to the LLM"
+    )
+    detected_intent: IntentClassification | None = Field(None, description="Detected intent in the user input")
+    user_input: str = Field(description="What the user is requesting to the assistant. This is not related to memory/LLM")
 
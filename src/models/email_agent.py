@@ -9,6 +9,11 @@ class EmailClassification(TypedDict):
     summary: str
 
 
+class EmailClassificationBatch(TypedDict):
+    """Output of a batched classification, one entry per email in the order they were given"""
+    classifications: list[EmailClassification]
+
+
 class EmailAgentState(TypedDict):
     """This class implements the email agent state"""
     email_content: str
@@ -24,4 +29,36 @@ class EmailAgentState(TypedDict):
 
     # Generated content
     draft_response: str | None
-    messages: list[str] | None
\ No newline at end of file
+    messages: list[str] | None
+
+    # email_id of a recent near-identical email whose results were reused
+    duplicate_of: str | None
+
+
+class EmailOutcome(TypedDict):
+    """Outcome of a single email processed in a batch"""
+    email_id: str
+    thread_id: str
+    status: Literal["completed", "interrupted", "failed"]
+    interrupt: dict | None # Payload sent by human_review when the thread is paused
+    error: str | None
+    elapsed: float # Seconds spent running the graph for this email
+
+
+class EmailBatchReport(TypedDict):
+    """Aggregated result of a bulk email processing run"""
+    completed: list[EmailOutcome]
+    interrupted: list[EmailOutcome] # Threads waiting for a Command(resume=...)
+    failed: list[EmailOutcome]
+    elapsed: float
+    throughput: float # Emails per second
+
+
+class ReviewItem(TypedDict):
+    """Thread paused by human_review, as listed in the review queue"""
+    thread_id: str
+    email_id: str
+    urgency: str | None
+    intent: str | None
+    created_at: float # When the thread was paused, in seconds since the epoch
+    payload: dict # The interrupt payload: original email, draft and requested action
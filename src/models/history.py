@@ -0,0 +1,74 @@
+import os
+from typing import Callable
+
+from langchain.messages import AnyMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+# Default prompt budget for the conversation history, system prompt not included
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+
+SUMMARY_ID = "history-summary"
+
+
+def trim_to_budget(
+    messages: list[AnyMessage],
+    max_tokens: int,
+    count_tokens: Callable[[list[AnyMessage]], int] = count_tokens_approximately
+) -> tuple[list[AnyMessage], list[AnyMessage]]:
+    """Split the history into (dropped, kept) so that `kept` fits in `max_tokens`.
+
+    Messages are kept from the newest backwards in whole turns: an AI message with tool calls
+    and the ToolMessages answering it are kept or dropped together, so the model never sees a
+    tool result without its call. Only the kept turns are counted, so the cost depends on the
+    budget and not on the length of the history. The latest turn is always kept.
+    """
+    kept_from = len(messages)
+    total = 0
+
+    end = len(messages)
+    while end > 0:
+        start = end - 1
+        # Walk back over the tool results to the message that requested them
+        while start > 0 and isinstance(messages[start], ToolMessage):
+            start -= 1
+
+        tokens = count_tokens(messages[start:end])
+        if kept_from < len(messages) and total + tokens > max_tokens:
+            break
+
+        total += tokens
+        kept_from = start
+        end = start
+
+    # Tool results left at the head have lost their call
+    while kept_from < len(messages) and isinstance(messages[kept_from], ToolMessage):
+        kept_from += 1
+
+    return messages[:kept_from], messages[kept_from:]
+
+
+def token_budget(
+    max_tokens: int = HISTORY_TOKEN_BUDGET,
+    summarize: Callable[[list[AnyMessage]], str] | None = None
+) -> Callable[[list[AnyMessage], list[AnyMessage]], list[AnyMessage]]:
+    """Reducer that appends new messages and trims the history to `max_tokens`.
+
+    Use it instead of `operator.add` in the state annotation. Older turns are dropped, or
+    replaced by a single summary message when `summarize` is given (it receives the dropped
+    messages, including any previous summary, and returns the summary text).
+    """
+
+    def reducer(left: list[AnyMessage], right: list[AnyMessage] | AnyMessage) -> list[AnyMessage]:
+        messages = left + (right if isinstance(right, list) else [right])
+
+        dropped, kept = trim_to_budget(messages, max_tokens)
+        if not dropped:
+            return messages
+
+        if summarize is None:
+            return kept
+
+        summary = SystemMessage(content=f"Summary of the earlier conversation: {summarize(dropped)}", id=SUMMARY_ID)
+        return [summary] + [message for message in kept if message.id != SUMMARY_ID]
+
+    return reducer
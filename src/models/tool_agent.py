@@ -1,13 +1,16 @@
 from pydantic import BaseModel, Field
 from typing import List, Annotated
-import operator
 
 from langchain.messages import AnyMessage
 
+from src.models.history import token_budget
+
 
 class ToolAgentState(BaseModel):
     """State for the decision‑only tool agent."""
-    messages: Annotated[list[AnyMessage], operator.add] = Field(default_factory=list, description="Chat history")
+    messages: Annotated[list[AnyMessage], token_budget()] = Field(
+        default_factory=list, description="Chat history, trimmed to HISTORY_TOKEN_BUDGET tokens"
+    )
     llm_calls: int = Field(0, description="Number of LLM invocations")
     tool_is_needed: bool = Field(False, description="Whether a tool call is required")
-    tool_needed_name: str = Field("The name of the tool which is needed")
\ No newline at end of file
+    tool_needed_name: str | None = Field(None, description="The name of the tool which is needed")
\ No newline at end of file
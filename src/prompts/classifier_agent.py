@@ -0,0 +1,41 @@
+from src.prompts.registry import register
+
+# These prefixes are far below the 1024 tokens providers need before caching them (see
+# PromptTemplate); shared few-shot examples or guidelines would go in `system`.
+
+CLASSIFY_REQUEST = register(
+    "classify_request",
+    system="""
+        Analyze the user input and classify it.
+        Provide classification on user input.
+        """,
+    tail="""
+        User input: {user_input}
+        """
+)
+
+GENERATE_RECIPE = register(
+    "generate_recipe",
+    system="""
+        You are an expert in fine cuisine. You will receive a recipe from a customer and you have to generate
+        a plan to prepare that dish. First, enumerate all the ingredients that are needed to prepare the food,
+        include quantities, use grams (g), mililiters (ml) as measures for mass and volumes.
+        Prepare a plan explained step by step, don't miss any detail.
+        Prepare ingredients and plan to cook that dish.
+        """,
+    tail="""
+        User's request for food: {user_input}
+        """
+)
+
+GENERATE_COMPUTER_MANUAL = register(
+    "generate_computer_manual",
+    system="""
+        You are an expert in customer service to a IT company. You will receive tickets on support requests and
+        you have to explain, step by step and based on what you know, how to solve that problem.
+        Explain what is the cause of the issue and prepare a step-by-step plan to solve it.
+        """,
+    tail="""
+        User's request for support: {user_input}
+        """
+)
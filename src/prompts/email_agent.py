@@ -0,0 +1,52 @@
+from src.prompts.registry import register
+
+# These prefixes are far below the 1024 tokens providers need before caching them (see
+# PromptTemplate); shared few-shot examples or guidelines would go in `system`.
+
+CLASSIFY_EMAIL = register(
+    "classify_email",
+    system="""
+        You classify customer emails for a support team.
+        Provide classification including intent, urgency, topic, and summary.
+        """,
+    tail="""
+        From: {sender_email}
+        Email: {email_content}
+        """
+)
+
+CLASSIFY_EMAILS = register(
+    "classify_emails",
+    system="""
+        You classify customer emails for a support team. You will receive several numbered emails.
+        Provide one classification per email, including intent, urgency, topic, and summary,
+        in the same order as the emails.
+        """,
+    tail="""
+        {count} emails:
+
+        {emails}
+        """
+)
+
+DRAFT_RESPONSE = register(
+    "draft_response",
+    system="""
+        You draft responses to customer emails.
+
+        Guidelines:
+        - Be professional and helpful
+        - Address their specific concern
+        - Use the provided documentation when relevant
+        - Use my name "Miguel Díaz Medina" to close the email, but don't let any template to fill manually.
+        """,
+    tail="""
+        Email intent: {intent}
+        Urgency level: {urgency}
+
+        {context}
+
+        Draft a response to this customer email:
+        {email_content}
+        """
+)
@@ -0,0 +1,86 @@
+import hashlib
+import textwrap
+
+from langchain.messages import HumanMessage, SystemMessage
+
+PROMPTS: dict[str, "PromptTemplate"] = {}
+
+# OpenAI and Azure only cache prompts from this many tokens, then in steps of 128
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_STEP = 128
+
+
+class PromptTemplate:
+    """Prompt split into a static system prefix and a variable tail.
+
+    Providers cache prompts by prefix (OpenAI from 1024 tokens, in 128 token steps), so the
+    instructions go first and are identical on every call, and the email or user text is only
+    appended at the end. The system message is built once and reused.
+
+    The layout only pays off once the shared prefix (tool and schema definitions included)
+    reaches the minimum: the current system prompts are about 50 tokens, so nothing is cached
+    yet. Getting there means moving content every call shares into `system`, such as few-shot
+    examples or the support guidelines, rather than padding it.
+    """
+
+    def __init__(self, name: str, system: str, tail: str):
+        self.name = name
+        self.system = textwrap.dedent(system).strip()
+        self.tail = textwrap.dedent(tail).strip()
+        self.system_message = SystemMessage(content=self.system)
+
+        # Changes whenever the wording changes, so metrics and cache entries can be told apart
+        self.hash = hashlib.sha256(f"{self.system}\0{self.tail}".encode("utf-8")).hexdigest()[:12]
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@{self.hash}"
+
+    @property
+    def prefix_tokens(self) -> int:
+        """Rough size of the static prefix, 4 characters per token"""
+        return len(self.system) // 4
+
+    def messages(self, **values: str) -> list:
+        """Static system prefix followed by the tail filled with `values`"""
+        return [self.system_message, HumanMessage(content=self.tail.format(**values))]
+
+    def config(self) -> dict:
+        """Run config tagging the LLM call with the template, picked up by the metrics handler"""
+        return {"metadata": {"prompt": self.id}}
+
+
+def register(name: str, system: str, tail: str) -> PromptTemplate:
+    if name in PROMPTS:
+        raise ValueError(f"Prompt '{name}' is already registered")
+    PROMPTS[name] = PromptTemplate(name, system, tail)
+    return PROMPTS[name]
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return PROMPTS[name]
+
+
+def prompt_cache_report(registry) -> list[dict]:
+    """Cached and uncached prompt tokens per node and template from a MetricsRegistry.
+
+    `prefix_tokens` is the estimated size of the template's static prefix: below
+    PREFIX_CACHE_MIN_TOKENS it is never cached, so `cached_tokens` stays at 0.
+    """
+    rows: dict[tuple[str, str], dict] = {}
+    for metric, field in (("llm_prompt_tokens", "prompt_tokens"), ("llm_cached_prompt_tokens", "cached_tokens")):
+        for labels, value in registry.counters.get(metric, {}).items():
+            labels = dict(labels)
+            key = (labels.get("node", ""), labels.get("prompt", ""))
+            template = PROMPTS.get(key[1].split("@")[0])
+            row = rows.setdefault(key, {"node": key[0], "prompt": key[1], "prompt_tokens": 0, "cached_tokens": 0,
+                                        "prefix_tokens": template.prefix_tokens if template else None})
+            row[field] += value
+
+    report = []
+    for row in rows.values():
+        row["uncached_tokens"] = row["prompt_tokens"] - row["cached_tokens"]
+        row["cached_ratio"] = row["cached_tokens"] / row["prompt_tokens"] if row["prompt_tokens"] else 0.0
+        report.append(row)
+
+    return sorted(report, key=lambda row: (row["node"], row["prompt"]))
@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import TypedDict
+
+import numpy as np
+
+from src.retrieval.index import tokenize
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 10_000
+# Longest wait for an in-flight copy's classification before classifying anyway
+DEFAULT_WAIT_TIMEOUT = 60.0
+
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard share a band with high probability, pairs
+# below ~0.5 rarely do, so candidates are few and the threshold check does the rest
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(7)  # Fixed seed, signatures are comparable across processes
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+
+class DuplicateMatch(TypedDict):
+    email_id: str
+    similarity: float # Estimated Jaccard similarity of the shingle sets
+    classification: dict
+    search_results: list[str] | None
+    draft_response: str | None
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """crc32 of the overlapping word n-grams of a text, as uint64"""
+    tokens = tokenize(text)
+    grams = {" ".join(tokens[i:i + size]) for i in range(max(len(tokens) - size + 1, 1))} if tokens else set()
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text: str) -> np.ndarray | None:
+    """MinHash signature of a text, None when it has no words"""
+    hashes = shingles(text)
+    if not hashes.size:
+        return None
+    # a * x stays below 2^63 (a < 2^31, x < 2^32), so the universal hash can't overflow
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+class DuplicateIndex:
+    """Recent emails indexed by MinHash with LSH banding, to find near-duplicates in O(1).
+
+    Entries expire after `ttl` seconds and the oldest are dropped beyond `max_entries`, so
+    the index only remembers the current wave of similar emails. `reuse_draft` tells the
+    workflow to also send the matched email's draft instead of writing a new one.
+
+    `claim` also indexes emails still being classified, as pending entries: during a spike
+    the copies arriving meanwhile wait for the first classification instead of each making
+    an LLM call.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, reuse_draft: bool = False,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.reuse_draft = reuse_draft
+        self.wait_timeout = wait_timeout
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._buckets: list[dict[bytes, set[str]]] = [{} for _ in range(BANDS)]
+        self.stats = {"queries": 0, "matches": 0, "waits": 0, "added": 0, "evicted": 0}
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> list[bytes]:
+        return [band.tobytes() for band in np.split(signature, BANDS)]
+
+    def _remove(self, email_id: str) -> None:
+        entry = self._entries.pop(email_id)
+        for band, key in enumerate(entry["keys"]):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(email_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+        # Wake the copies waiting on it, they look again and classify themselves
+        if entry["pending"] is not None:
+            entry["pending"].set_result(None)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            email_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - entry["created"] <= self.ttl:
+                break
+
+            self._remove(email_id)
+            self.stats["evicted"] += 1
+
+    def _insert(self, email_id: str, signature: np.ndarray, classification: dict | None) -> None:
+        keys = self._band_keys(signature)
+        self._entries[email_id] = {
+            "email_id": email_id,
+            "signature": signature,
+            "keys": keys,
+            "created": time.time(),
+            "classification": classification,
+            "pending": Future() if classification is None else None,
+            "search_results": None,
+            "draft_response": None
+        }
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, set()).add(email_id)
+
+        self._evict(time.time())
+
+    def _best(self, signature: np.ndarray, exclude: str | None = None) -> tuple[dict | None, float]:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates |= self._buckets[band].get(key, set())
+        candidates.discard(exclude)
+
+        best, best_similarity = None, self.threshold
+        for email_id in candidates:
+            entry = self._entries[email_id]
+            similarity = float(np.mean(entry["signature"] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+        return best, best_similarity
+
+    def _match(self, entry: dict, similarity: float) -> DuplicateMatch:
+        self.stats["matches"] += 1
+        return {
+            "email_id": entry["email_id"],
+            "similarity": similarity,
+            "classification": dict(entry["classification"]),
+            "search_results": entry["search_results"],
+            "draft_response": entry["draft_response"]
+        }
+
+    def find(self, text: str) -> DuplicateMatch | None:
+        """Most similar recent email above the threshold, among the classified ones"""
+        signature = minhash(text)
+        now = time.time()
+
+        with self._lock:
+            self._evict(now)
+            self.stats["queries"] += 1
+            if signature is None:
+                return None
+
+            best, similarity = self._best(signature)
+            if best is None or best["pending"] is not None:
+                return None
+            return self._match(best, similarity)
+
+    def claim(self, email_id: str, text: str) -> DuplicateMatch | None:
+        """Like `find`, but also matches emails still being classified and waits for them.
+
+        Without a match `email_id` is indexed as pending until `add` completes it (or
+        `release` drops it), so its own near-duplicates wait for it in turn.
+        """
+        signature = minhash(text)
+        deadline = time.monotonic() + self.wait_timeout
+
+        with self._lock:
+            self.stats["queries"] += 1
+
+        while signature is not None:
+            with self._lock:
+                self._evict(time.time())
+                best, similarity = self._best(signature, exclude=email_id)
+                if best is None:
+                    if email_id not in self._entries:
+                        self._insert(email_id, signature, None)
+                    return None
+                if best["pending"] is None:
+                    return self._match(best, similarity)
+                pending = best["pending"]
+                self.stats["waits"] += 1
+
+            # Wait outside the lock; a released or evicted entry wakes the waiters too
+            try:
+                pending.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                return None
+        return None
+
+    def add(self, email_id: str, text: str, classification: dict) -> None:
+        """Index an email as soon as it's classified, so a burst of copies can match it early"""
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                pending = entry["pending"]
+                if pending is not None:
+                    entry["classification"] = classification
+                    entry["pending"] = None
+                    pending.set_result(None)
+                    self.stats["added"] += 1
+                return
+
+        signature = minhash(text)
+        if signature is None:
+            return
+
+        with self._lock:
+            if email_id not in self._entries:
+                self._insert(email_id, signature, classification)
+                self.stats["added"] += 1
+
+    def release(self, email_id: str) -> None:
+        """Drop the pending entry of an email whose classification failed"""
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None and entry["pending"] is not None:
+                self._remove(email_id)
+
+    def update(self, email_id: str, **results) -> None:
+        """Attach later results (search_results, draft_response) to an indexed email"""
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                entry.update(results)
+
+
+def duplicate_index_from_env() -> DuplicateIndex | None:
+    """Build an index from the DEDUP_* settings, None unless DEDUP_THRESHOLD is set"""
+    threshold = os.getenv("DEDUP_THRESHOLD")
+    if not threshold:
+        return None
+
+    return DuplicateIndex(
+        threshold=float(threshold),
+        ttl=float(os.getenv("DEDUP_TTL_SECONDS", DEFAULT_TTL)),
+        max_entries=int(os.getenv("DEDUP_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        reuse_draft=os.getenv("DEDUP_REUSE_DRAFT", "0") == "1"
+    )
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+from typing import Callable, Iterable, Iterator, TypedDict
+
+import numpy as np
+
+# Hashed features collide below ~1000 dimensions: with 20k chunks, 128 dims lose an exact
+# match outside the top 5 while 1024 rank it first. 1024 float32 values per chunk make a 100k
+# chunk index ~400MB, scanned in ~40ms per query (128 dims: ~50MB, ~4ms); lower it with --dim
+# only for small, distinct corpora
+DEFAULT_DIM = 1024
+
+EMBEDDINGS_FILE = "embeddings.f32"
+OFFSETS_FILE = "offsets.u64"
+CHUNKS_FILE = "chunks.jsonl"
+META_FILE = "meta.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class SearchResult(TypedDict):
+    text: str
+    source: str
+    score: float
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def hash_embed(texts: Iterable[str], dim: int = DEFAULT_DIM) -> np.ndarray:
+    """Embed texts with signed feature hashing over word unigrams and bigrams.
+
+    It needs no model or external service and is stable across processes (crc32, not
+    `hash`). Rows are L2 normalized, so a dot product is the cosine similarity.
+    """
+    texts = list(texts)
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        if not features:
+            continue
+
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(matrix[row], hashes % dim, signs)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    return matrix
+
+
+def chunk_text(text: str, max_words: int = 120, overlap: int = 20) -> list[str]:
+    """Split a document into overlapping windows of words"""
+    words = text.split()
+    if len(words) <= max_words:
+        return [" ".join(words)] if words else []
+
+    step = max_words - overlap
+    return [" ".join(words[start:start + max_words]) for start in range(0, len(words) - overlap, step)]
+
+
+class DocumentIndex:
+    """Local knowledge base index stored as a memory-mapped float32 matrix.
+
+    Layout of the index directory:
+        embeddings.f32  one row of `dim` float32 values per chunk
+        offsets.u64     byte offset of each chunk in chunks.jsonl
+        chunks.jsonl    chunk text and source document, one JSON object per line
+        meta.json       dimension and number of chunks
+
+    Loading only maps the files, so it takes milliseconds regardless of the index size;
+    the pages are read by the OS when the first query touches them.
+    """
+
+    def __init__(self, path: str, embed: Callable[[Iterable[str]], np.ndarray] | None = None):
+        self.path = path
+
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.dim: int = meta["dim"]
+        self.count: int = meta["count"]
+        self.embed = embed or (lambda texts: hash_embed(texts, self.dim))
+        self._map()
+
+    def _map(self) -> None:
+        if self.count:
+            self.matrix = np.memmap(
+                os.path.join(self.path, EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+            )
+            self.offsets = np.memmap(
+                os.path.join(self.path, OFFSETS_FILE), dtype=np.uint64, mode="r", shape=(self.count,)
+            )
+        else:
+            self.matrix = np.empty((0, self.dim), dtype=np.float32)
+            self.offsets = np.empty(0, dtype=np.uint64)
+
+    @classmethod
+    def create(cls, path: str, dim: int = DEFAULT_DIM) -> "DocumentIndex":
+        """Create an empty index directory, replacing any previous index in it"""
+        os.makedirs(path, exist_ok=True)
+        for name in (EMBEDDINGS_FILE, OFFSETS_FILE, CHUNKS_FILE):
+            open(os.path.join(path, name), "wb").close()
+
+        _write_meta(path, {"dim": dim, "count": 0})
+        return cls(path)
+
+    def append(self, documents: Iterable[tuple[str, str]], batch_size: int = 1024) -> int:
+        """Chunk, embed and append `(source, text)` documents; returns the number of new chunks"""
+        added = 0
+
+        # Drop rows left behind by an append that crashed before updating meta.json
+        os.truncate(os.path.join(self.path, EMBEDDINGS_FILE), self.count * self.dim * 4)
+        os.truncate(os.path.join(self.path, OFFSETS_FILE), self.count * 8)
+
+        with open(os.path.join(self.path, EMBEDDINGS_FILE), "ab") as embeddings_file, \
+                open(os.path.join(self.path, OFFSETS_FILE), "ab") as offsets_file, \
+                open(os.path.join(self.path, CHUNKS_FILE), "ab") as chunks_file:
+
+            for batch in _batched(_chunks(documents), batch_size):
+                offsets = np.empty(len(batch), dtype=np.uint64)
+                for i, (source, text) in enumerate(batch):
+                    offsets[i] = chunks_file.tell()
+                    chunks_file.write(json.dumps({"source": source, "text": text}).encode("utf-8") + b"\n")
+
+                embeddings_file.write(np.ascontiguousarray(self.embed(text for _, text in batch), dtype=np.float32).tobytes())
+                offsets_file.write(offsets.tobytes())
+                added += len(batch)
+
+        # meta.json is replaced last, so a crash mid-append leaves the previous index readable
+        self.count += added
+        _write_meta(self.path, {"dim": self.dim, "count": self.count})
+        self._map()
+
+        return added
+
+    def _chunk(self, row: int) -> dict:
+        with open(os.path.join(self.path, CHUNKS_FILE), "rb") as f:
+            f.seek(int(self.offsets[row]))
+            return json.loads(f.readline())
+
+    def search(self, query: str, k: int = 4) -> list[SearchResult]:
+        """Top-k chunks by cosine similarity, with a single matrix-vector product"""
+        if not self.count or k <= 0:
+            return []
+
+        scores = self.matrix @ self.embed([query])[0]
+
+        k = min(k, self.count)
+        top = np.argpartition(scores, -k)[-k:] if k < self.count else np.arange(self.count)
+        top = top[np.argsort(scores[top])[::-1]]
+
+        return [
+            {**self._chunk(int(row)), "score": float(scores[row])}
+            for row in top
+        ]
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    tmp = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, META_FILE))
+
+
+def _chunks(documents: Iterable[tuple[str, str]]) -> Iterator[tuple[str, str]]:
+    for source, text in documents:
+        for chunk in chunk_text(text):
+            yield source, chunk
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_documents(directory: str) -> Iterator[tuple[str, str]]:
+    """Yield `(path, text)` for every text or markdown file under `directory`"""
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith((".txt", ".md")):
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    yield path, f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the local knowledge base index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Create a new index from a directory of .txt/.md files")
+    build.add_argument("documents")
+    build.add_argument("index")
+    build.add_argument("--dim", type=int, default=DEFAULT_DIM)
+
+    append = commands.add_parser("append", help="Add the documents of a directory to an existing index")
+    append.add_argument("documents")
+    append.add_argument("index")
+
+    query = commands.add_parser("query", help="Search the index")
+    query.add_argument("index")
+    query.add_argument("text")
+    query.add_argument("-k", type=int, default=4)
+
+    args = parser.parse_args()
+
+    if args.command in ("build", "append"):
+        index = DocumentIndex.create(args.index, args.dim) if args.command == "build" else DocumentIndex(args.index)
+        start = time.perf_counter()
+        added = index.append(read_documents(args.documents))
+        print(f"Indexed {added} chunks in {time.perf_counter() - start:.2f}s ({index.count} total)")
+    else:
+        start = time.perf_counter()
+        index = DocumentIndex(args.index)
+        loaded = time.perf_counter()
+        results = index.search(args.text, args.k)
+        done = time.perf_counter()
+
+        for result in results:
+            print(f"{result['score']:.3f}  {result['source']}: {result['text'][:100]}")
+        print(f"Loaded in {1000 * (loaded - start):.2f} ms, searched {index.count} chunks in {1000 * (done - loaded):.2f} ms")
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from dotenv import load_dotenv
+
+_ = load_dotenv()
+
+SPECULATIONS = ("search", "customer")
+
+
+class SpeculativeTask:
+    """Speculative work started for one email"""
+
+    def __init__(self, search: Future | None, customer: Future | None):
+        self.search = search
+        self.customer = customer
+
+
+class Speculator:
+    """Runs retrieval on the raw email, and optionally the customer lookup, while it's classified.
+
+    `start` submits the work before the classification LLM call, `settle` keeps the results
+    the chosen route needs and drops the rest. Kept results skip the search hop; dropped ones
+    only cost the time they ran on a worker thread. `stats` counts hits and waste.
+    """
+
+    def __init__(self, search: Callable[[str], list[str]] | None, lookup: Callable[[str], dict] | None = None,
+                 max_workers: int = 8):
+        self.search = search
+        self.lookup = lookup
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "search_hits": 0, "search_wasted": 0, "customer_hits": 0,
+                      "customer_wasted": 0, "failed": 0, "saved_seconds": 0.0, "wasted_seconds": 0.0}
+
+    def _add(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self.stats[key] += value
+
+    def _submit(self, function: Callable | None, argument: str) -> Future | None:
+        """Future of (result, seconds it took)"""
+        if function is None:
+            return None
+
+        def timed():
+            start = time.perf_counter()
+            result = function(argument)
+            return result, time.perf_counter() - start
+
+        return self._executor.submit(timed)
+
+    def start(self, email_content: str, sender_email: str) -> SpeculativeTask:
+        self._add("started")
+        return SpeculativeTask(self._submit(self.search, email_content), self._submit(self.lookup, sender_email))
+
+    def _keep(self, future: Future | None, name: str):
+        if future is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            result, elapsed = future.result()
+        except Exception:
+            # The regular path runs it again
+            self._add("failed")
+            return None
+
+        self._add(f"{name}_hits")
+        # Time the work ran before anyone needed it, off the critical path
+        self._add("saved_seconds", max(0.0, elapsed - (time.perf_counter() - start)))
+        return result
+
+    def _drop(self, future: Future | None, name: str) -> None:
+        if future is None:
+            return
+
+        self._add(f"{name}_wasted")
+        if not future.cancel():
+            future.add_done_callback(
+                lambda done: done.exception() is None and self._add("wasted_seconds", done.result()[1])
+            )
+
+    def settle(self, task: SpeculativeTask, keep_search: bool, keep_customer: bool) -> tuple[list[str] | None, dict | None]:
+        """Search results and customer record to use, None for what was dropped or failed"""
+        search = self._keep(task.search, "search") if keep_search else self._drop(task.search, "search")
+        customer = self._keep(task.customer, "customer") if keep_customer else self._drop(task.customer, "customer")
+        return search, customer
+
+    def report(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        settled = stats["search_hits"] + stats["search_wasted"]
+        return {**stats, "search_hit_rate": stats["search_hits"] / settled if settled else 0.0}
+
+
+def speculator_from_env(search: Callable[[str], list[str]],
+                        lookup: Callable[[str], dict] | None) -> Speculator | None:
+    """Speculator from EMAIL_SPECULATE ("search", "customer" or both), None when it isn't set.
+
+    "customer" needs `lookup`, the application's CRM lookup: there is no default record.
+    """
+    value = os.getenv("EMAIL_SPECULATE", "")
+    kinds = {kind.strip() for kind in value.split(",") if kind.strip()}
+    if not kinds:
+        return None
+
+    unknown = kinds - set(SPECULATIONS)
+    if unknown:
+        raise ValueError(f"Unknown EMAIL_SPECULATE values {sorted(unknown)}, use {', '.join(SPECULATIONS)}")
+    if "customer" in kinds and lookup is None:
+        raise ValueError("EMAIL_SPECULATE=customer needs a customer lookup, register one with set_customer_lookup")
+
+    return Speculator(
+        search if "search" in kinds else None,
+        lookup if "customer" in kinds else None,
+        max_workers=int(os.getenv("EMAIL_SPECULATE_WORKERS", "8"))
+    )
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable
+
+from src.models.email_agent import EmailOutcome, ReviewItem
+
+URGENCY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_queue (
+    thread_id TEXT PRIMARY KEY,
+    email_id TEXT NOT NULL,
+    urgency TEXT,
+    intent TEXT,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+
+class ReviewQueue:
+    """Threads waiting for human review, served most urgent first and oldest first within an urgency.
+
+    Items live in a dict (insertion order is age order) with a heap for priority pops and
+    sets per urgency and intent for filtering. Removing an item only drops it from the dict
+    and the sets; its heap entry is skipped when it reaches the top (lazy deletion), so
+    add, pop and remove are all O(log n) or better.
+
+    With `path`, the queue is mirrored to a SQLite table and reloaded from it on start, so
+    pending reviews survive restarts without scanning checkpoints.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._items: dict[str, ReviewItem] = {}
+        self._heap: list[tuple[int, float, int, str]] = []
+        self._versions: dict[str, int] = {}
+        self._counter = itertools.count()
+        self._by_urgency: dict[str | None, set[str]] = {}
+        self._by_intent: dict[str | None, set[str]] = {}
+        self._resuming: set[str] = set()
+
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+            rows = self._conn.execute(
+                "SELECT thread_id, email_id, urgency, intent, created_at, payload FROM review_queue ORDER BY created_at"
+            )
+            for thread_id, email_id, urgency, intent, created_at, payload in rows:
+                self._index({"thread_id": thread_id, "email_id": email_id, "urgency": urgency, "intent": intent,
+                             "created_at": created_at, "payload": json.loads(payload)})
+
+    def _index(self, item: ReviewItem) -> None:
+        thread_id = item["thread_id"]
+        self._items[thread_id] = item
+        self._by_urgency.setdefault(item["urgency"], set()).add(thread_id)
+        self._by_intent.setdefault(item["intent"], set()).add(thread_id)
+
+        # A re-added thread gets a new version, its older heap entry becomes stale
+        version = next(self._counter)
+        self._versions[thread_id] = version
+        heapq.heappush(self._heap, (URGENCY_RANK.get(item["urgency"], len(URGENCY_RANK)), item["created_at"],
+                                    version, thread_id))
+
+    def _unindex(self, thread_id: str) -> ReviewItem | None:
+        item = self._items.pop(thread_id, None)
+        if item is None:
+            return None
+        self._versions.pop(thread_id, None)
+        self._by_urgency[item["urgency"]].discard(thread_id)
+        self._by_intent[item["intent"]].discard(thread_id)
+        return item
+
+    def add(self, thread_id: str, payload: dict, created_at: float | None = None) -> ReviewItem:
+        """Queue a paused thread using its human_review interrupt payload"""
+        item: ReviewItem = {
+            "thread_id": thread_id,
+            "email_id": payload.get("email_id") or thread_id,
+            "urgency": payload.get("urgency"),
+            "intent": payload.get("intent"),
+            "created_at": created_at or time.time(),
+            "payload": payload
+        }
+
+        with self._lock:
+            self._unindex(thread_id)
+            self._index(item)
+            if self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO review_queue VALUES (?, ?, ?, ?, ?, ?)",
+                    (thread_id, item["email_id"], item["urgency"], item["intent"], item["created_at"],
+                     json.dumps(payload, default=str))
+                )
+
+        return item
+
+    def track(self, email: dict, outcome: EmailOutcome) -> None:
+        """`on_outcome` hook for process_emails: queue the emails that stopped for review"""
+        if outcome["status"] == "interrupted":
+            self.add(outcome["thread_id"], outcome["interrupt"] or {})
+
+    def remove(self, thread_id: str) -> ReviewItem | None:
+        with self._lock:
+            item = self._unindex(thread_id)
+            if item is not None and self._conn:
+                self._conn.execute("DELETE FROM review_queue WHERE thread_id = ?", (thread_id,))
+            return item
+
+    def _top(self) -> str | None:
+        # Drop heap entries of removed or re-added threads
+        while self._heap:
+            _, _, version, thread_id = self._heap[0]
+            if self._versions.get(thread_id) == version:
+                return thread_id
+            heapq.heappop(self._heap)
+        return None
+
+    def peek(self) -> ReviewItem | None:
+        with self._lock:
+            thread_id = self._top()
+            return self._items[thread_id] if thread_id else None
+
+    def pop(self) -> ReviewItem | None:
+        """Take the most urgent item; it leaves the queue until it's added again"""
+        with self._lock:
+            thread_id = self._top()
+            if thread_id is None:
+                return None
+            heapq.heappop(self._heap)
+            return self.remove(thread_id)
+
+    def pending(self, urgency: str | Iterable[str] | None = None, intent: str | Iterable[str] | None = None,
+             older_than: float | None = None, limit: int | None = None) -> list[ReviewItem]:
+        """Pending items matching every given filter, in priority order.
+
+        Filters use the urgency and intent indexes, so only matching items are sorted;
+        `older_than` is an age in seconds.
+        """
+        with self._lock:
+            candidates = None
+            for index, values in ((self._by_urgency, urgency), (self._by_intent, intent)):
+                if values is None:
+                    continue
+                values = [values] if isinstance(values, str) else values
+                matching = set().union(*(index.get(value, set()) for value in values))
+                candidates = matching if candidates is None else candidates & matching
+
+            items = [self._items[t] for t in candidates] if candidates is not None else list(self._items.values())
+
+        if older_than is not None:
+            cutoff = time.time() - older_than
+            items = [item for item in items if item["created_at"] <= cutoff]
+
+        items.sort(key=lambda item: (URGENCY_RANK.get(item["urgency"], len(URGENCY_RANK)), item["created_at"]))
+        return items[:limit] if limit is not None else items
+
+    def counts(self) -> dict:
+        with self._lock:
+            return {
+                "total": len(self._items),
+                "urgency": {str(key): len(value) for key, value in self._by_urgency.items() if value},
+                "intent": {str(key): len(value) for key, value in self._by_intent.items() if value}
+            }
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self._items
+
+    async def aresume(self, items: Iterable[ReviewItem], decide: Callable[[ReviewItem], dict] | dict,
+                      graph=None, max_concurrency: int = 8) -> list[EmailOutcome]:
+        """Resume many threads concurrently with `decide(item)`, or the same decision for all.
+
+        Each item leaves the queue once its thread finishes; until then it stays queued (and
+        mirrored), so a crash or cancellation loses no pending review. A thread that pauses
+        again is queued with its new payload, a failed one keeps its place for another attempt.
+        Items already being resumed by another call are skipped, and threads the checkpointer
+        doesn't have paused (another process without CHECKPOINT_DB) fail without running.
+        """
+        from src.agents.email_agent import get_app
+        from src.agents.email_batch import resume_email
+
+        graph = graph or get_app()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        with self._lock:
+            items = [item for item in items if item["thread_id"] not in self._resuming]
+            self._resuming.update(item["thread_id"] for item in items)
+
+        async def resume(item: ReviewItem) -> EmailOutcome:
+            try:
+                decision = decide(item) if callable(decide) else decide
+                async with semaphore:
+                    # Resuming a thread that isn't there would run the graph from an empty state
+                    snapshot = await graph.aget_state({"configurable": {"thread_id": item["thread_id"]}})
+                    if not snapshot.interrupts:
+                        return {"email_id": item["email_id"], "thread_id": item["thread_id"], "status": "failed",
+                                "interrupt": None, "error": "thread not found or not interrupted", "elapsed": 0.0}
+                    outcome = await resume_email(item["thread_id"], decision, graph, item["email_id"])
+            finally:
+                with self._lock:
+                    self._resuming.discard(item["thread_id"])
+
+            if outcome["status"] == "interrupted":
+                self.add(item["thread_id"], outcome["interrupt"] or {})
+            elif outcome["status"] == "completed":
+                self.remove(item["thread_id"])
+            return outcome
+
+        return list(await asyncio.gather(*(resume(item) for item in items)))
+
+    def resume(self, items: Iterable[ReviewItem], decide: Callable[[ReviewItem], dict] | dict,
+               graph=None, max_concurrency: int = 8) -> list[EmailOutcome]:
+        """Synchronous version of `aresume`"""
+        return asyncio.run(self.aresume(items, decide, graph, max_concurrency))
+
+    def close(self) -> None:
+        if self._conn:
+            self._conn.close()
+
+
+def review_queue_from_env() -> ReviewQueue | None:
+    """Persistent queue at REVIEW_QUEUE_DB, None if it isn't set"""
+    path = os.getenv("REVIEW_QUEUE_DB")
+    return ReviewQueue(path) if path else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List and approve emails waiting for human review")
+    parser.add_argument("--db", default=os.getenv("REVIEW_QUEUE_DB", "data/review_queue.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("list", "Show pending reviews in priority order"),
+                            ("approve", "Approve the drafts of the matching threads and send them")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--urgency", nargs="+")
+        command.add_argument("--intent", nargs="+")
+        command.add_argument("--older-than", type=float, help="Only items waiting longer than this, in seconds")
+        command.add_argument("--limit", type=int)
+
+    commands.add_parser("counts", help="Pending reviews per urgency and intent")
+    args = parser.parse_args()
+
+    # Reviews are approved from another process than the one that paused the threads
+    if not os.getenv("CHECKPOINT_DB"):
+        parser.error("CHECKPOINT_DB must be set to the checkpoint file of the processes that queued the reviews")
+
+    queue = ReviewQueue(args.db)
+
+    if args.command == "counts":
+        print(json.dumps(queue.counts(), indent=2))
+    else:
+        items = queue.pending(args.urgency, args.intent, args.older_than, args.limit)
+        if args.command == "list":
+            for item in items:
+                age = time.time() - item["created_at"]
+                print(f"{item['thread_id']:<40} {item['urgency'] or '-':<9} {item['intent'] or '-':<9} {age:8.0f}s")
+        else:
+            outcomes = queue.resume(items, {"approved": True})
+            sent = sum(outcome["status"] == "completed" for outcome in outcomes)
+            print(f"Approved {sent} of {len(outcomes)} threads")
+            for outcome in outcomes:
+                if outcome["status"] == "failed":
+                    print(f"{outcome['thread_id']}: {outcome['error']}")
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from langchain_core.messages import ToolMessage
+from langchain_core.messages.tool import ToolCall
+from langchain_core.tools import BaseTool
+
+# Seconds a single tool call may take before it's reported as failed
+DEFAULT_TOOL_TIMEOUT = 30.0
+
+# Shared pool for sync tools. It's not used as a context manager on purpose: a hung tool
+# must not block the node until it finishes, it only loses its result
+_executor = ThreadPoolExecutor(thread_name_prefix="tool")
+
+
+def _error_message(tool_call: ToolCall, error: str) -> ToolMessage:
+    """Report a failed tool call back to the model instead of failing the whole node"""
+    return ToolMessage(
+        content=f"Error: {error}",
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+        status="error"
+    )
+
+
+def _invoke_tool(tool_call: ToolCall, tools_by_name: dict[str, BaseTool]) -> ToolMessage:
+    tool = tools_by_name[tool_call["name"]]
+    observation = tool.invoke(tool_call["args"])
+    return ToolMessage(content=observation, name=tool_call["name"], tool_call_id=tool_call["id"])
+
+
+def run_tool_calls(
+    tool_calls: list[ToolCall],
+    tools_by_name: dict[str, BaseTool],
+    timeout: float = DEFAULT_TOOL_TIMEOUT
+) -> list[ToolMessage]:
+    """Run every tool call on the thread pool at the same time.
+
+    Messages are returned in the same order as `tool_calls`. A call that raises or exceeds
+    `timeout` becomes an error ToolMessage and doesn't affect the rest. A single call runs
+    on the pool too, so a hung tool can't block the node.
+    """
+    futures = [_executor.submit(_invoke_tool, tool_call, tools_by_name) for tool_call in tool_calls]
+
+    # All calls started together: they share one deadline, whatever the order they're waited in
+    deadline = time.monotonic() + timeout
+    result = []
+    for tool_call, future in zip(tool_calls, futures):
+        try:
+            result.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+        except FutureTimeoutError:
+            future.cancel()
+            result.append(_error_message(tool_call, f"tool timed out after {timeout}s"))
+        except Exception as e:
+            result.append(_error_message(tool_call, f"{type(e).__name__}: {e}"))
+
+    return result
+
+
+async def _ainvoke_tool(
+    tool_call: ToolCall,
+    tools_by_name: dict[str, BaseTool],
+    timeout: float
+) -> ToolMessage:
+    try:
+        tool = tools_by_name[tool_call["name"]]
+        # Sync tools are moved to the default executor by BaseTool.ainvoke
+        observation = await asyncio.wait_for(tool.ainvoke(tool_call["args"]), timeout=timeout)
+        return ToolMessage(content=observation, name=tool_call["name"], tool_call_id=tool_call["id"])
+    except asyncio.TimeoutError:
+        return _error_message(tool_call, f"tool timed out after {timeout}s")
+    except Exception as e:
+        return _error_message(tool_call, f"{type(e).__name__}: {e}")
+
+
+async def arun_tool_calls(
+    tool_calls: list[ToolCall],
+    tools_by_name: dict[str, BaseTool],
+    timeout: float = DEFAULT_TOOL_TIMEOUT
+) -> list[ToolMessage]:
+    """Async version of `run_tool_calls`, the calls are awaited together with asyncio.gather"""
+    return list(await asyncio.gather(
+        *(_ainvoke_tool(tool_call, tools_by_name, timeout) for tool_call in tool_calls)
+    ))
@@ -0,0 +1,159 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable
+
+from langchain_core.messages import ToolMessage
+from langchain_core.messages.tool import ToolCall
+from langchain_core.tools import BaseTool
+
+from src.tools.executor import DEFAULT_TOOL_TIMEOUT, arun_tool_calls, run_tool_calls
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class CachePolicy:
+    """How long a tool result can be reused: `expires(now)` returns when it stops being valid"""
+
+    def __init__(self, name: str, expires: Callable[[float], float] | None):
+        self.name = name
+        self.expires = expires
+
+    @property
+    def cacheable(self) -> bool:
+        return self.expires is not None
+
+    def __repr__(self) -> str:
+        return f"CachePolicy({self.name})"
+
+
+def _next_midnight(now: float) -> float:
+    tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day).timestamp()
+
+
+# Same arguments, same result, forever
+PURE = CachePolicy("pure", lambda now: math.inf)
+# Side effects or results that change on every call: always run, never merged
+NEVER = CachePolicy("never", None)
+# Local date: valid until the day changes
+UNTIL_MIDNIGHT = CachePolicy("until midnight", _next_midnight)
+# Clock time with second precision
+UNTIL_NEXT_SECOND = CachePolicy("until next second", lambda now: math.floor(now) + 1)
+
+
+def ttl(seconds: float) -> CachePolicy:
+    """Results reused for `seconds` after they were computed"""
+    return CachePolicy(f"ttl {seconds}s", lambda now: now + seconds)
+
+
+class ToolRegistry:
+    """Tools of an agent with the cache policy of each one.
+
+    `run`/`arun` replace `run_tool_calls`/`arun_tool_calls`: results of cacheable tools are
+    kept in an LRU of `max_entries` and reused until their policy says they expire, and
+    identical (name, args) calls of the same turn run once. Errors are never cached.
+    """
+
+    def __init__(self, tools: Iterable[tuple[BaseTool, CachePolicy]] = (), max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.tools_by_name: dict[str, BaseTool] = {}
+        self.policies: dict[str, CachePolicy] = {}
+
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[tuple[str, str], tuple[float, ToolMessage]] = OrderedDict()
+        self.stats = {"calls": 0, "hits": 0, "merged": 0, "executed": 0, "evicted": 0}
+
+        for tool, policy in tools:
+            self.register(tool, policy)
+
+    def register(self, tool: BaseTool, policy: CachePolicy = NEVER) -> BaseTool:
+        self.tools_by_name[tool.name] = tool
+        self.policies[tool.name] = policy
+        return tool
+
+    @property
+    def tools(self) -> list[BaseTool]:
+        return list(self.tools_by_name.values())
+
+    @staticmethod
+    def _key(tool_call: ToolCall) -> tuple[str, str]:
+        return tool_call["name"], json.dumps(tool_call["args"], sort_keys=True, default=str)
+
+    def _lookup(self, key: tuple[str, str], now: float) -> ToolMessage | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key: tuple[str, str], message: ToolMessage, now: float) -> None:
+        with self._lock:
+            self._cache[key] = (self.policies[key[0]].expires(now), message)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def _plan(self, tool_calls: list[ToolCall]) -> tuple[list, list[ToolCall], float]:
+        """For each call, its cached message, the index of the call to run, or None if it runs itself"""
+        now = time.time()
+        plan, to_run, pending = [], [], {}
+
+        for tool_call in tool_calls:
+            self.stats["calls"] += 1
+            policy = self.policies.get(tool_call["name"], NEVER)
+            key = self._key(tool_call) if policy.cacheable else None
+
+            if key is not None and (cached := self._lookup(key, now)) is not None:
+                self.stats["hits"] += 1
+                plan.append(("cached", cached, key))
+            elif key is not None and key in pending:
+                self.stats["merged"] += 1
+                plan.append(("merged", pending[key], key))
+            else:
+                if key is not None:
+                    pending[key] = len(to_run)
+                plan.append(("run", len(to_run), key))
+                to_run.append(tool_call)
+
+        self.stats["executed"] += len(to_run)
+        return plan, to_run, now
+
+    def _assemble(self, tool_calls: list[ToolCall], plan: list, results: list[ToolMessage],
+                  now: float) -> list[ToolMessage]:
+        messages = []
+        for tool_call, (kind, value, key) in zip(tool_calls, plan):
+            if kind == "cached":
+                message = value
+            else:
+                message = results[value]
+                if kind == "run" and key is not None and message.status != "error":
+                    # A copy of its own: reducers set the id of the message placed in state
+                    self._store(key, message.model_copy(), now)
+
+            # Every call gets its own answer, matched by tool call id. Without a message id,
+            # add_messages appends it instead of replacing the answer it was copied from
+            if kind != "run" or message.tool_call_id != tool_call["id"]:
+                message = message.model_copy(update={"tool_call_id": tool_call["id"], "id": None})
+            messages.append(message)
+        return messages
+
+    def run(self, tool_calls: list[ToolCall], timeout: float = DEFAULT_TOOL_TIMEOUT) -> list[ToolMessage]:
+        """Answer the tool calls of a turn, in order, running only what the cache can't answer"""
+        plan, to_run, now = self._plan(tool_calls)
+        results = run_tool_calls(to_run, self.tools_by_name, timeout) if to_run else []
+        return self._assemble(tool_calls, plan, results, now)
+
+    async def arun(self, tool_calls: list[ToolCall], timeout: float = DEFAULT_TOOL_TIMEOUT) -> list[ToolMessage]:
+        """Async version of `run`"""
+        plan, to_run, now = self._plan(tool_calls)
+        results = await arun_tool_calls(to_run, self.tools_by_name, timeout) if to_run else []
+        return self._assemble(tool_calls, plan, results, now)
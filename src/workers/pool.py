@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable
+
+from src.agents.email_batch import thread_id_for
+from src.models.email_agent import EmailBatchReport, EmailOutcome
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_CHECKPOINT_DB = "data/checkpoints.db"
+
+
+class HashRing:
+    """Consistent hashing of thread ids onto workers.
+
+    Each worker owns `replicas` points on the ring, so removing one only moves the threads
+    it owned and the load stays even across the others.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._owners: dict[int, int] = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            point = self._hash(f"worker-{node}-{replica}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+                self._owners[point] = node
+
+    def remove(self, node: int) -> None:
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+
+    def get(self, key: str) -> int:
+        if not self._points:
+            raise RuntimeError("No workers left in the ring")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+def use_fake_llm(latency: float) -> None:
+    """Worker setup for benchmarks: every worker answers with the fake model"""
+    from src.llm.fake import FakeChatModel
+    from src.llm.provider import set_llm
+    set_llm(FakeChatModel(latency=latency))
+
+
+def _worker_main(worker_id: int, inbox, outbox, checkpoint_db: str, concurrency: int,
+                 setup: Callable[[], None] | None) -> None:
+    """Entry point of a worker process: compile the graph once and serve jobs until None"""
+    # Every worker shares the checkpoint file, so any of them can take over a thread
+    os.environ["CHECKPOINT_DB"] = checkpoint_db
+    if setup:
+        setup()
+
+    from src.agents.email_agent import get_app
+    asyncio.run(_serve(worker_id, get_app(), inbox, outbox, concurrency))
+
+
+async def _serve(worker_id: int, graph, inbox, outbox, concurrency: int) -> None:
+    from src.agents.email_batch import process_email, recover_email, resume_email
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email"))
+    jobs: asyncio.Queue = asyncio.Queue()
+
+    def read_inbox():
+        # Blocking reads of the process queue happen off the event loop
+        while True:
+            job = inbox.get()
+            loop.call_soon_threadsafe(jobs.put_nowait, job)
+            if job is None:
+                return
+
+    threading.Thread(target=read_inbox, daemon=True).start()
+
+    async def run():
+        while (job := await jobs.get()) is not None:
+            job_id, kind, payload = job
+            if kind == "resume":
+                outcome = await resume_email(payload["thread_id"], payload["resume"], graph)
+            elif kind == "recover":
+                outcome = await recover_email(payload, graph)
+            else:
+                outcome = await process_email(payload, graph)
+            outbox.put((job_id, outcome))
+
+        # Pass the stop signal on to the other runners
+        jobs.put_nowait(None)
+
+    await asyncio.gather(*(run() for _ in range(concurrency)))
+
+
+class WorkerPool:
+    """Runs the email workflow in `workers` processes, each with its own compiled graph.
+
+    Jobs are routed by consistent hashing of their thread id, so every run and resume of a
+    thread lands on the same worker. Checkpoints go to one SQLite file shared by all workers:
+    when a worker dies it is restarted (up to `max_restarts` times, then removed from the
+    ring) and its unfinished jobs are sent again, continuing from their last checkpoint.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, concurrency: int = 8, checkpoint_db: str | None = None,
+                 setup: Callable[[], None] | None = None, max_restarts: int = 3):
+        self.concurrency = concurrency
+        self.checkpoint_db = checkpoint_db or os.getenv("CHECKPOINT_DB") or DEFAULT_CHECKPOINT_DB
+        self.setup = setup
+        self.max_restarts = max_restarts
+
+        # spawn: workers must not inherit locks, clients or threads from the parent
+        self._context = multiprocessing.get_context("spawn")
+        self._outbox = self._context.Queue()
+        self._lock = threading.Lock()
+        self._ring = HashRing()
+        self._workers: dict[int, tuple] = {}
+        self._restarts: dict[int, int] = {}
+        self._pending: dict[int, tuple[int, str, dict, Future]] = {}
+        self._job_ids = itertools.count()
+        self._closed = False
+        self.stats = {"submitted": 0, "finished": 0, "restarts": 0, "redispatched": 0}
+
+        for worker_id in range(workers):
+            self._start(worker_id)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True, name="pool-collector")
+        self._collector.start()
+        threading.Thread(target=self._monitor, daemon=True, name="pool-monitor").start()
+
+    def _start(self, worker_id: int) -> None:
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, inbox, self._outbox, self.checkpoint_db, self.concurrency, self.setup),
+            name=f"email-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = (process, inbox)
+        self._ring.add(worker_id)
+
+    def _dispatch(self, job_id: int, kind: str, payload: dict, future: Future) -> None:
+        """Send a job to the worker owning its thread; with no worker left the future fails"""
+        thread_id = payload["thread_id"] if kind == "resume" else thread_id_for(payload)
+        with self._lock:
+            try:
+                worker_id = self._ring.get(thread_id)
+            except RuntimeError as e:
+                # Every worker went past max_restarts: nobody will ever answer the job
+                self._pending.pop(job_id, None)
+                if not future.done():
+                    future.set_exception(e)
+                return
+            self._pending[job_id] = (worker_id, kind, payload, future)
+            inbox = self._workers[worker_id][1]
+        inbox.put((job_id, kind, payload))
+
+    def submit(self, email: dict) -> Future:
+        """Queue an email; the future resolves to its EmailOutcome"""
+        if self._closed:
+            raise RuntimeError("The pool is closed")
+
+        # The thread id must be known here to pick the worker
+        if not email.get("email_id"):
+            email = {**email, "email_id": uuid.uuid4().hex}
+
+        future: Future = Future()
+        self.stats["submitted"] += 1
+        self._dispatch(next(self._job_ids), "email", email, future)
+        return future
+
+    def resume(self, thread_id: str, resume: dict) -> Future:
+        """Resume an interrupted thread on the worker that owns it"""
+        future: Future = Future()
+        self.stats["submitted"] += 1
+        self._dispatch(next(self._job_ids), "resume", {"thread_id": thread_id, "resume": resume}, future)
+        return future
+
+    def _collect(self) -> None:
+        while (message := self._outbox.get()) is not None:
+            job_id, outcome = message
+            with self._lock:
+                pending = self._pending.pop(job_id, None)
+            # A redispatched job can answer twice, the first answer wins
+            if pending and not pending[3].done():
+                self.stats["finished"] += 1
+                pending[3].set_result(outcome)
+
+    def _monitor(self) -> None:
+        while not self._closed:
+            time.sleep(0.5)
+            for worker_id, (process, _) in list(self._workers.items()):
+                if not process.is_alive() and not self._closed:
+                    self._failover(worker_id)
+
+    def _failover(self, worker_id: int) -> None:
+        with self._lock:
+            del self._workers[worker_id]
+            self._ring.remove(worker_id)
+
+            self._restarts[worker_id] = self._restarts.get(worker_id, 0) + 1
+            if self._restarts[worker_id] <= self.max_restarts:
+                self.stats["restarts"] += 1
+                self._start(worker_id)
+
+            lost = [(job_id, job) for job_id, job in self._pending.items() if job[0] == worker_id]
+
+        for job_id, (_, kind, payload, future) in lost:
+            self.stats["redispatched"] += 1
+            self._dispatch(job_id, "recover" if kind == "email" else kind, payload, future)
+
+    def process_emails(self, emails: Iterable[dict],
+                       on_outcome: Callable[[dict, EmailOutcome], None] | None = None) -> EmailBatchReport:
+        """Run many emails across the workers, pulling lazily with at most workers x concurrency in flight"""
+        report: EmailBatchReport = {"completed": [], "interrupted": [], "failed": [], "elapsed": 0.0, "throughput": 0.0}
+        slots = threading.BoundedSemaphore(max(1, len(self._workers)) * self.concurrency)
+        futures = []
+
+        def finished(email: dict, future: Future) -> None:
+            if (error := future.exception()) is not None:
+                outcome: EmailOutcome = {"email_id": email.get("email_id"), "thread_id": thread_id_for(email),
+                                         "status": "failed", "interrupt": None,
+                                         "error": f"{type(error).__name__}: {error}", "elapsed": 0.0}
+            else:
+                outcome = future.result()
+            report[outcome["status"]].append(outcome)
+            if on_outcome:
+                on_outcome(email, outcome)
+            slots.release()
+
+        start = time.perf_counter()
+        for email in emails:
+            slots.acquire()
+            future = self.submit(email)
+            future.add_done_callback(partial(finished, email))
+            futures.append(future)
+
+        for future in futures:
+            future.exception()
+
+        report["elapsed"] = time.perf_counter() - start
+        total = len(report["completed"]) + len(report["interrupted"]) + len(report["failed"])
+        report["throughput"] = total / report["elapsed"] if report["elapsed"] else 0.0
+        return report
+
+    def close(self) -> None:
+        self._closed = True
+        for process, inbox in self._workers.values():
+            inbox.put(None)
+        for process, _ in self._workers.values():
+            process.join(timeout=10)
+        self._outbox.put(None)
+        self._collector.join(timeout=10)
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a batch of emails across several worker processes")
+    parser.add_argument("emails", help="JSON lines file with email_content, sender_email and email_id")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--concurrency", type=int, default=8, help="Emails in flight per worker")
+    parser.add_argument("--checkpoint-db", default=None, help=f"Shared checkpoint file, {DEFAULT_CHECKPOINT_DB} by default")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="Use the fake model with this latency in seconds instead of the provider")
+    args = parser.parse_args()
+
+    from src.agents.email_batch import read_jsonl
+
+    setup = partial(use_fake_llm, args.fake_latency) if args.fake_latency is not None else None
+    with WorkerPool(args.workers, args.concurrency, args.checkpoint_db, setup) as pool:
+        report = pool.process_emails(read_jsonl(args.emails))
+
+    print(f"Processed {len(report['completed'])} emails, "
+          f"{len(report['interrupted'])} waiting for review, "
+          f"{len(report['failed'])} failed in {report['elapsed']:.2f}s "
+          f"({report['throughput']:.2f} emails/s) with {args.workers} workers")
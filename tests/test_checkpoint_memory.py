@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import TypedDict
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+
+from src.checkpoint.memory import BoundedMemorySaver
+
+
+class ReviewState(TypedDict, total=False):
+    text: str
+    answer: str
+
+
+async def prepare(state: ReviewState) -> ReviewState:
+    await asyncio.sleep(0.001)
+    return {"text": state["text"] + "!"}
+
+
+def review(state: ReviewState) -> ReviewState:
+    return {"answer": interrupt({"text": state["text"]})}
+
+
+def build_graph(saver: BoundedMemorySaver):
+    builder = StateGraph(ReviewState)
+    builder.add_node("prepare", prepare)
+    builder.add_node("review", review)
+    builder.add_edge(START, "prepare")
+    builder.add_edge("prepare", "review")
+    builder.add_edge("review", END)
+    return builder.compile(checkpointer=saver)
+
+
+def test_interrupted_threads_survive_a_short_ttl():
+    # Longer than a step takes under load, so runs in progress never expire
+    saver = BoundedMemorySaver(idle_ttl=1.0)
+    graph = build_graph(saver)
+    configs = [{"configurable": {"thread_id": f"thread-{i}"}} for i in range(200)]
+
+    async def run(value) -> None:
+        await asyncio.gather(*(graph.ainvoke(value, config) for config in configs))
+
+    asyncio.run(run({"text": "email"}))
+    time.sleep(1.1)
+    saver.evict_expired()
+
+    assert saver.report()["expired_threads"] == 0
+    assert all(graph.get_state(config).next == ("review",) for config in configs)
+
+    # Once resumed the threads are evictable again
+    asyncio.run(run(Command(resume="approved")))
+    time.sleep(1.1)
+    saver.evict_expired()
+    assert saver.report()["expired_threads"] == len(configs)
+
+
+def test_checkpoint_saved_after_the_interrupt_keeps_it_protected():
+    saver = BoundedMemorySaver(idle_ttl=0.01)
+    thread = {"configurable": {"thread_id": "thread", "checkpoint_ns": ""}}
+
+    first, second, third = empty_checkpoint(), empty_checkpoint(), empty_checkpoint()
+    first_config = saver.put(thread, first, {}, {})
+    second_config = saver.put(first_config, second, {}, {})
+
+    # The interrupt is written against `second`, then the background put of an earlier step lands
+    saver.put_writes(second_config, [("__interrupt__", "review")], "task")
+    saver.put(first_config, empty_checkpoint(), {}, {})
+    time.sleep(0.02)
+    saver.evict_expired()
+    assert saver.report()["interrupted_threads"] == 1
+    assert saver.get_tuple({"configurable": {"thread_id": "thread"}}) is not None
+
+    # A checkpoint following `second` means the graph was resumed
+    saver.put(second_config, third, {}, {})
+    time.sleep(0.02)
+    saver.evict_expired()
+    assert saver.report()["interrupted_threads"] == 0
+    assert saver.get_tuple({"configurable": {"thread_id": "thread"}}) is None